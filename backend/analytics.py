@@ -0,0 +1,300 @@
+"""Incrementally maintained analytics rollups per shopkeeper.
+
+analytics_daily and analytics_monthly hold one document per (user_id, period)
+with revenue, tax, invoice count, amount collected, outstanding dues and item
+quantities per product. Every invoice write applies the difference between
+the invoice before and after the change as an upserted $inc, so the summary
+endpoint reads a handful of small documents instead of scanning invoices.
+rebuild_rollups regenerates both collections from the raw invoices.
+
+Run from backend/ after a bulk import or to repair drift:
+    python -m analytics --user-id <id>
+"""
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from pymongo import DeleteOne, ReplaceOne, UpdateOne
+
+from customer_stats import DRIFT_TOLERANCE
+
+logger = logging.getLogger(__name__)
+
+# Periods follow the shop's local calendar day (IST unless configured)
+ANALYTICS_UTC_OFFSET_MINUTES = int(os.environ.get('ANALYTICS_UTC_OFFSET_MINUTES', 330))
+ANALYTICS_TZ = timezone(timedelta(minutes=ANALYTICS_UTC_OFFSET_MINUTES))
+
+ROLLUP_COLLECTIONS = {"day": "analytics_daily", "month": "analytics_monthly"}
+ROLLUP_INDEX = [("user_id", 1), ("period", 1)]
+METRICS = ["revenue", "tax", "invoice_count", "collected", "outstanding"]
+
+REBUILD_BATCH_SIZE = 1000
+
+
+def periods(date) -> dict:
+    """{"day": "2024-05-31", "month": "2024-05"} in the analytics timezone"""
+    if isinstance(date, str):
+        date = datetime.fromisoformat(date.replace('Z', '+00:00'))
+    if date is None:
+        date = datetime.now(timezone.utc)
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    local = date.astimezone(ANALYTICS_TZ)
+    return {"day": local.strftime("%Y-%m-%d"), "month": local.strftime("%Y-%m")}
+
+
+def product_key(name: str) -> str:
+    """Field-safe product key: '.' and a leading '$' are not allowed in field names"""
+    return (name or "").strip().lower().replace('.', ' ').lstrip('$') or "unnamed"
+
+
+def _contribution(invoice_doc: Optional[dict]) -> dict:
+    """Flat $inc fields one invoice adds to its rollup documents"""
+    if not invoice_doc or not invoice_doc.get('user_id'):
+        return {}
+    total = invoice_doc.get('total', 0) or 0
+    amount_paid = invoice_doc.get('amount_paid', 0) or 0
+    amount_due = invoice_doc.get('amount_due')
+    if amount_due is None:
+        amount_due = total - amount_paid
+    fields = defaultdict(float, {
+        "revenue": total,
+        "tax": invoice_doc.get('tax', 0) or 0,
+        "invoice_count": 1,
+        "collected": amount_paid,
+        "outstanding": amount_due,
+    })
+    for item in invoice_doc.get('items') or []:
+        key = product_key(item.get('name'))
+        fields[f"products.{key}.quantity"] += item.get('quantity', 0) or 0
+        fields[f"products.{key}.revenue"] += item.get('total', 0) or 0
+    return fields
+
+
+def _buckets(invoice_doc: Optional[dict]) -> dict:
+    fields = _contribution(invoice_doc)
+    if not fields:
+        return {}
+    return {
+        (granularity, invoice_doc['user_id'], period): fields
+        for granularity, period in periods(invoice_doc.get('date')).items()
+    }
+
+
+def rollup_deltas(before: Optional[dict], after: Optional[dict]) -> dict:
+    """Return {(granularity, user_id, period): {field: delta}} for one invoice change.
+
+    An invoice whose date or owner changed is removed from its old buckets and
+    added to the new ones.
+    """
+    deltas = defaultdict(lambda: defaultdict(float))
+    for bucket, fields in _buckets(after).items():
+        for field, value in fields.items():
+            deltas[bucket][field] += value
+    for bucket, fields in _buckets(before).items():
+        for field, value in fields.items():
+            deltas[bucket][field] -= value
+    return {
+        bucket: {field: round(value, 2) for field, value in fields.items() if abs(value) >= DRIFT_TOLERANCE}
+        for bucket, fields in deltas.items()
+        if any(abs(value) >= DRIFT_TOLERANCE for value in fields.values())
+    }
+
+
+def _operations(deltas: dict) -> dict:
+    operations = defaultdict(list)
+    for (granularity, user_id, period), inc in deltas.items():
+        operations[ROLLUP_COLLECTIONS[granularity]].append(
+            UpdateOne({"user_id": user_id, "period": period}, {"$inc": inc}, upsert=True)
+        )
+    return operations
+
+
+def rollup_operations(before: Optional[dict], after: Optional[dict]) -> dict:
+    """{collection_name: [UpdateOne]} upserting the deltas of one invoice change"""
+    return _operations(rollup_deltas(before, after))
+
+
+def merged_rollup_operations(changes: list) -> dict:
+    """Like rollup_operations for many changes, with one update per period"""
+    merged = defaultdict(lambda: defaultdict(float))
+    for before, after in changes:
+        for bucket, inc in rollup_deltas(before, after).items():
+            for field, value in inc.items():
+                merged[bucket][field] += value
+    return _operations({
+        bucket: {field: round(value, 2) for field, value in inc.items()}
+        for bucket, inc in merged.items()
+    })
+
+
+async def write_rollup_operations(db, operations: dict):
+    for name, ops in operations.items():
+        if ops:
+            await db[name].bulk_write(ops, ordered=False)
+
+
+async def apply_rollup_change(db, before: Optional[dict], after: Optional[dict]):
+    """Apply one invoice create/update/payment/delete to the analytics rollups"""
+    await write_rollup_operations(db, rollup_operations(before, after))
+
+
+def _top_products(documents: list, top: int) -> list:
+    totals = defaultdict(lambda: {"quantity": 0.0, "revenue": 0.0})
+    for doc in documents:
+        for name, values in (doc.get("products") or {}).items():
+            totals[name]["quantity"] += values.get("quantity", 0)
+            totals[name]["revenue"] += values.get("revenue", 0)
+    ranked = sorted(
+        ((name, values) for name, values in totals.items() if values["quantity"] > 0),
+        key=lambda entry: entry[1]["revenue"],
+        reverse=True,
+    )
+    return [
+        {"name": name, "quantity": round(values["quantity"], 2), "revenue": round(values["revenue"], 2)}
+        for name, values in ranked[:top]
+    ]
+
+
+async def get_summary(
+    db,
+    user_id: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    granularity: str = "day",
+    top: int = 5,
+) -> dict:
+    """Revenue series, totals and top products for a date range, read from rollups.
+
+    The cost depends on the number of periods in the range, never on the
+    number of invoices. Outstanding dues are also reported across all time.
+    """
+    end = end or datetime.now(timezone.utc)
+    start = start or end - timedelta(days=30)
+    period_range = {"$gte": periods(start)[granularity], "$lte": periods(end)[granularity]}
+    documents = await db[ROLLUP_COLLECTIONS[granularity]].find(
+        {"user_id": user_id, "period": period_range}, {"_id": 0}
+    ).sort("period", 1).to_list(None)
+
+    series = [
+        {"period": doc["period"], **{metric: round(doc.get(metric, 0), 2) for metric in METRICS}}
+        for doc in documents
+    ]
+    for row in series:
+        row["invoice_count"] = int(row["invoice_count"])
+    totals = {metric: round(sum(row[metric] for row in series), 2) for metric in METRICS}
+
+    outstanding = await db[ROLLUP_COLLECTIONS["month"]].aggregate([
+        {"$match": {"user_id": user_id}},
+        {"$group": {"_id": None, "outstanding": {"$sum": "$outstanding"}}},
+    ]).to_list(1)
+
+    return {
+        "user_id": user_id,
+        "granularity": granularity,
+        "start": period_range["$gte"],
+        "end": period_range["$lte"],
+        "totals": totals,
+        "outstanding_total": round(outstanding[0]["outstanding"], 2) if outstanding else 0.0,
+        "series": series,
+        "top_products": _top_products(documents, top),
+    }
+
+
+def _nest(fields: dict) -> dict:
+    """Turn flat "products.rice.quantity" keys into nested documents"""
+    doc = {}
+    for path, value in fields.items():
+        target = doc
+        *parents, leaf = path.split('.')
+        for part in parents:
+            target = target.setdefault(part, {})
+        target[leaf] = round(value, 2)
+    return doc
+
+
+async def rebuild_rollups(db, user_id: Optional[str] = None) -> dict:
+    """Regenerate both rollup collections from raw invoices.
+
+    Invoices are streamed in batches and folded into per-period buckets in
+    memory (one entry per user and day, not per invoice). Each bucket then
+    replaces its rollup document in place, and only buckets that existed
+    before the rebuild and have no invoices left are deleted, so the summary
+    never sees a half-empty collection and concurrent upserts never collide
+    with a re-insert. An invoice write that lands between the scan and the
+    replace of its bucket is overwritten, so run it when the shop is quiet.
+    """
+    query = {"user_id": user_id} if user_id else {"user_id": {"$nin": [None, ""]}}
+    projection = {
+        "_id": 0, "user_id": 1, "date": 1, "total": 1, "tax": 1,
+        "amount_paid": 1, "amount_due": 1, "items.name": 1, "items.quantity": 1, "items.total": 1,
+    }
+    buckets = defaultdict(lambda: defaultdict(float))
+    invoices = 0
+    async for invoice in db.invoices.find(query, projection).batch_size(REBUILD_BATCH_SIZE):
+        invoices += 1
+        for bucket, fields in _buckets(invoice).items():
+            for field, value in fields.items():
+                buckets[bucket][field] += value
+
+    documents = defaultdict(list)
+    for (granularity, owner, period), fields in buckets.items():
+        documents[ROLLUP_COLLECTIONS[granularity]].append({"user_id": owner, "period": period, **_nest(fields)})
+
+    rollup_filter = {"user_id": user_id} if user_id else {}
+    for name in ROLLUP_COLLECTIONS.values():
+        rebuilt = {(doc["user_id"], doc["period"]) for doc in documents[name]}
+        stale = [
+            DeleteOne({"user_id": doc["user_id"], "period": doc["period"]})
+            async for doc in db[name].find(rollup_filter, {"_id": 0, "user_id": 1, "period": 1})
+            if (doc["user_id"], doc["period"]) not in rebuilt
+        ]
+        operations = [
+            ReplaceOne({"user_id": doc["user_id"], "period": doc["period"]}, doc, upsert=True)
+            for doc in documents[name]
+        ] + stale
+        for start in range(0, len(operations), REBUILD_BATCH_SIZE):
+            await db[name].bulk_write(operations[start:start + REBUILD_BATCH_SIZE], ordered=False)
+
+    summary = {
+        "invoices": invoices,
+        "daily_periods": len(documents[ROLLUP_COLLECTIONS["day"]]),
+        "monthly_periods": len(documents[ROLLUP_COLLECTIONS["month"]]),
+    }
+    logger.info(f"Analytics rollups rebuilt: {summary}")
+    return summary
+
+
+async def create_rollup_indexes(db):
+    for name in ROLLUP_COLLECTIONS.values():
+        await db[name].create_index(ROLLUP_INDEX, unique=True)
+
+
+def main():
+    import argparse
+    import json
+    from pathlib import Path
+
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Rebuild the analytics rollups from raw invoices")
+    parser.add_argument("--user-id", help="only rebuild this shopkeeper's rollups")
+    args = parser.parse_args()
+
+    load_dotenv(Path(__file__).parent / '.env')
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True, tzinfo=timezone.utc)
+    try:
+        summary = asyncio.run(rebuild_rollups(client[os.environ['DB_NAME']], user_id=args.user_id))
+    finally:
+        client.close()
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
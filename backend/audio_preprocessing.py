@@ -0,0 +1,251 @@
+"""Shrink WhatsApp voice notes before they are uploaded for transcription.
+
+Each note is decoded (OGG/Opus or anything else FFmpeg reads), downmixed to
+mono 16 kHz, and stripped of leading and trailing silence. Long pauses inside
+the note are shortened. The result is re-encoded as low-bitrate Opus. Silence
+is found with a frame-energy voice activity detector. Decoding and encoding
+are CPU-bound, so they run in a process pool off the event loop.
+
+Notes with more than AUDIO_CHUNK_SECONDS of speech are split into chunks so
+they can be transcribed in parallel. Cuts go at the pauses between speech
+segments. When a stretch of speech has no pause to cut at, it is cut hard and
+the next chunk starts AUDIO_CHUNK_OVERLAP_SECONDS early. That way a word split
+by the cut is heard whole in one chunk.
+
+PyAV and numpy load with the first voice note, not with the server.
+"""
+import asyncio
+import io
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+from metrics import record_audio_preprocessing, record_fallback, stage_timer
+
+logger = logging.getLogger(__name__)
+
+AUDIO_PREPROCESSING_ENABLED = os.environ.get('AUDIO_PREPROCESSING_ENABLED', 'True').lower() == 'true'
+AUDIO_PREPROCESSING_WORKERS = int(os.environ.get('AUDIO_PREPROCESSING_WORKERS', 2))
+AUDIO_SAMPLE_RATE = int(os.environ.get('AUDIO_SAMPLE_RATE', 16000))
+AUDIO_OPUS_BITRATE = int(os.environ.get('AUDIO_OPUS_BITRATE', 24000))
+# Voice activity detection: frames louder than the threshold count as speech
+VAD_FRAME_MS = int(os.environ.get('VAD_FRAME_MS', 30))
+VAD_MARGIN_DB = float(os.environ.get('VAD_MARGIN_DB', 12))
+VAD_DYNAMIC_RANGE_DB = float(os.environ.get('VAD_DYNAMIC_RANGE_DB', 30))
+VAD_MIN_DBFS = float(os.environ.get('VAD_MIN_DBFS', -50))
+# Silence kept around speech, and the longest pause left inside a note
+VAD_PADDING_MS = int(os.environ.get('VAD_PADDING_MS', 250))
+VAD_MAX_PAUSE_MS = int(os.environ.get('VAD_MAX_PAUSE_MS', 800))
+# Longest chunk sent for transcription (0 never splits), and the overlap after a cut with no pause
+AUDIO_CHUNK_SECONDS = float(os.environ.get('AUDIO_CHUNK_SECONDS', 60))
+AUDIO_CHUNK_OVERLAP_SECONDS = float(os.environ.get('AUDIO_CHUNK_OVERLAP_SECONDS', 1.5))
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def decode_audio(data: bytes, sample_rate: int = AUDIO_SAMPLE_RATE):
+    """Mono int16 samples at sample_rate, and the original duration in seconds"""
+    import av
+    import numpy as np
+
+    chunks = []
+    original_seconds = 0.0
+    with av.open(io.BytesIO(data)) as container:
+        resampler = av.AudioResampler(format="s16", layout="mono", rate=sample_rate)
+        for frame in container.decode(audio=0):
+            original_seconds += frame.samples / frame.sample_rate
+            chunks.extend(out.to_ndarray().reshape(-1) for out in resampler.resample(frame))
+        chunks.extend(out.to_ndarray().reshape(-1) for out in resampler.resample(None))
+    samples = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int16)
+    return samples, original_seconds
+
+
+def encode_opus(samples, sample_rate: int = AUDIO_SAMPLE_RATE, bitrate: int = AUDIO_OPUS_BITRATE) -> bytes:
+    """OGG/Opus tuned for speech"""
+    import av
+
+    output = io.BytesIO()
+    with av.open(output, "w", format="ogg") as container:
+        stream = container.add_stream("libopus", rate=sample_rate, layout="mono")
+        stream.bit_rate = bitrate
+        stream.codec_context.options = {"application": "voip"}
+        frame = av.AudioFrame.from_ndarray(samples.reshape(1, -1), format="s16", layout="mono")
+        frame.sample_rate = sample_rate
+        for packet in stream.encode(frame):
+            container.mux(packet)
+        for packet in stream.encode(None):
+            container.mux(packet)
+    return output.getvalue()
+
+
+def frame_levels(samples, sample_rate: int, frame_ms: int = VAD_FRAME_MS):
+    """RMS level of each frame_ms frame in dBFS (silence is -100)"""
+    import numpy as np
+
+    frame_length = max(1, sample_rate * frame_ms // 1000)
+    count = len(samples) // frame_length
+    if count == 0:
+        return np.zeros(0)
+    frames = samples[:count * frame_length].astype(np.float32).reshape(count, frame_length) / 32768.0
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-5))
+
+
+def speech_segments(
+    samples,
+    sample_rate: int = AUDIO_SAMPLE_RATE,
+    frame_ms: int = VAD_FRAME_MS,
+    padding_ms: int = VAD_PADDING_MS,
+    max_pause_ms: int = VAD_MAX_PAUSE_MS,
+) -> List[Tuple[int, int]]:
+    """(start, end) sample ranges holding speech, padded, with short pauses merged.
+
+    The threshold sits VAD_MARGIN_DB above the noise floor (10th percentile
+    frame level). It is lowered to VAD_DYNAMIC_RANGE_DB below the loud end
+    (95th percentile) when the noise floor is close to speech level, so a note
+    with no real silence is left whole rather than cut. It never drops below
+    VAD_MIN_DBFS.
+    """
+    import numpy as np
+
+    levels = frame_levels(samples, sample_rate, frame_ms)
+    if len(levels) == 0:
+        return []
+    noise_floor, loud = np.percentile(levels, [10, 95])
+    threshold = max(VAD_MIN_DBFS, min(noise_floor + VAD_MARGIN_DB, loud - VAD_DYNAMIC_RANGE_DB))
+    speech = np.flatnonzero(levels > threshold)
+    if len(speech) == 0:
+        return []
+
+    frame_length = sample_rate * frame_ms // 1000
+    padding = sample_rate * padding_ms // 1000
+    max_pause = sample_rate * max_pause_ms // 1000
+    segments = []
+    start = end = int(speech[0])
+    for index in speech[1:]:
+        if (index - end - 1) * frame_length > max_pause:
+            segments.append((start, end))
+            start = int(index)
+        end = int(index)
+    segments.append((start, end))
+    return [
+        (max(0, first * frame_length - padding), min(len(samples), (last + 1) * frame_length + padding))
+        for first, last in segments
+    ]
+
+
+def chunk_bounds(length: int, pauses: List[int], chunk_length: int, overlap: int) -> List[Tuple[int, int, bool]]:
+    """(start, end, overlaps_previous) ranges of at most chunk_length samples, plus overlap.
+
+    Each cut goes at the last pause that leaves the chunk at least half full.
+    When there is no such pause, the cut is hard and the next chunk starts
+    overlap samples early.
+    """
+    if chunk_length <= 0 or length <= chunk_length:
+        return [(0, length, False)]
+    bounds = []
+    start, overlapped = 0, False
+    while length - start > chunk_length:
+        fitting = [pause for pause in pauses if start + chunk_length // 2 <= pause <= start + chunk_length]
+        cut = fitting[-1] if fitting else start + chunk_length
+        bounds.append((max(0, start - overlap) if overlapped else start, cut, overlapped))
+        start, overlapped = cut, not fitting
+    bounds.append((max(0, start - overlap) if overlapped else start, length, overlapped))
+    return bounds
+
+
+def preprocess_audio(
+    data: bytes,
+    sample_rate: int = AUDIO_SAMPLE_RATE,
+    chunk_seconds: float = AUDIO_CHUNK_SECONDS,
+    overlap_seconds: float = AUDIO_CHUNK_OVERLAP_SECONDS,
+) -> dict:
+    """Trimmed mono Opus chunks for upload, with sizes and durations before and after.
+
+    chunks is a list of {"audio", "overlaps_previous"} in order. It holds the
+    original bytes unchanged (processed=False) when no speech is found, or
+    when a note short enough for one chunk would not get smaller.
+    """
+    import numpy as np
+
+    samples, original_seconds = decode_audio(data, sample_rate)
+    result = {
+        "chunks": [{"audio": data, "overlaps_previous": False}],
+        "processed": False,
+        "original_bytes": len(data),
+        "processed_bytes": len(data),
+        "original_seconds": original_seconds,
+        "processed_seconds": original_seconds,
+    }
+    segments = speech_segments(samples, sample_rate)
+    if not segments:
+        return result
+    speech = np.concatenate([samples[start:end] for start, end in segments])
+    # Where one padded segment ends and the next begins, in the trimmed audio
+    pauses = list(np.cumsum([end - start for start, end in segments[:-1]]))
+    bounds = chunk_bounds(len(speech), pauses, int(chunk_seconds * sample_rate), int(overlap_seconds * sample_rate))
+    chunks = [
+        {"audio": encode_opus(speech[start:end], sample_rate), "overlaps_previous": overlapped}
+        for start, end, overlapped in bounds
+    ]
+    processed_bytes = sum(len(chunk["audio"]) for chunk in chunks)
+    if len(chunks) == 1 and processed_bytes >= len(data):
+        return result
+    return {
+        **result,
+        "chunks": chunks,
+        "processed": True,
+        "processed_bytes": processed_bytes,
+        "processed_seconds": sum(end - start for start, end, _ in bounds) / sample_rate,
+    }
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """The worker pool, started on first use in each server process"""
+    global _pool
+    if _pool is None:
+        # spawn, not fork: the server process already runs driver and loop threads
+        _pool = ProcessPoolExecutor(AUDIO_PREPROCESSING_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def _load_codecs():
+    import av  # noqa: F401
+    import numpy  # noqa: F401
+
+
+async def start_pool():
+    """Start the workers and load PyAV in each, so the first voice note does not wait"""
+    loop = asyncio.get_running_loop()
+    pool = get_pool()
+    await asyncio.gather(*(loop.run_in_executor(pool, _load_codecs) for _ in range(AUDIO_PREPROCESSING_WORKERS)))
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def preprocess_voice_note(data: bytes) -> List[dict]:
+    """Chunks to transcribe, in order: pre-processed, or the original on any failure"""
+    original = [{"audio": data, "overlaps_previous": False}]
+    if not AUDIO_PREPROCESSING_ENABLED:
+        return original
+    with stage_timer("audio_preprocessing") as stage:
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(get_pool(), preprocess_audio, data)
+        except Exception as e:
+            logger.warning(f"Audio pre-processing failed, uploading original: {str(e)}")
+            stage.fail()
+            record_fallback("audio_preprocessing")
+            return original
+    record_audio_preprocessing(result)
+    logger.info(
+        f"Pre-processed voice note: {result['original_bytes']} → {result['processed_bytes']} bytes, "
+        f"{result['original_seconds']:.1f}s → {result['processed_seconds']:.1f}s in {len(result['chunks'])} chunk(s)"
+    )
+    return result["chunks"]
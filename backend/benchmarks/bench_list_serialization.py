@@ -0,0 +1,81 @@
+"""List endpoint serialization benchmark: pydantic response models vs the orjson fast path.
+
+Usage (from backend/, with MONGO_URL/DB_NAME pointing at a scratch database):
+    python -m benchmarks.bench_list_serialization --invoices 1000 --requests 200
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+import server
+
+
+def make_invoices(count: int) -> list:
+    now = datetime.now(timezone.utc)
+    return [
+        {
+            "id": str(uuid.uuid4()), "invoice_number": f"INV-BENCH-{i:06d}", "user_id": "bench-user",
+            "customer_id": f"cust-{i % 50}", "customer_name": f"Customer {i % 50}", "customer_phone": "+919999999999",
+            "items": [
+                {"name": f"Item {j}", "quantity": 1 + j, "price": 25.0 + j, "total": (1 + j) * (25.0 + j)}
+                for j in range(5)
+            ],
+            "subtotal": 400.0, "tax": 72.0, "total": 472.0, "amount_paid": 0.0, "amount_due": 472.0,
+            "status": "unpaid", "date": now - timedelta(minutes=i),
+        }
+        for i in range(count)
+    ]
+
+
+async def measure(client: httpx.AsyncClient, limit: int, requests: int) -> dict:
+    timings = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = await client.get("/api/invoices", params={"limit": limit})
+        response.raise_for_status()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        "requests_per_sec": round(requests / (sum(timings) / 1000), 1),
+        "p50_ms": round(statistics.median(timings), 2),
+        "p99_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.99))], 2),
+    }
+
+
+async def run(invoices: int, requests: int) -> dict:
+    # ASGITransport does not run the lifespan, which opens the Mongo client
+    async with server.app.router.lifespan_context(server.app):
+        db = server.app.state.resources.db
+        await db.invoices.delete_many({"user_id": "bench-user"})
+        await db.invoices.insert_many(make_invoices(invoices))
+
+        results = {}
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for label, fast in (("pydantic", False), ("orjson", True)):
+                server.FAST_LIST_RESPONSES = fast
+                await measure(client, invoices, 5)
+                results[label] = await measure(client, invoices, requests)
+
+        await db.invoices.delete_many({"user_id": "bench-user"})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--invoices", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.invoices, args.requests))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
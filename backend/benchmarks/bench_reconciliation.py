@@ -0,0 +1,69 @@
+"""Reconciliation benchmark against the fake Razorpay and a local MongoDB.
+
+Usage (from backend/, with MONGO_URL pointing at a scratch mongod):
+    python -m benchmarks.bench_reconciliation --invoices 5000
+"""
+import argparse
+import asyncio
+import json
+import os
+import uuid
+from collections import defaultdict
+
+import razorpay
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from fakes import serve_in_thread
+from fakes.razorpay_server import create_fake_razorpay_app, seed_paid_invoices
+from reconciliation import reconcile_payments
+
+
+async def run(db, razorpay_client, invoices: list, customers: int):
+    dues = defaultdict(float)
+    for inv in invoices:
+        dues[inv["customer_id"]] += inv["amount_due"]
+
+    await db.invoices.delete_many({})
+    await db.customers.delete_many({})
+    await db.customers.insert_many([
+        {"id": f"cust-{i}", "user_id": "bench-user", "name": f"Customer {i}", "total_due": dues[f"cust-{i}"]}
+        for i in range(customers)
+    ])
+    await db.invoices.insert_many([dict(inv) for inv in invoices])
+    await db.invoices.create_index("id")
+
+    summary = await reconcile_payments(db, razorpay_client, since=0)
+    summary["unpaid_after"] = await db.invoices.count_documents({"status": "unpaid"})
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--invoices", type=int, default=5000)
+    parser.add_argument("--customers", type=int, default=200)
+    parser.add_argument("--db", default="voicebill_bench")
+    args = parser.parse_args()
+
+    invoices = [
+        {
+            "id": str(uuid.uuid4()), "user_id": "bench-user", "customer_id": f"cust-{i % args.customers}",
+            "invoice_number": f"INV-BENCH-{i:06d}", "total": 118.0 + i % 50, "amount_paid": 0.0,
+            "amount_due": 118.0 + i % 50, "status": "unpaid", "items": [],
+        }
+        for i in range(args.invoices)
+    ]
+    app = create_fake_razorpay_app()
+    seed_paid_invoices(app, invoices, partial_every=10)
+
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    try:
+        with serve_in_thread(app) as base_url:
+            razorpay_client = razorpay.Client(auth=("rzp_test_bench", "secret"), base_url=base_url)
+            summary = asyncio.run(run(client[args.db], razorpay_client, invoices, args.customers))
+    finally:
+        client.close()
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
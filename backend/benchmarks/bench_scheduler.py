@@ -0,0 +1,108 @@
+"""Provider scheduler benchmark: how long small shops wait behind one heavy tenant.
+
+One wholesaler submits --heavy-calls calls at once. --light-tenants other
+shops then each send --light-calls calls, spread over the time the backlog
+takes to drain. Every call holds a provider slot for --latency seconds
+(±50% jitter). The same traffic runs through two setups:
+
+fifo  one shared queue with the same concurrency, like a plain semaphore
+fair  ProviderScheduler with per-tenant limits and fair queuing
+
+The report gives queue wait p50/p95/max for the heavy and the light tenants,
+total makespan, and calls shed under --overload shed.
+
+Usage (from backend/):
+    python -m benchmarks.bench_scheduler --heavy-calls 200 --light-tenants 20 --concurrency 10
+    python -m benchmarks.bench_scheduler --overload shed --max-queue 50
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from scheduler import ProviderOverloaded, ProviderScheduler
+
+
+def percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def summarize(waits: list) -> dict:
+    if not waits:
+        return {"calls": 0}
+    return {
+        "calls": len(waits),
+        "wait_p50_s": round(percentile(waits, 0.5), 3),
+        "wait_p95_s": round(percentile(waits, 0.95), 3),
+        "wait_max_s": round(max(waits), 3),
+    }
+
+
+async def run_setup(args, fair: bool) -> dict:
+    scheduler = ProviderScheduler(
+        "bench",
+        concurrency=args.concurrency,
+        tenant_concurrency=args.tenant_concurrency if fair else args.concurrency,
+        overload=args.overload,
+        max_queue=args.max_queue,
+        queue_timeout=args.queue_timeout,
+        weights={},
+    )
+    rng = random.Random(args.seed)
+    waits = {"heavy": [], "light": []}
+    shed = {"heavy": 0, "light": 0}
+
+    async def call(kind: str, tenant: str, delay: float):
+        await asyncio.sleep(delay)
+        started = time.perf_counter()
+        try:
+            # fifo puts everyone in one queue; fair queues per tenant
+            await scheduler.acquire(tenant if fair else "all")
+        except ProviderOverloaded:
+            shed[kind] += 1
+            return
+        waits[kind].append(time.perf_counter() - started)
+        try:
+            await asyncio.sleep(args.latency * rng.uniform(0.5, 1.5))
+        finally:
+            scheduler.release(tenant if fair else "all")
+
+    # Light traffic arrives while the heavy backlog would still be draining
+    drain = args.heavy_calls * args.latency / args.concurrency
+    calls = [call("heavy", "wholesaler", 0.0) for _ in range(args.heavy_calls)]
+    for shop in range(args.light_tenants):
+        calls += [call("light", f"shop-{shop}", rng.uniform(0, drain)) for _ in range(args.light_calls)]
+
+    started = time.perf_counter()
+    await asyncio.gather(*calls)
+    return {
+        "makespan_s": round(time.perf_counter() - started, 2),
+        "heavy": {**summarize(waits["heavy"]), "shed": shed["heavy"]},
+        "light": {**summarize(waits["light"]), "shed": shed["light"]},
+    }
+
+
+async def run(args) -> dict:
+    return {"fifo": await run_setup(args, fair=False), "fair": await run_setup(args, fair=True)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--heavy-calls", type=int, default=200)
+    parser.add_argument("--light-tenants", type=int, default=20)
+    parser.add_argument("--light-calls", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds each call holds a slot")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--tenant-concurrency", type=int, default=4)
+    parser.add_argument("--overload", choices=["queue", "shed"], default="queue")
+    parser.add_argument("--max-queue", type=int, default=200)
+    parser.add_argument("--queue-timeout", type=float, default=0, help="seconds; 0 waits forever")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
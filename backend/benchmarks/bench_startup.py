@@ -0,0 +1,124 @@
+"""Cold-start benchmark: `import server` and time to first response, with budgets.
+
+Every run uses a fresh interpreter. Time to first response starts uvicorn
+and polls GET /api/ until it answers, so it includes the lifespan (Mongo
+client, index creation, background jobs). Exits non-zero when a median
+exceeds its budget, so CI can enforce it.
+
+Usage (from backend/, with MONGO_URL pointing at a reachable mongod, or --mongod):
+    python -m benchmarks.bench_startup --runs 5 --import-budget-ms 800 --first-response-budget-ms 2500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import ExitStack
+from pathlib import Path
+
+import httpx
+
+from fakes import _free_port
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# SDKs that should load on first use, never on `import server`
+HEAVY_MODULES = (
+    "emergentintegrations", "razorpay", "reportlab", "qrcode", "assemblyai", "openpyxl", "requests", "av", "numpy", "faster_whisper",
+)
+
+IMPORT_BUDGET_MS = float(os.environ.get('STARTUP_IMPORT_BUDGET_MS', 1500))
+FIRST_RESPONSE_BUDGET_MS = float(os.environ.get('STARTUP_FIRST_RESPONSE_BUDGET_MS', 4000))
+
+_IMPORT_PROBE = f"""
+import json, sys, time
+started = time.perf_counter()
+import server
+elapsed = time.perf_counter() - started
+print(json.dumps({{"ms": elapsed * 1000, "heavy": [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+"""
+
+
+def _env(mongo_url: str) -> dict:
+    return {**os.environ, "MONGO_URL": mongo_url, "DB_NAME": os.environ.get("DB_NAME", "voicebill_startup")}
+
+
+def measure_import(mongo_url: str = "mongodb://127.0.0.1:27017") -> dict:
+    """Time `import server` in a fresh interpreter; importing never connects"""
+    output = subprocess.run(
+        [sys.executable, "-c", _IMPORT_PROBE], cwd=BACKEND_DIR, env=_env(mongo_url),
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure_first_response(mongo_url: str, timeout: float = 30.0) -> float:
+    """Milliseconds from spawning uvicorn to the first 200 from GET /api/"""
+    port = _free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=_env(mongo_url), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=1.0) as client:
+            while time.perf_counter() - started < timeout:
+                if process.poll() is not None:
+                    raise RuntimeError(f"uvicorn exited with {process.returncode} before answering")
+                try:
+                    if client.get("/api/").status_code == 200:
+                        return (time.perf_counter() - started) * 1000
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.005)
+        raise RuntimeError(f"No response within {timeout}s")
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def summarize(values: list, budget: float) -> dict:
+    median = statistics.median(values)
+    return {
+        "median_ms": round(median, 1),
+        "min_ms": round(min(values), 1),
+        "max_ms": round(max(values), 1),
+        "budget_ms": budget,
+        "within_budget": median <= budget,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--import-budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument("--first-response-budget-ms", type=float, default=FIRST_RESPONSE_BUDGET_MS)
+    parser.add_argument("--skip-first-response", action="store_true", help="only time the import (no MongoDB needed)")
+    parser.add_argument("--mongod", action="store_true", help="start a throwaway local mongod")
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL", "mongodb://127.0.0.1:27017"))
+    args = parser.parse_args()
+
+    with ExitStack() as stack:
+        mongo_url = args.mongo_url
+        if args.mongod and not args.skip_first_response:
+            from fakes.mongod import local_mongod
+            mongo_url = stack.enter_context(local_mongod())
+
+        imports = [measure_import(mongo_url) for _ in range(args.runs)]
+        report = {"import": summarize([run["ms"] for run in imports], args.import_budget_ms)}
+        report["import"]["heavy_modules_loaded"] = sorted({m for run in imports for m in run["heavy"]})
+        if not args.skip_first_response:
+            report["first_response"] = summarize(
+                [measure_first_response(mongo_url) for _ in range(args.runs)], args.first_response_budget_ms
+            )
+
+    print(json.dumps(report, indent=2))
+    if not all(section["within_budget"] for section in report.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Compare transcription backends on the same clips: real-time factor and word error rate.
+
+The manifest is JSONL. Each line holds one clip, with the audio path relative
+to the manifest and a reference transcript:
+    {"audio": "hi/ramesh-rice.ogg", "text": "ramesh ko do kilo chawal becha", "language": "hi"}
+
+Clips are transcribed one at a time after each backend has warmed up. RTF is
+transcription time divided by audio duration (below 1 is faster than real
+time). WER is word-level edit distance over the reference word count. Both
+are computed after lower-casing and stripping punctuation, overall and per
+language. The AssemblyAI backend needs ASSEMBLYAI_API_KEY; the whisper
+backend reads the WHISPER_* settings.
+
+Usage (from backend/):
+    python -m benchmarks.bench_transcription --manifest clips/manifest.jsonl --backends assemblyai whisper
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from audio_preprocessing import decode_audio, preprocess_audio
+from transcription import TRANSCRIPTION_BACKENDS, create_transcription_backend, normalize_words
+
+
+def edit_distance(reference: list, hypothesis: list) -> int:
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_word in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hypothesis, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1]
+
+
+def load_clips(manifest: Path, preprocess: bool) -> list:
+    clips = []
+    for line in manifest.read_text().splitlines():
+        if not line.strip():
+            continue
+        entry = json.loads(line)
+        audio = (manifest.parent / entry["audio"]).read_bytes()
+        if preprocess:
+            # One chunk per clip, so the backends are compared on whole notes
+            audio = preprocess_audio(audio, chunk_seconds=0)["chunks"][0]["audio"]
+        _, seconds = decode_audio(audio)
+        clips.append({**entry, "bytes": audio, "seconds": seconds})
+    return clips
+
+
+def summarize(rows: list) -> dict:
+    seconds = sum(row["seconds"] for row in rows)
+    elapsed = sum(row["elapsed"] for row in rows)
+    reference_words = sum(row["reference_words"] for row in rows)
+    return {
+        "clips": len(rows),
+        "failed": sum(row["failed"] for row in rows),
+        "audio_seconds": round(seconds, 1),
+        "rtf": round(elapsed / seconds, 3) if seconds else None,
+        "latency_p50_s": round(statistics.median(row["elapsed"] for row in rows), 2),
+        "wer": round(sum(row["errors"] for row in rows) / reference_words, 3) if reference_words else None,
+    }
+
+
+async def run_backend(name: str, clips: list) -> dict:
+    backend = create_transcription_backend(name)
+    try:
+        await backend.start()
+        await backend.transcribe(clips[0]["bytes"])  # warm-up, not timed
+        rows = []
+        for clip in clips:
+            started = time.perf_counter()
+            try:
+                text, failed = await backend.transcribe(clip["bytes"]), False
+            except Exception as e:
+                text, failed = "", True
+                print(f"{name}: {clip['audio']} failed: {e}")
+            reference = normalize_words(clip["text"])
+            rows.append({
+                "language": clip.get("language", "unknown"),
+                "seconds": clip["seconds"],
+                "elapsed": time.perf_counter() - started,
+                "reference_words": len(reference),
+                "errors": edit_distance(reference, normalize_words(text)),
+                "failed": failed,
+            })
+    finally:
+        await backend.aclose()
+
+    by_language = defaultdict(list)
+    for row in rows:
+        by_language[row["language"]].append(row)
+    return {
+        **summarize(rows),
+        "languages": {language: summarize(group) for language, group in sorted(by_language.items())},
+    }
+
+
+async def run(args) -> dict:
+    clips = load_clips(Path(args.manifest), args.preprocess)
+    return {name: await run_backend(name, clips) for name in args.backends}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--manifest", required=True)
+    parser.add_argument("--backends", nargs="+", default=list(TRANSCRIPTION_BACKENDS), choices=list(TRANSCRIPTION_BACKENDS))
+    parser.add_argument("--preprocess", action="store_true", help="run audio pre-processing first, as the server does")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
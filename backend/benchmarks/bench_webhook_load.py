@@ -0,0 +1,377 @@
+"""End-to-end load test of the WhatsApp webhook with every external service faked.
+
+Twilio (messages and media), AssemblyAI, Razorpay and SMTP run as local
+servers with configurable latency and error rates, the LLM gateway is an
+in-process fake (fakes.llm), and MongoDB is a throwaway mongod (--mongod) or
+the server at --mongo-url. The app itself runs under uvicorn on a background
+thread with its normal startup hooks.
+
+Synthetic voice notes ("sold 2 rice, 1 oil to Customer 4") and text messages
+(price replies to pending invoices, help, list, balance) are sent open-loop
+at --rps for --duration seconds. The JSON report has throughput, client-side
+latency per message kind, p50/p95/p99 per pipeline stage and per Mongo
+command (from the app's Prometheus histograms) and error rates.
+
+Usage (from backend/):
+    python -m benchmarks.bench_webhook_load --mongod --rps 20 --duration 60 \\
+        --assemblyai-latency 1.5 --llm-latency 0.8 --llm-error-rate 0.02 --output load.json
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import math
+import os
+import random
+import re
+import time
+import uuid
+from collections import defaultdict
+from contextlib import ExitStack
+
+import httpx
+from pymongo import MongoClient
+
+from fakes import serve_in_thread
+from fakes.assemblyai_server import create_fake_assemblyai_app
+from fakes.llm import install_fake_llm
+from fakes.mongod import local_mongod
+from fakes.razorpay_server import create_fake_razorpay_app
+from fakes.smtp_server import serve_smtp
+from fakes.twilio_server import add_voice_note, create_fake_twilio_app
+from translations import get_whatsapp_messages
+
+ACCOUNT_SID = "ACloadtest"
+BUSINESS_NUMBER = "whatsapp:+14155238886"
+QUANTILES = (0.5, 0.95, 0.99)
+
+CATALOG = {"rice": 60, "sugar": 45, "dal": 120, "atta": 40, "oil": 180, "tea": 250, "salt": 20, "soap": 35}
+# Not in the catalog, so the app has to ask for their price
+UNKNOWN_ITEMS = ["saffron", "cardamom", "honey"]
+CUSTOMERS_PER_SHOP = 10
+TEXT_COMMANDS = ["help", "list invoices", "balance Customer 1"]
+# The webhook answers 200 with this message when a handler raises
+APP_ERROR_REPLY = get_whatsapp_messages("en")["error"]
+BUSY_REPLY = get_whatsapp_messages("en")["busy"]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def seed(mongo_url: str, db_name: str, server, shopkeepers: int) -> list:
+    """Shopkeepers with customers (half with email) and a shared product catalog"""
+    from catalog import SHARED_USER_ID
+    from search import search_fields
+
+    client = MongoClient(mongo_url, tz_aware=True)
+    db = client[db_name]
+    try:
+        db.products.insert_many([
+            {**server.Product(user_id=SHARED_USER_ID, name=name, price=price).model_dump(), **search_fields(name)}
+            for name, price in CATALOG.items()
+        ])
+        phones = []
+        for i in range(shopkeepers):
+            phone = f"+9170000{i:05d}"
+            user = server.User(phone=phone, name=f"Shop {i}", business_name=f"Load Test Store {i}")
+            db.users.insert_one(user.model_dump())
+            db.customers.insert_many([
+                {
+                    **server.Customer(
+                        user_id=user.id, name=f"Customer {j}", phone=f"+9180000{i:03d}{j:02d}",
+                        email=f"customer{j}@example.com" if j % 2 == 0 else "",
+                    ).model_dump(),
+                    **search_fields(f"Customer {j}", f"+9180000{i:03d}{j:02d}"),
+                }
+                for j in range(CUSTOMERS_PER_SHOP)
+            ])
+            phones.append(phone)
+        return phones
+    finally:
+        client.close()
+
+
+def drop_database(mongo_url: str, db_name: str):
+    client = MongoClient(mongo_url)
+    try:
+        client.drop_database(db_name)
+    finally:
+        client.close()
+
+
+def histogram_buckets(histogram, label: str) -> dict:
+    """{(label value, outcome): {upper bound: cumulative count}}"""
+    buckets = defaultdict(dict)
+    for family in histogram.collect():
+        for sample in family.samples:
+            if sample.name.endswith("_bucket"):
+                key = (sample.labels[label], sample.labels["outcome"])
+                buckets[key][float(sample.labels["le"])] = sample.value
+    return buckets
+
+
+def counter_values(counter, label: str) -> dict:
+    return {
+        sample.labels[label]: sample.value
+        for family in counter.collect()
+        for sample in family.samples
+        if sample.name.endswith("_total")
+    }
+
+
+def bucket_quantile(buckets: dict, q: float) -> float:
+    """Linear interpolation inside the bucket holding the q-th observation,
+    like PromQL's histogram_quantile"""
+    total = buckets.get(math.inf, 0)
+    if not total:
+        return 0.0
+    rank = q * total
+    lower, below = 0.0, 0.0
+    for bound in sorted(buckets):
+        count = buckets[bound]
+        if count >= rank:
+            if bound == math.inf:
+                return lower
+            return lower + (bound - lower) * (rank - below) / max(count - below, 1e-9)
+        lower, below = bound, count
+    return lower
+
+
+def histogram_report(before: dict, after: dict) -> dict:
+    """Per label value: count, error rate and latency quantiles in ms for this run"""
+    merged = defaultdict(lambda: defaultdict(float))
+    counts = defaultdict(lambda: defaultdict(float))
+    for (name, outcome), buckets in after.items():
+        previous = before.get((name, outcome), {})
+        for bound, count in buckets.items():
+            merged[name][bound] += count - previous.get(bound, 0)
+        counts[name][outcome] += buckets[math.inf] - previous.get(math.inf, 0)
+
+    report = {}
+    for name, buckets in sorted(merged.items()):
+        total = buckets[math.inf]
+        if not total:
+            continue
+        report[name] = {
+            "count": int(total),
+            "error_rate": round(counts[name]["error"] / total, 4),
+            **{f"p{int(q * 100)}_ms": round(bucket_quantile(buckets, q) * 1000, 2) for q in QUANTILES},
+        }
+    return report
+
+
+def failures(outcomes: dict) -> int:
+    return sum(count for outcome, count in outcomes.items() if outcome.startswith(("http_", "error_")))
+
+
+def missing_price_count(prompt: str) -> int:
+    """How many items the "What's the price for: *a, b*?" prompt lists"""
+    match = re.search(r"price for: \*(.+?)\*", prompt)
+    return len(match.group(1).split(",")) if match else 1
+
+
+def classify(kind: str, response: httpx.Response) -> str:
+    if response.status_code >= 400:
+        return f"http_{response.status_code}"
+    if "application/json" in response.headers.get("content-type", ""):
+        return "invoice" if response.json().get("status") == "success" else "failed"
+    if APP_ERROR_REPLY in response.text:
+        return "error_app"
+    if BUSY_REPLY in response.text:
+        return "shed"
+    if "Almost done" in response.text:
+        return "price_prompt"
+    if kind == "price_reply" and "<Message>" not in response.text:
+        return "invoice"
+    return "reply"
+
+
+class Traffic:
+    """Synthetic webhook messages from a pool of shopkeepers"""
+
+    def __init__(self, phones: list, twilio_app, twilio_url: str, args, rng: random.Random):
+        self.phones = phones
+        self.twilio_app = twilio_app
+        self.twilio_url = twilio_url
+        self.args = args
+        self.rng = rng
+        self.awaiting_price = []
+
+    def voice_note(self, phone: str) -> dict:
+        rng = self.rng
+        items = [f"{rng.randint(1, 10)} {name}" for name in rng.sample(sorted(CATALOG), rng.randint(1, 3))]
+        if rng.random() < self.args.unknown_item_rate:
+            items.append(f"{rng.randint(1, 5)} {rng.choice(UNKNOWN_ITEMS)}")
+        text = f"sold {', '.join(items)} to Customer {rng.randrange(CUSTOMERS_PER_SHOP)}"
+        message_sid = f"SM{uuid.uuid4().hex}"
+        media_url = add_voice_note(self.twilio_app, self.twilio_url, ACCOUNT_SID, message_sid, text, self.args.audio_bytes)
+        return {
+            "MessageSid": message_sid, "From": f"whatsapp:{phone}", "To": BUSINESS_NUMBER, "Body": "",
+            "NumMedia": "1", "MediaUrl0": media_url, "MediaContentType0": "audio/ogg",
+        }
+
+    def next(self) -> tuple:
+        if self.rng.random() < self.args.voice_ratio:
+            phone = self.rng.choice(self.phones)
+            return "voice", phone, self.voice_note(phone)
+        if self.awaiting_price:
+            phone, missing = self.awaiting_price.pop(self.rng.randrange(len(self.awaiting_price)))
+            kind, body = "price_reply", " ".join(str(self.rng.randint(50, 900)) for _ in range(missing))
+        else:
+            phone = self.rng.choice(self.phones)
+            kind, body = "text", self.rng.choice(TEXT_COMMANDS)
+        return kind, phone, {
+            "MessageSid": f"SM{uuid.uuid4().hex}", "From": f"whatsapp:{phone}", "To": BUSINESS_NUMBER,
+            "Body": body, "NumMedia": "0",
+        }
+
+
+async def drive(app_url: str, traffic: Traffic, rps: float, duration: float, timeout: float) -> dict:
+    """Send messages open-loop (on schedule, whether or not earlier ones finished)"""
+    latencies = defaultdict(list)
+    outcomes = defaultdict(lambda: defaultdict(int))
+
+    async def send(client, kind, phone, form):
+        started = time.perf_counter()
+        try:
+            response = await client.post("/api/webhook/whatsapp", data=form)
+            outcome = classify(kind, response)
+        except httpx.HTTPError as e:
+            outcome = f"error_{type(e).__name__}"
+        latencies[kind].append((time.perf_counter() - started) * 1000)
+        outcomes[kind][outcome] += 1
+        if outcome == "price_prompt":
+            traffic.awaiting_price.append((phone, missing_price_count(response.text)))
+
+    total = int(rps * duration)
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=100)
+    async with httpx.AsyncClient(base_url=app_url, timeout=timeout, limits=limits) as client:
+        started = time.perf_counter()
+        tasks = []
+        for i in range(total):
+            delay = started + i / rps - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(client, *traffic.next())))
+        sent_in = time.perf_counter() - started
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    return {
+        "requests": total,
+        "target_rps": rps,
+        "offered_rps": round(total / sent_in, 2) if sent_in else 0.0,
+        "throughput_rps": round(total / elapsed, 2),
+        "elapsed_s": round(elapsed, 3),
+        "error_rate": round(sum(failures(counts) for counts in outcomes.values()) / max(total, 1), 4),
+        "by_kind": {
+            kind: {
+                "count": len(values),
+                "error_rate": round(failures(outcomes[kind]) / len(values), 4),
+                "outcomes": dict(outcomes[kind]),
+                **{f"p{int(q * 100)}_ms": round(percentile(values, q * 100), 2) for q in QUANTILES},
+            }
+            for kind, values in sorted(latencies.items())
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rps", type=float, default=10)
+    parser.add_argument("--duration", type=float, default=30, help="seconds of traffic")
+    parser.add_argument("--shopkeepers", type=int, default=20)
+    parser.add_argument("--voice-ratio", type=float, default=0.7, help="fraction of messages that are voice notes")
+    parser.add_argument("--unknown-item-rate", type=float, default=0.2,
+                        help="fraction of voice notes naming an item without a catalog price")
+    parser.add_argument("--audio-bytes", type=int, default=16000)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mongod", action="store_true", help="start a throwaway local mongod")
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--keep-data", action="store_true", help="do not drop the load-test database")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    for service, latency in (("twilio", 0.05), ("assemblyai", 1.0), ("llm", 0.5), ("razorpay", 0.1), ("smtp", 0.05)):
+        parser.add_argument(f"--{service}-latency", type=float, default=latency, help="seconds")
+        parser.add_argument(f"--{service}-error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    with ExitStack() as stack:
+        mongo_url = stack.enter_context(local_mongod()) if args.mongod else args.mongo_url
+        db_name = f"voicebill_load_{uuid.uuid4().hex[:8]}"
+        if not args.keep_data:
+            stack.callback(drop_database, mongo_url, db_name)
+
+        twilio_app = create_fake_twilio_app(latency=args.twilio_latency, error_rate=args.twilio_error_rate)
+        twilio_url = stack.enter_context(serve_in_thread(twilio_app))
+        assemblyai_url = stack.enter_context(serve_in_thread(
+            create_fake_assemblyai_app(latency=args.assemblyai_latency, error_rate=args.assemblyai_error_rate)
+        ))
+        razorpay_app = create_fake_razorpay_app(latency=args.razorpay_latency, error_rate=args.razorpay_error_rate)
+        razorpay_url = stack.enter_context(serve_in_thread(razorpay_app))
+        smtp = stack.enter_context(serve_smtp(latency=args.smtp_latency, error_rate=args.smtp_error_rate))
+        llm = install_fake_llm(latency=args.llm_latency, error_rate=args.llm_error_rate)
+
+        # Module-level configuration is read on import, so set it first
+        os.environ.update({
+            "MONGO_URL": mongo_url,
+            "DB_NAME": db_name,
+            "TWILIO_ACCOUNT_SID": ACCOUNT_SID,
+            "TWILIO_API_BASE_URL": twilio_url,
+            "TWILIO_WHATSAPP_NUMBER": BUSINESS_NUMBER,
+            "RAZORPAY_BASE_URL": razorpay_url,
+            "RAZORPAY_TEST_MODE": "false",
+            "SMTP_HOST": smtp.host,
+            "SMTP_PORT": str(smtp.port),
+            "ASSEMBLYAI_API_KEY": "fake",
+            "EMERGENT_LLM_KEY": "fake",
+            "CUSTOMER_STATS_RECONCILE_INTERVAL": "0",
+            "GST_PERIOD_CLOSE_INTERVAL": "0",
+            # Fake voice notes carry their text, not audio, so there is nothing to decode
+            "AUDIO_PREPROCESSING_ENABLED": "false",
+        })
+        server = importlib.import_module("server")
+        from metrics import FALLBACKS, MONGO_COMMAND_LATENCY, STAGE_LATENCY
+
+        import assemblyai as aai
+        aai.settings.base_url = assemblyai_url
+        aai.settings.polling_interval = 0.05
+
+        phones = seed(mongo_url, db_name, server, args.shopkeepers)
+        app_url = stack.enter_context(serve_in_thread(server.app, lifespan="on"))
+        traffic = Traffic(phones, twilio_app, twilio_url, args, random.Random(args.seed))
+
+        stages_before = histogram_buckets(STAGE_LATENCY, "stage")
+        mongo_before = histogram_buckets(MONGO_COMMAND_LATENCY, "command")
+        fallbacks_before = counter_values(FALLBACKS, "stage")
+        report = asyncio.run(drive(app_url, traffic, args.rps, args.duration, args.timeout))
+        fallbacks = counter_values(FALLBACKS, "stage")
+
+        report["stages"] = histogram_report(stages_before, histogram_buckets(STAGE_LATENCY, "stage"))
+        report["mongo_commands"] = histogram_report(mongo_before, histogram_buckets(MONGO_COMMAND_LATENCY, "command"))
+        report["fallbacks"] = {
+            stage: int(count - fallbacks_before.get(stage, 0))
+            for stage, count in fallbacks.items() if count > fallbacks_before.get(stage, 0)
+        }
+        report["fakes"] = {
+            "twilio_messages": len(twilio_app.state.messages),
+            "llm_calls": llm.calls,
+            "llm_errors": llm.errors,
+            "payment_links": len(razorpay_app.state.payment_links),
+            "emails": smtp.messages,
+            "emails_rejected": smtp.rejected,
+        }
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Throughput benchmark for WhatsAppSender against the local fake Twilio.
+
+Usage (from backend/):
+    python -m benchmarks.bench_whatsapp_sender --messages 500 --concurrency 10 --latency 0.05
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from fakes import serve_in_thread
+from fakes.twilio_server import create_fake_twilio_app
+from whatsapp_sender import WhatsAppSender
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run(base_url: str, messages: int, concurrency: int):
+    sender = WhatsAppSender(
+        "ACbenchmark", "token", "whatsapp:+14155238886",
+        base_url=base_url, max_concurrency=concurrency, backoff_base=0.01,
+    )
+    started = time.perf_counter()
+    try:
+        results = await asyncio.gather(*[
+            sender.send(f"whatsapp:+9100000{i:05d}", f"Benchmark message {i}")
+            for i in range(messages)
+        ])
+    finally:
+        await sender.aclose()
+    elapsed = time.perf_counter() - started
+
+    latencies = [r["latency_ms"] for r in results]
+    return {
+        "messages": messages,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "messages_per_s": round(messages / elapsed, 1),
+        "delivered": sum(1 for r in results if r["delivered"]),
+        "retries": sum(r["attempts"] - 1 for r in results),
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.05, help="fake Twilio response time in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    app = create_fake_twilio_app(
+        latency=args.latency, error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate
+    )
+    with serve_in_thread(app) as base_url:
+        report = asyncio.run(run(base_url, args.messages, args.concurrency))
+    report["fake_requests"] = app.state.requests
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
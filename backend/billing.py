@@ -0,0 +1,164 @@
+"""Pure invoice logic shared by the WhatsApp webhook and the API.
+
+Catalog price matching, fuzzy customer matching, invoice totals and the
+WhatsApp invoice text. Nothing here touches the database or the network,
+which keeps these hot paths cheap to benchmark (see tests/).
+"""
+import logging
+from difflib import SequenceMatcher
+from typing import Optional
+
+from translations import translate
+
+logger = logging.getLogger(__name__)
+
+CUSTOMER_MATCH_THRESHOLD = 0.7  # Minimum SequenceMatcher ratio for a fuzzy match
+WALK_IN_CUSTOMER = "Walk-in Customer"  # What extraction returns when no customer is named
+
+
+def build_product_catalog(products: list) -> dict:
+    """{lower-cased name: price}; later products override earlier ones"""
+    return {p['name'].lower(): p['price'] for p in products}
+
+
+def find_catalog_price(item_name: str, product_catalog: dict) -> Optional[float]:
+    """Find price in catalog with fuzzy matching for plurals and partial names"""
+    item_lower = item_name.lower().strip()
+
+    # Direct match
+    if item_lower in product_catalog:
+        return product_catalog[item_lower]
+
+    # Try removing common plural suffixes
+    for suffix in ['s', 'es', 'ies']:
+        if item_lower.endswith(suffix):
+            singular = item_lower[:-len(suffix)]
+            if suffix == 'ies':
+                singular = singular + 'y'
+            if singular in product_catalog:
+                logger.info(f"Matched '{item_name}' to '{singular}' in catalog")
+                return product_catalog[singular]
+
+    # Try adding 's' (reverse check)
+    plural = item_lower + 's'
+    if plural in product_catalog:
+        logger.info(f"Matched '{item_name}' to '{plural}' in catalog")
+        return product_catalog[plural]
+
+    # Partial match
+    for catalog_item, price in product_catalog.items():
+        if catalog_item in item_lower or item_lower in catalog_item:
+            logger.info(f"Partial match '{item_name}' to '{catalog_item}' in catalog")
+            return price
+
+    return None
+
+
+def best_customer_match(customer_name: str, customers: list, threshold: float = CUSTOMER_MATCH_THRESHOLD):
+    """(customer, similarity) for the most similar name at or above threshold, else (None, 0.0)"""
+    best_match = None
+    best_ratio = 0.0
+    name = customer_name.lower()
+    for customer in customers:
+        ratio = SequenceMatcher(None, name, customer['name'].lower()).ratio()
+        if ratio > best_ratio and ratio >= threshold:
+            best_ratio = ratio
+            best_match = customer
+    return best_match, best_ratio
+
+
+def merge_invoice_data(parts: list) -> dict:
+    """One sale from extractions of consecutive transcript chunks, in order.
+
+    Items and missing prices are concatenated; the customer fields come from
+    the first chunk that names someone other than the walk-in customer.
+    """
+    merged = {"customer_name": WALK_IN_CUSTOMER, "items": [], "missing_prices": []}
+    for part in parts:
+        merged["items"].extend(part.get("items", []))
+        merged["missing_prices"].extend(part.get("missing_prices", []))
+        name = part.get("customer_name") or WALK_IN_CUSTOMER
+        if merged["customer_name"] == WALK_IN_CUSTOMER and name != WALK_IN_CUSTOMER:
+            merged.update({key: value for key, value in part.items() if key.startswith("customer_")})
+    return merged
+
+
+def line_total(quantity: float, price: float) -> float:
+    return quantity * price
+
+
+def invoice_totals(line_totals: list, tax_rate: float) -> tuple:
+    """(subtotal, tax, total) for an invoice's line totals"""
+    subtotal = sum(line_totals)
+    tax = subtotal * tax_rate
+    return subtotal, tax, subtotal + tax
+
+
+def format_invoice_text(invoice, language: str, backend_url: str) -> str:
+    """Formatted invoice text for WhatsApp with multi-language support"""
+    t = lambda key: translate(key, language)
+
+    lines = [
+        f"📄 {t('invoice')}",
+        "━━━━━━━━━━━━━━━━━━━━━━━",
+        f"{t('invoice_number')}: {invoice.invoice_number}",
+        f"{t('date')}: {invoice.date.strftime('%Y-%m-%d %H:%M')}",
+        f"{t('customer')}: {invoice.customer_name}",
+    ]
+
+    # Add customer phone if available
+    if invoice.customer_phone:
+        lines.append(f"📱 Phone: {invoice.customer_phone}")
+
+    # Add customer email if available
+    if invoice.customer_email:
+        lines.append(f"📧 Email: {invoice.customer_email}")
+
+    lines.extend([
+        "",
+        t('items') + ":"
+    ])
+
+    for item in invoice.items:
+        lines.append(f"\n• {item.name}")
+        lines.append(f"  {t('quantity')}: {item.quantity} × ₹{item.price:.2f} = ₹{item.total:.2f}")
+
+    lines.extend([
+        "",
+        "━━━━━━━━━━━━━━━━━━━━━━━",
+        f"{t('subtotal')}:    ₹{invoice.subtotal:.2f}",
+        f"{t('tax')} ({invoice.tax_rate*100:.0f}%):      ₹{invoice.tax:.2f}",
+        "━━━━━━━━━━━━━━━━━━━━━━━",
+        f"{t('grand_total')}:       ₹{invoice.total:.2f}",
+        ""
+    ])
+
+    # Add credit/due information if partial payment
+    if invoice.amount_paid > 0:
+        lines.extend([
+            f"{t('amount_paid')}:  ₹{invoice.amount_paid:.2f}",
+            f"{t('amount_due')}:   ₹{invoice.amount_due:.2f}",
+            ""
+        ])
+
+    # Add PDF download link
+    lines.extend([
+        f"📄 {t('download_pdf')}:",
+        f"{backend_url}/api/invoices/{invoice.id}/pdf",
+        ""
+    ])
+
+    # Add payment link if available
+    if invoice.payment_link:
+        lines.extend([
+            f"💳 {t('pay_now')}:",
+            invoice.payment_link,
+            ""
+        ])
+    else:
+        lines.append(f"💳 {t('payment_due')}")
+        lines.append("")
+
+    lines.append(t('thank_you'))
+
+    return "\n".join(lines)
@@ -0,0 +1,202 @@
+"""Streaming bulk import of products and customers from CSV or XLSX uploads.
+
+Rows are read incrementally from the uploaded file in a worker thread, one
+batch at a time, and validated against the same Create models as the
+single-item endpoints. A row updates the shopkeeper's record with the same
+normalized name (and the same phone number, when the row has one) or inserts
+a new one, with one bulk_write per batch. Names are not unique, so a row that
+matches several records is reported instead of guessing. Invalid rows are
+reported individually and never stop the import. A CSV that
+is not UTF-8 stops it with a 400 carrying the same report, since rows past
+that point cannot be read.
+"""
+import asyncio
+import csv
+import io
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Optional
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from search import phone_key, phone_matches, search_fields
+
+logger = logging.getLogger(__name__)
+
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 500))
+MAX_IMPORT_BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+
+
+def _csv_rows(upload):
+    text = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+    try:
+        reader = csv.reader(text)
+        header = next(reader, [])
+        for row in reader:
+            yield header, row
+    finally:
+        text.detach()
+
+
+def _xlsx_rows(upload):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise HTTPException(status_code=400, detail="XLSX import needs openpyxl; upload a CSV instead")
+    workbook = load_workbook(upload.file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, ())
+        for row in rows:
+            yield header, row
+    finally:
+        workbook.close()
+
+
+def iter_records(upload):
+    """Yield (row_number, {column: value}) for every non-blank data row.
+
+    Column names are matched case-insensitively; row numbers count the header
+    as row 1 so they match what a spreadsheet shows.
+    """
+    filename = (upload.filename or "").lower()
+    if filename.endswith(".xlsx"):
+        rows = _xlsx_rows(upload)
+    elif filename.endswith(".csv") or upload.content_type in ("text/csv", "application/vnd.ms-excel"):
+        rows = _csv_rows(upload)
+    else:
+        raise HTTPException(status_code=400, detail="Upload a .csv or .xlsx file")
+
+    for row_number, (header, row) in enumerate(rows, start=2):
+        columns = [str(name or "").strip().lower() for name in header]
+        record = {
+            column: value.strip() if isinstance(value, str) else value
+            for column, value in zip(columns, row)
+            if column and value not in (None, "")
+        }
+        if record:
+            yield row_number, record
+
+
+def _report(summary: dict, row_number: int, error: str):
+    summary["failed"] += 1
+    if len(summary["errors"]) < MAX_REPORTED_ERRORS:
+        summary["errors"].append({"row": row_number, "error": error})
+
+
+def _error_message(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(part) for part in e['loc'])}: {e['msg']}" for e in error.errors())
+
+
+def _text_fields(model) -> set:
+    return {name for name, field in model.model_fields.items() if field.annotation in (str, Optional[str])}
+
+
+def _coerce(record: dict, text_fields: set) -> dict:
+    """Spreadsheets hand back phone numbers and codes as numbers; keep them as text"""
+    for name in text_fields & record.keys():
+        value = record[name]
+        if isinstance(value, float) and value.is_integer():
+            record[name] = str(int(value))
+        elif isinstance(value, (int, float)):
+            record[name] = str(value)
+    return record
+
+
+def _validate(create_model, user_id: str, record: dict) -> dict:
+    """The row's columns, validated; columns the file lacks are left out, not defaulted"""
+    model = create_model(**_coerce({**record, "user_id": user_id}, _text_fields(create_model)))
+    return model.model_dump(exclude_unset=True)
+
+
+def _match(candidates: list, phone: str):
+    """(document the row updates, or None to insert; error) among the
+    shopkeeper's documents with the row's normalized name"""
+    matches = phone_matches(candidates, phone)
+    if len(matches) > 1:
+        return None, f"Not imported: {len(matches)} existing records have this name and phone number cannot tell them apart"
+    return (matches[0] if matches else None), None
+
+
+def _write(full_model, data: dict, match: Optional[dict]):
+    """InsertOne for a new document with defaults for missing columns, or
+    UpdateOne where the file's columns overwrite and everything else is kept"""
+    if match is None:
+        return InsertOne({**full_model(**data).model_dump(), **search_fields(data["name"], data.get("phone"))})
+    phone = data["phone"] if "phone" in data else match.get("phone")
+    return UpdateOne({"id": match["id"]}, {"$set": {**data, **search_fields(data["name"], phone)}})
+
+
+async def import_records(collection, create_model, full_model, user_id: str, upload,
+                         batch_size: int = IMPORT_BATCH_SIZE) -> dict:
+    """Validate and import every row of `upload`, batch by batch"""
+    records = iter_records(upload)
+    summary = {"rows": 0, "inserted": 0, "updated": 0, "failed": 0, "errors": []}
+    started = datetime.now(timezone.utc)
+    last_row = 1
+    unreadable = False
+
+    while True:
+        try:
+            batch = await asyncio.to_thread(lambda: list(islice(records, batch_size)))
+        except UnicodeDecodeError:
+            _report(summary, last_row + 1, "This row and the rest of the file were not imported: "
+                                           "the file is not UTF-8 text. Save it as CSV UTF-8 and import it again")
+            unreadable = True
+            break
+        if not batch:
+            break
+        last_row = batch[-1][0]
+        rows = []
+        for row_number, record in batch:
+            summary["rows"] += 1
+            try:
+                data = _validate(create_model, user_id, record)
+            except ValidationError as e:
+                _report(summary, row_number, _error_message(e))
+                continue
+            rows.append((row_number, data, search_fields(data["name"])["name_key"], phone_key(data.get("phone"))))
+
+        existing = defaultdict(list)
+        async for doc in collection.find(
+            {"user_id": user_id, "name_key": {"$in": list({name_key for _, _, name_key, _ in rows})}},
+            {"_id": 0, "id": 1, "name_key": 1, "phone": 1}
+        ):
+            existing[doc["name_key"]].append(doc)
+
+        # Rows for the same record inside one batch collapse to the last one
+        operations = {}
+        for row_number, data, name_key, phone in rows:
+            match, error = _match(existing[name_key], phone)
+            if error:
+                _report(summary, row_number, error)
+                continue
+            target = match["id"] if match else (name_key, phone)
+            operations[target] = (row_number, _write(full_model, data, match))
+        if operations:
+            row_numbers = [row_number for row_number, _ in operations.values()]
+            try:
+                result = (await collection.bulk_write([op for _, op in operations.values()], ordered=False)).bulk_api_result
+            except BulkWriteError as e:
+                result = e.details
+                for error in result["writeErrors"]:
+                    _report(summary, row_numbers[error["index"]], error["errmsg"])
+            summary["inserted"] += result["nInserted"]
+            summary["updated"] += result["nMatched"]
+
+    summary["errors_truncated"] = summary["failed"] > len(summary["errors"])
+    summary["elapsed_ms"] = round((datetime.now(timezone.utc) - started).total_seconds() * 1000, 2)
+    logger.info(
+        f"Imported {collection.name} for {user_id}: {summary['rows']} rows, {summary['inserted']} inserted, "
+        f"{summary['updated']} updated, {summary['failed']} failed"
+    )
+    if unreadable:
+        raise HTTPException(status_code=400, detail=summary)
+    return summary
@@ -0,0 +1,58 @@
+"""Per-shopkeeper cache of the product catalog and customer names.
+
+Every voice note needs the shopkeeper's catalog (plus the shared
+default-user catalog) to price items and match customers. Loading it once per
+TTL instead of once per message keeps invoice extraction off the database;
+writes invalidate the affected entry and bulk imports refresh it once.
+"""
+import asyncio
+import logging
+import os
+
+from cachetools import TTLCache
+
+from metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+SHARED_USER_ID = "default-user"
+CATALOG_CACHE_TTL = float(os.environ.get('CATALOG_CACHE_TTL', 300))
+
+_catalog_cache = TTLCache(maxsize=1024, ttl=CATALOG_CACHE_TTL)
+
+
+async def load_catalog(db, user_id: str) -> dict:
+    """Read a shopkeeper's products, the shared products and known customers"""
+    user_products, default_products, customers = await asyncio.gather(
+        db.products.find({"user_id": user_id}, {"_id": 0, "name": 1, "price": 1}).to_list(1000),
+        db.products.find({"user_id": SHARED_USER_ID}, {"_id": 0, "name": 1, "price": 1}).to_list(1000),
+        db.customers.find(
+            {"$or": [{"user_id": user_id}, {"user_id": SHARED_USER_ID}]},
+            {"_id": 0, "name": 1}
+        ).to_list(100),
+    )
+    return {"user_products": user_products, "default_products": default_products, "customers": customers}
+
+
+async def get_catalog(db, user_id: str) -> dict:
+    catalog = _catalog_cache.get(user_id)
+    record_cache("catalog", catalog is not None)
+    if catalog is None:
+        catalog = await load_catalog(db, user_id)
+        _catalog_cache[user_id] = catalog
+    return catalog
+
+
+def invalidate_catalog(user_id: str):
+    """Drop a cached catalog; shared products invalidate every shopkeeper"""
+    if user_id == SHARED_USER_ID:
+        _catalog_cache.clear()
+    else:
+        _catalog_cache.pop(user_id, None)
+
+
+async def refresh_catalog(db, user_id: str):
+    invalidate_catalog(user_id)
+    if user_id != SHARED_USER_ID:
+        _catalog_cache[user_id] = await load_catalog(db, user_id)
+    logger.info(f"Catalog cache refreshed for {user_id}")
@@ -0,0 +1,217 @@
+"""Incremental maintenance of customer aggregates (total_purchases, total_due).
+
+Every invoice write applies the difference between the invoice before and
+after the change as an atomic $inc on the customer, so no write path has to
+re-read the customer's history. reconcile_customer_stats recomputes the
+aggregates with one aggregation pipeline and repairs any drift. A repair only
+applies while the customer still holds the values it was checked against,
+so it never overwrites a concurrent $inc. The periodic job runs in one
+process per interval, whatever the number of workers.
+
+Run from backend/ as a cron job:
+    python -m customer_stats
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+# Differences below half a paisa are rounding noise, not drift
+DRIFT_TOLERANCE = 0.005
+# job_runs document that hands each periodic run to one process
+RECONCILE_JOB_ID = "customer_stats_reconcile"
+
+
+def _contribution(invoice_doc: Optional[dict]) -> dict:
+    if not invoice_doc or not invoice_doc.get('customer_id'):
+        return {}
+    total = invoice_doc.get('total', 0) or 0
+    amount_paid = invoice_doc.get('amount_paid', 0) or 0
+    amount_due = invoice_doc.get('amount_due')
+    if amount_due is None:
+        amount_due = total - amount_paid
+    return {invoice_doc['customer_id']: (total, amount_due)}
+
+
+def invoice_deltas(before: Optional[dict], after: Optional[dict]) -> dict:
+    """Return {customer_id: {"total_purchases": x, "total_due": y}} for a change.
+
+    before is None for a newly created invoice and after is None for a deleted
+    one. An invoice moved to another customer is removed from the first and
+    added to the second.
+    """
+    deltas = defaultdict(lambda: {"total_purchases": 0.0, "total_due": 0.0})
+    for customer_id, (total, due) in _contribution(after).items():
+        deltas[customer_id]["total_purchases"] += total
+        deltas[customer_id]["total_due"] += due
+    for customer_id, (total, due) in _contribution(before).items():
+        deltas[customer_id]["total_purchases"] -= total
+        deltas[customer_id]["total_due"] -= due
+    return {
+        customer_id: {field: round(value, 2) for field, value in inc.items()}
+        for customer_id, inc in deltas.items()
+        if any(abs(value) >= DRIFT_TOLERANCE for value in inc.values())
+    }
+
+
+def _customer_updates(before: Optional[dict], after: Optional[dict]) -> list:
+    updates = []
+    for customer_id, inc in invoice_deltas(before, after).items():
+        update = {"$inc": inc}
+        if before is None and after is not None:
+            update["$max"] = {"last_purchase": after.get('date') or datetime.now(timezone.utc)}
+        updates.append((customer_id, update))
+    return updates
+
+
+def delta_operations(before: Optional[dict], after: Optional[dict]) -> list:
+    """UpdateOne operations applying an invoice change to its customers"""
+    return [UpdateOne({"id": customer_id}, update) for customer_id, update in _customer_updates(before, after)]
+
+
+def merged_delta_operations(changes: list) -> list:
+    """One UpdateOne per customer for many (before, after) invoice changes"""
+    incs = defaultdict(lambda: defaultdict(float))
+    latest = {}
+    for before, after in changes:
+        for customer_id, update in _customer_updates(before, after):
+            for field, value in update["$inc"].items():
+                incs[customer_id][field] += value
+            if "$max" in update:
+                last_purchase = update["$max"]["last_purchase"]
+                latest[customer_id] = max(latest.get(customer_id, last_purchase), last_purchase)
+    operations = []
+    for customer_id, inc in incs.items():
+        update = {"$inc": {field: round(value, 2) for field, value in inc.items()}}
+        if customer_id in latest:
+            update["$max"] = {"last_purchase": latest[customer_id]}
+        operations.append(UpdateOne({"id": customer_id}, update))
+    return operations
+
+
+async def apply_invoice_change(db, before: Optional[dict], after: Optional[dict]):
+    """Apply one invoice create/update/payment/delete to customer aggregates"""
+    updates = _customer_updates(before, after)
+    if len(updates) == 1:
+        customer_id, update = updates[0]
+        await db.customers.update_one({"id": customer_id}, update)
+    elif updates:
+        await db.customers.bulk_write(delta_operations(before, after), ordered=False)
+
+
+async def reconcile_customer_stats(db, user_id: Optional[str] = None, repair: bool = True) -> dict:
+    """Recompute customer aggregates from invoices and fix any that drifted"""
+    match = {"customer_id": {"$nin": [None, ""]}}
+    if user_id:
+        match["user_id"] = user_id
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": "$customer_id",
+            "total_purchases": {"$sum": "$total"},
+            "total_due": {"$sum": {"$ifNull": ["$amount_due", {"$subtract": ["$total", {"$ifNull": ["$amount_paid", 0]}]}]}},
+        }},
+    ]
+    expected = {}
+    async for row in db.invoices.aggregate(pipeline, allowDiskUse=True):
+        expected[row["_id"]] = row
+
+    customer_filter = {"user_id": user_id} if user_id else {}
+    operations = []
+    checked = 0
+    async for customer in db.customers.find(
+        customer_filter, {"_id": 0, "id": 1, "total_purchases": 1, "total_due": 1}
+    ):
+        checked += 1
+        row = expected.get(customer["id"], {})
+        fixed = {
+            "total_purchases": round(row.get("total_purchases", 0.0), 2),
+            "total_due": round(row.get("total_due", 0.0), 2),
+        }
+        if any(abs((customer.get(field) or 0) - value) >= DRIFT_TOLERANCE for field, value in fixed.items()):
+            # Matches only if no invoice write has moved the customer since it was read
+            read = {field: customer.get(field) for field in fixed}
+            operations.append(UpdateOne({"id": customer["id"], **read}, {"$set": fixed}))
+
+    repaired = 0
+    if repair and operations:
+        repaired = (await db.customers.bulk_write(operations, ordered=False)).modified_count
+
+    summary = {
+        "customers_checked": checked,
+        "customers_drifted": len(operations),
+        "customers_repaired": repaired,
+        "repaired": repair,
+    }
+    if operations:
+        logger.warning(f"Customer stats drift: {summary}")
+    else:
+        logger.info(f"Customer stats reconciled: {summary}")
+    return summary
+
+
+async def claim_reconcile_run(db, interval: float) -> bool:
+    """True for the one process that gets the run due now; the next one is due `interval` seconds later"""
+    now = datetime.now(timezone.utc)
+    try:
+        await db.job_runs.update_one(
+            {"_id": RECONCILE_JOB_ID, "next_run": {"$lte": now}},
+            {"$set": {"next_run": now + timedelta(seconds=interval), "claimed_at": now}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        # The document exists and its next run is still ahead: another process took this one
+        return False
+    return True
+
+
+async def run_periodic_reconciler(db, interval: float):
+    """Reconcile customer aggregates every `interval` seconds until cancelled.
+
+    Every worker runs this loop, but only the one that claims the due run
+    reconciles, so the aggregation runs once per interval.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if await claim_reconcile_run(db, interval):
+                await reconcile_customer_stats(db)
+        except Exception as e:
+            logger.error(f"Customer stats reconciliation failed: {str(e)}")
+
+
+def main():
+    import argparse
+    import json
+    import os
+    from pathlib import Path
+
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Check and repair customer purchase/due aggregates")
+    parser.add_argument("--user-id", help="only reconcile this shopkeeper's customers")
+    parser.add_argument("--dry-run", action="store_true", help="report drift without repairing it")
+    args = parser.parse_args()
+
+    load_dotenv(Path(__file__).parent / '.env')
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True, tzinfo=timezone.utc)
+    try:
+        summary = asyncio.run(reconcile_customer_stats(
+            client[os.environ['DB_NAME']], user_id=args.user_id, repair=not args.dry_run
+        ))
+    finally:
+        client.close()
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
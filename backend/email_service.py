@@ -6,6 +6,8 @@ from email.mime.application import MIMEApplication
 import os
 import logging
 
+from metrics import timed
+
 logger = logging.getLogger(__name__)
 
 SMTP_HOST = os.environ.get('SMTP_HOST', 'smtp.gmail.com')
@@ -15,6 +17,7 @@ SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD', '')
 SMTP_FROM_EMAIL = os.environ.get('SMTP_FROM_EMAIL', SMTP_USERNAME)
 SMTP_FROM_NAME = os.environ.get('SMTP_FROM_NAME', 'VoiceBill')
 
+@timed("email", failed=lambda sent: not sent)
 def send_invoice_email(
     to_email: str,
     customer_name: str,
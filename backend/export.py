@@ -0,0 +1,105 @@
+"""Constant-memory invoice export as CSV or NDJSON.
+
+Documents flow from a Motor cursor (server-side projection, fixed batch size)
+through an async generator straight into a StreamingResponse, so memory stays
+flat no matter how many invoices are exported.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+
+EXPORT_BATCH_SIZE = 1000
+# Rows are buffered and flushed together to avoid one tiny write per line
+FLUSH_EVERY = 200
+
+EXPORT_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "invoice_number": 1,
+    "date": 1,
+    "user_id": 1,
+    "customer_id": 1,
+    "customer_name": 1,
+    "customer_phone": 1,
+    "customer_email": 1,
+    "items": 1,
+    "subtotal": 1,
+    "tax_rate": 1,
+    "tax": 1,
+    "total": 1,
+    "amount_paid": 1,
+    "amount_due": 1,
+    "status": 1,
+    "payment_status": 1,
+    "payment_id": 1,
+}
+
+INVOICE_COLUMNS = [
+    "id", "invoice_number", "date", "user_id", "customer_id", "customer_name", "customer_phone",
+    "customer_email", "subtotal", "tax_rate", "tax", "total", "amount_paid", "amount_due",
+    "status", "payment_status", "payment_id",
+]
+ITEM_COLUMNS = ["item_name", "item_quantity", "item_price", "item_total"]
+CSV_COLUMNS = INVOICE_COLUMNS + ITEM_COLUMNS
+
+MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def open_export_cursor(db, query: dict):
+    return db.invoices.find(query, EXPORT_PROJECTION).sort([("date", -1), ("id", -1)]).batch_size(EXPORT_BATCH_SIZE)
+
+
+async def stream_ndjson(cursor):
+    """One JSON invoice per line"""
+    lines = []
+    try:
+        async for doc in cursor:
+            lines.append(json.dumps(doc, default=_plain, ensure_ascii=False))
+            if len(lines) >= FLUSH_EVERY:
+                yield ("\n".join(lines) + "\n").encode()
+                lines = []
+        if lines:
+            yield ("\n".join(lines) + "\n").encode()
+    finally:
+        await cursor.close()
+
+
+async def stream_csv(cursor):
+    """One CSV row per line item; invoices without items get a single row"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    yield buffer.getvalue().encode()
+    buffer.seek(0)
+    buffer.truncate()
+
+    rows = 0
+    try:
+        async for doc in cursor:
+            invoice_values = [_plain(doc.get(column, "")) for column in INVOICE_COLUMNS]
+            for item in doc.get("items") or [{}]:
+                writer.writerow(invoice_values + [
+                    item.get("name", ""), item.get("quantity", ""), item.get("price", ""), item.get("total", "")
+                ])
+                rows += 1
+            if rows >= FLUSH_EVERY:
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+                rows = 0
+        if rows:
+            yield buffer.getvalue().encode()
+    finally:
+        await cursor.close()
+
+
+def stream_invoices(db, query: dict, export_format: str):
+    cursor = open_export_cursor(db, query)
+    return stream_csv(cursor) if export_format == "csv" else stream_ndjson(cursor)
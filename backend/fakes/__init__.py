@@ -0,0 +1,31 @@
+"""Local stand-ins for the external services the backend talks to"""
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+import uvicorn
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def serve_in_thread(app, host: str = '127.0.0.1', port: int = None, lifespan: str = 'off'):
+    """Run an ASGI app with uvicorn on a background thread and yield its base URL"""
+    port = port or _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level='warning', lifespan=lifespan))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError(f"Fake server failed to start on {host}:{port}")
+        time.sleep(0.01)
+    try:
+        yield f"http://{host}:{port}"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=5)
@@ -0,0 +1,79 @@
+"""Fake AssemblyAI transcription API for load tests and benchmarks.
+
+There is no real speech recognition: fake_voice_note() embeds the words a
+"speaker" said in the audio bytes, and the fake transcribes an upload by
+reading them back. Point the SDK at it with aai.settings.base_url.
+"""
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+VOICE_NOTE_MAGIC = b"OggS-fake\n"
+
+
+def fake_voice_note(text: str, size: int = 16000) -> bytes:
+    """Audio bytes of roughly `size` that the fake transcribes as `text`"""
+    payload = VOICE_NOTE_MAGIC + text.encode() + b"\n"
+    return payload + b"\0" * max(0, size - len(payload))
+
+
+def spoken_text(audio: bytes) -> str:
+    if not audio.startswith(VOICE_NOTE_MAGIC):
+        return ""
+    return audio[len(VOICE_NOTE_MAGIC):].split(b"\n", 1)[0].decode(errors="replace")
+
+
+def create_fake_assemblyai_app(latency: float = 0.0, error_rate: float = 0.0):
+    """Build an AssemblyAI look-alike serving upload, submit and poll.
+
+    latency: seconds a transcript stays "processing" after it is submitted
+    error_rate: fraction of transcripts that finish with status "error"
+    """
+    app = FastAPI(title="Fake AssemblyAI")
+    app.state.uploads = {}
+    app.state.transcripts = {}
+
+    @app.post("/v2/upload")
+    async def upload(request: Request):
+        upload_id = uuid.uuid4().hex
+        app.state.uploads[upload_id] = await request.body()
+        return {"upload_url": f"{str(request.base_url).rstrip('/')}/uploads/{upload_id}"}
+
+    @app.post("/v2/transcript")
+    async def submit(request: Request):
+        data = await request.json()
+        audio_url = data.get("audio_url", "")
+        transcript = {
+            "id": uuid.uuid4().hex,
+            "audio_url": audio_url,
+            "text": spoken_text(app.state.uploads.get(audio_url.rsplit("/", 1)[-1], b"")),
+            "ready_at": time.monotonic() + latency,
+            "failed": random.random() < error_rate,
+        }
+        app.state.transcripts[transcript["id"]] = transcript
+        return _response(transcript, "queued")
+
+    @app.get("/v2/transcript/{transcript_id}")
+    async def poll(transcript_id: str):
+        transcript = app.state.transcripts.get(transcript_id)
+        if not transcript:
+            return JSONResponse({"error": "Transcript not found"}, status_code=404)
+        if time.monotonic() < transcript["ready_at"]:
+            return _response(transcript, "processing")
+        if transcript["failed"]:
+            return _response(transcript, "error")
+        return _response(transcript, "completed")
+
+    return app
+
+
+def _response(transcript: dict, status: str) -> dict:
+    response = {"id": transcript["id"], "audio_url": transcript["audio_url"], "status": status}
+    if status == "completed":
+        response["text"] = transcript["text"]
+    elif status == "error":
+        response["error"] = "Fake transcription failure"
+    return response
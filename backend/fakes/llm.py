@@ -0,0 +1,86 @@
+"""In-process fake of the emergentintegrations LLM chat client.
+
+The LLM gateway is reached through a Python SDK rather than a URL we can
+redirect, so install_fake_llm() registers a look-alike module under the SDK's
+import path. Call it before importing server.
+
+Invoice extraction understands the utterances the load test generates:
+    "sold 2 rice, 3 sugar to Customer 7"
+and price replies return every number found in the text.
+"""
+import asyncio
+import json
+import random
+import re
+import sys
+import types
+
+_SALE = re.compile(r"sold (?P<items>.+?) to (?P<customer>.+)$", re.IGNORECASE)
+_ITEM = re.compile(r"(\d+(?:\.\d+)?)\s+([^,\d]+)")
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+
+
+class FakeLlmProfile:
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = 0
+        self.errors = 0
+
+
+class UserMessage:
+    def __init__(self, text: str):
+        self.text = text
+
+
+def _extract_invoice(text: str) -> dict:
+    transcription = text.split(":", 1)[-1].strip()
+    match = _SALE.search(transcription)
+    if not match:
+        return {"customer_name": "Walk-in Customer", "items": []}
+    items = [
+        {"name": name.strip(), "quantity": float(quantity), "price": None}
+        for quantity, name in _ITEM.findall(match.group("items"))
+    ]
+    return {"customer_name": match.group("customer").strip(), "items": items}
+
+
+def _extract_prices(text: str) -> dict:
+    return {"prices": [float(number) for number in _NUMBER.findall(text)]}
+
+
+def install_fake_llm(latency: float = 0.0, error_rate: float = 0.0) -> FakeLlmProfile:
+    """Replace emergentintegrations.llm.chat with the fake and return its stats"""
+    profile = FakeLlmProfile(latency, error_rate)
+
+    class LlmChat:
+        def __init__(self, api_key: str = None, session_id: str = None, system_message: str = ""):
+            self.system_message = system_message
+
+        def with_model(self, provider: str, model: str):
+            return self
+
+        async def send_message(self, message: UserMessage) -> str:
+            profile.calls += 1
+            if profile.latency:
+                await asyncio.sleep(profile.latency)
+            if random.random() < profile.error_rate:
+                profile.errors += 1
+                raise RuntimeError("Fake LLM gateway failure")
+            if self.system_message.startswith("Extract prices"):
+                return json.dumps(_extract_prices(message.text))
+            return f"```json\n{json.dumps(_extract_invoice(message.text))}\n```"
+
+    chat = types.ModuleType("emergentintegrations.llm.chat")
+    chat.LlmChat = LlmChat
+    chat.UserMessage = UserMessage
+    llm = types.ModuleType("emergentintegrations.llm")
+    llm.chat = chat
+    package = types.ModuleType("emergentintegrations")
+    package.llm = llm
+    sys.modules.update({
+        "emergentintegrations": package,
+        "emergentintegrations.llm": llm,
+        "emergentintegrations.llm.chat": chat,
+    })
+    return profile
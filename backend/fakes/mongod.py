@@ -0,0 +1,45 @@
+"""Throwaway local mongod for load tests"""
+import shutil
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager
+
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+from fakes import _free_port
+
+
+@contextmanager
+def local_mongod(binary: str = "mongod", startup_timeout: float = 30.0):
+    """Start mongod on a free port with a temporary dbpath and yield its URL"""
+    executable = shutil.which(binary)
+    if not executable:
+        raise RuntimeError(f"{binary} not found on PATH; pass --mongo-url to use an existing server")
+    port = _free_port()
+    with tempfile.TemporaryDirectory(prefix="voicebill-mongod-") as dbpath:
+        process = subprocess.Popen(
+            [executable, "--dbpath", dbpath, "--port", str(port), "--bind_ip", "127.0.0.1", "--quiet"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        url = f"mongodb://127.0.0.1:{port}"
+        probe = MongoClient(url, serverSelectionTimeoutMS=500)
+        try:
+            deadline = time.monotonic() + startup_timeout
+            while True:
+                try:
+                    probe.admin.command("ping")
+                    break
+                except PyMongoError:
+                    if process.poll() is not None or time.monotonic() > deadline:
+                        raise RuntimeError(f"mongod did not start on port {port}")
+            yield url
+        finally:
+            probe.close()
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
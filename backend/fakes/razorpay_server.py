@@ -0,0 +1,145 @@
+"""Fake Razorpay API for tests and benchmarks"""
+import asyncio
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+def _error(description: str, status_code: int = 400):
+    return JSONResponse(
+        {"error": {"code": "BAD_REQUEST_ERROR", "description": description}},
+        status_code=status_code,
+    )
+
+
+def create_fake_razorpay_app(latency: float = 0.0, error_rate: float = 0.0):
+    """Build a Razorpay look-alike serving the payment-link and payment endpoints.
+
+    latency: seconds to wait before answering each request
+    error_rate: fraction of payment-link creates answered with 502
+    """
+    app = FastAPI(title="Fake Razorpay")
+    app.state.payment_links = {}
+    app.state.payments = []
+    app.state.create_calls = 0
+
+    @app.post("/v1/payment_links")
+    async def create_payment_link(request: Request):
+        app.state.create_calls += 1
+        if latency:
+            await asyncio.sleep(latency)
+        if random.random() < error_rate:
+            return _error("Fake gateway failure", status_code=502)
+        data = await request.json()
+        if not isinstance(data.get("amount"), int) or data["amount"] <= 0:
+            return _error("The amount must be a positive integer in paise.")
+
+        reference_id = data.get("reference_id")
+        if reference_id and any(
+            link["reference_id"] == reference_id and link["status"] != "cancelled"
+            for link in app.state.payment_links.values()
+        ):
+            return _error(f"Payment Link with reference {reference_id} already exists")
+
+        link_id = f"plink_{uuid.uuid4().hex[:14]}"
+        link = {
+            "id": link_id,
+            "amount": data["amount"],
+            "amount_paid": 0,
+            "currency": data.get("currency", "INR"),
+            "description": data.get("description", ""),
+            "reference_id": reference_id or "",
+            "customer": data.get("customer", {}),
+            "notes": data.get("notes", {}),
+            "status": "created",
+            "short_url": f"https://rzp.io/i/{link_id[6:]}",
+            "expire_by": data.get("expire_by", 0),
+            "created_at": int(time.time()),
+        }
+        app.state.payment_links[link_id] = link
+        return link
+
+    @app.get("/v1/payment_links/{link_id}")
+    async def fetch_payment_link(link_id: str):
+        link = app.state.payment_links.get(link_id)
+        if not link:
+            return _error("The id provided does not exist", status_code=404)
+        return link
+
+    @app.post("/v1/payment_links/{link_id}/cancel")
+    async def cancel_payment_link(link_id: str):
+        link = app.state.payment_links.get(link_id)
+        if not link:
+            return _error("The id provided does not exist", status_code=404)
+        if link["status"] in ("paid", "cancelled"):
+            return _error(f"Payment Link cannot be cancelled in {link['status']} state")
+        link["status"] = "cancelled"
+        return link
+
+    @app.get("/v1/payment_links")
+    async def list_payment_links(request: Request):
+        if latency:
+            await asyncio.sleep(latency)
+        links = _paginate(list(app.state.payment_links.values()), request.query_params)
+        return {"payment_links": links, "count": len(links)}
+
+    @app.get("/v1/payments")
+    async def list_payments(request: Request):
+        if latency:
+            await asyncio.sleep(latency)
+        payments = _paginate(app.state.payments, request.query_params)
+        return {"entity": "collection", "count": len(payments), "items": payments}
+
+    return app
+
+
+def _paginate(entities: list, params) -> list:
+    """Apply Razorpay's from/to/count/skip listing parameters, newest first"""
+    since = int(params.get("from", 0))
+    until = int(params.get("to", 2 ** 31))
+    count = min(int(params.get("count", 10)), 100)
+    skip = int(params.get("skip", 0))
+    in_window = [e for e in entities if since <= e["created_at"] <= until]
+    in_window.sort(key=lambda e: e["created_at"], reverse=True)
+    return in_window[skip:skip + count]
+
+
+def seed_paid_invoices(app, invoices: list, partial_every: int = 0):
+    """Record captured payments for invoices, as if customers paid their links.
+
+    invoices: dicts with "id" and "total"; every partial_every-th invoice is
+    only half paid when partial_every is set.
+    """
+    now = int(time.time())
+    for i, invoice in enumerate(invoices):
+        amount = int(round(invoice["total"] * 100))
+        if partial_every and i % partial_every == 0:
+            amount //= 2
+        link_id = f"plink_{uuid.uuid4().hex[:14]}"
+        payment_id = f"pay_{uuid.uuid4().hex[:14]}"
+        created_at = now - (i % 3600)
+        app.state.payment_links[link_id] = {
+            "id": link_id,
+            "amount": int(round(invoice["total"] * 100)),
+            "amount_paid": amount,
+            "currency": "INR",
+            "reference_id": invoice["id"],
+            "notes": {"invoice_id": invoice["id"]},
+            "status": "paid" if amount == int(round(invoice["total"] * 100)) else "partially_paid",
+            "short_url": f"https://rzp.io/i/{link_id[6:]}",
+            "payments": [{"payment_id": payment_id, "amount": amount, "status": "captured"}],
+            "expire_by": 0,
+            "created_at": created_at,
+        }
+        app.state.payments.append({
+            "id": payment_id,
+            "entity": "payment",
+            "amount": amount,
+            "currency": "INR",
+            "status": "captured",
+            "notes": {"invoice_id": invoice["id"]},
+            "created_at": created_at,
+        })
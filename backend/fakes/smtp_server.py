@@ -0,0 +1,139 @@
+"""Minimal fake SMTP server for load tests.
+
+Speaks just enough ESMTP for smtplib's starttls() / login() / send_message()
+flow used by email_service: STARTTLS is upgraded with a throwaway self-signed
+certificate and any credentials are accepted.
+"""
+import asyncio
+import datetime
+import random
+import ssl
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from fakes import _free_port
+
+
+def _self_signed_context(directory: Path) -> ssl.SSLContext:
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name).public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now).not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    cert_path, key_path = directory / "cert.pem", directory / "key.pem"
+    cert_path.write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+    key_path.write_bytes(key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ))
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(cert_path, key_path)
+    return context
+
+
+class FakeSMTPServer:
+    """latency: seconds to wait before accepting each message
+    error_rate: fraction of messages rejected with 451
+    """
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.messages = 0
+        self.rejected = 0
+        self.tls_context = None
+
+    async def handle(self, reader, writer):
+        def reply(line: str):
+            writer.write(f"{line}\r\n".encode())
+
+        reply("220 fake-smtp ESMTP ready")
+        tls = False
+        in_data = False
+        try:
+            while line := await reader.readline():
+                if in_data:
+                    if line == b".\r\n":
+                        in_data = False
+                        if self.latency:
+                            await asyncio.sleep(self.latency)
+                        if random.random() < self.error_rate:
+                            self.rejected += 1
+                            reply("451 4.3.0 Fake temporary failure")
+                        else:
+                            self.messages += 1
+                            reply("250 2.0.0 Queued")
+                    continue
+
+                command = line.split(b" ", 1)[0].strip().upper()
+                if command in (b"EHLO", b"HELO"):
+                    extensions = ["AUTH PLAIN LOGIN", "8BITMIME"] if tls else ["STARTTLS"]
+                    writer.write(b"250-fake-smtp\r\n")
+                    for i, extension in enumerate(extensions):
+                        reply(f"250{' ' if i == len(extensions) - 1 else '-'}{extension}")
+                elif command == b"STARTTLS":
+                    reply("220 2.0.0 Ready to start TLS")
+                    await writer.drain()
+                    await writer.start_tls(self.tls_context)
+                    tls = True
+                    continue
+                elif command == b"AUTH":
+                    reply("235 2.7.0 Authentication successful")
+                elif command == b"DATA":
+                    in_data = True
+                    reply("354 End data with <CR><LF>.<CR><LF>")
+                elif command == b"QUIT":
+                    reply("221 2.0.0 Bye")
+                    await writer.drain()
+                    break
+                else:
+                    reply("250 2.0.0 OK")
+                await writer.drain()
+        except (ConnectionError, ssl.SSLError):
+            pass
+        finally:
+            writer.close()
+
+
+@contextmanager
+def serve_smtp(latency: float = 0.0, error_rate: float = 0.0, host: str = '127.0.0.1', port: int = None):
+    """Run a FakeSMTPServer on a background thread and yield it with .host/.port set"""
+    smtp = FakeSMTPServer(latency, error_rate)
+    smtp.host, smtp.port = host, port or _free_port()
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+
+    with tempfile.TemporaryDirectory() as directory:
+        smtp.tls_context = _self_signed_context(Path(directory))
+
+        def run():
+            asyncio.set_event_loop(loop)
+            server = loop.run_until_complete(asyncio.start_server(smtp.handle, smtp.host, smtp.port))
+            started.set()
+            try:
+                loop.run_forever()
+            finally:
+                server.close()
+                loop.run_until_complete(server.wait_closed())
+                loop.close()
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        if not started.wait(timeout=5):
+            raise RuntimeError(f"Fake SMTP server failed to start on {host}:{smtp.port}")
+        try:
+            yield smtp
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout=5)
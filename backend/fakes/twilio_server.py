@@ -0,0 +1,72 @@
+"""Fake Twilio Messages and Media APIs for tests and throughput benchmarks"""
+import asyncio
+import random
+import uuid
+from datetime import datetime, timezone
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+from fakes.assemblyai_server import fake_voice_note
+
+
+def create_fake_twilio_app(latency: float = 0.0, error_rate: float = 0.0, rate_limit_rate: float = 0.0):
+    """Build a Twilio look-alike that accepts message creates.
+
+    latency: seconds to wait before answering each request
+    error_rate: fraction of requests answered with 503
+    rate_limit_rate: fraction of requests answered with 429
+    """
+    app = FastAPI(title="Fake Twilio")
+    app.state.messages = []
+    app.state.requests = 0
+    app.state.media = {}
+
+    @app.post("/2010-04-01/Accounts/{account_sid}/Messages.json")
+    async def create_message(account_sid: str, request: Request):
+        app.state.requests += 1
+        if latency:
+            await asyncio.sleep(latency)
+
+        roll = random.random()
+        if roll < rate_limit_rate:
+            return JSONResponse(
+                {"code": 20429, "message": "Too Many Requests", "status": 429},
+                status_code=429,
+                headers={"Retry-After": "0"},
+            )
+        if roll < rate_limit_rate + error_rate:
+            return JSONResponse({"code": 20500, "message": "Internal Server Error", "status": 503}, status_code=503)
+
+        form = await request.form()
+        message = {
+            "sid": f"SM{uuid.uuid4().hex}",
+            "account_sid": account_sid,
+            "to": form.get("To"),
+            "from": form.get("From"),
+            "body": form.get("Body"),
+            "status": "queued",
+            "date_created": datetime.now(timezone.utc).isoformat(),
+        }
+        app.state.messages.append(message)
+        return JSONResponse(message, status_code=201)
+
+    @app.get("/2010-04-01/Accounts/{account_sid}/Messages/{message_sid}/Media/{media_sid}")
+    async def download_media(account_sid: str, message_sid: str, media_sid: str):
+        if latency:
+            await asyncio.sleep(latency)
+        if random.random() < error_rate:
+            return JSONResponse({"code": 20500, "message": "Internal Server Error", "status": 503}, status_code=503)
+        audio = app.state.media.get(media_sid)
+        if audio is None:
+            return JSONResponse({"code": 20404, "message": "Not Found", "status": 404}, status_code=404)
+        return Response(audio, media_type="audio/ogg")
+
+    return app
+
+
+def add_voice_note(app, base_url: str, account_sid: str, message_sid: str, text: str, size: int = 16000) -> str:
+    """Store a voice note saying `text` and return its MediaUrl for a webhook"""
+    media_sid = f"ME{uuid.uuid4().hex}"
+    app.state.media[media_sid] = fake_voice_note(text, size)
+    return f"{base_url}/2010-04-01/Accounts/{account_sid}/Messages/{message_sid}/Media/{media_sid}"
@@ -0,0 +1,42 @@
+"""Opt-in fast path for list endpoints.
+
+Reads that project exactly a model's fields already have the model's shape,
+so instead of letting FastAPI build a pydantic object per row (and per nested
+line item) and serialize with stdlib json, the documents get any missing
+defaults filled in and are written straight out with orjson.
+"""
+import orjson
+from fastapi.responses import ORJSONResponse
+
+from pagination import set_page_headers
+
+
+class FastJSONResponse(ORJSONResponse):
+    """orjson response that renders UTC datetimes with a Z suffix like pydantic does"""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z | orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS)
+
+
+def model_projection(model) -> dict:
+    """Server-side projection returning only the fields the model exposes"""
+    return {"_id": 0, **{name: 1 for name in model.model_fields}}
+
+
+def model_defaults(model) -> dict:
+    """Optional fields that older documents may lack, by name.
+
+    Each is filled per document the way the model would: a static default as
+    is, a default_factory (ids, timestamps) called anew.
+    """
+    return {name: field for name, field in model.model_fields.items() if not field.is_required()}
+
+
+def fast_list_response(documents: list, defaults: dict, next_cursor=None, total=None) -> FastJSONResponse:
+    for doc in documents:
+        for name, field in defaults.items():
+            if name not in doc:
+                doc[name] = field.get_default(call_default_factory=True)
+    response = FastJSONResponse(documents)
+    set_page_headers(response, next_cursor, total)
+    return response
@@ -0,0 +1,73 @@
+"""Sparse fieldsets for list endpoints.
+
+?fields=invoice_number,total or a named view such as ?fields=summary becomes a
+MongoDB projection plus a slim response model built from the full one, so
+both the bytes read from Mongo and the payload scale with the columns the
+client actually shows.
+"""
+from functools import lru_cache
+from typing import List, Optional
+
+from fastapi import HTTPException, Response
+from pydantic import TypeAdapter, create_model
+
+from pagination import set_page_headers
+
+
+def resolve_fields(model, fields: Optional[str], views: dict) -> Optional[tuple]:
+    """Return the model fields to expose, or None for the full document.
+
+    `fields` is either a view name from `views` or a comma separated list of
+    field names. The id is always included so rows stay addressable.
+    """
+    if not fields:
+        return None
+    if fields in views:
+        names = views[fields]
+        if names is None:
+            return None
+    else:
+        names = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = [name for name in names if name not in model.model_fields]
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown fields: {', '.join(unknown)}. Views: {', '.join(views)}",
+            )
+    return tuple(dict.fromkeys(["id", *names]))
+
+
+def sparse_projection(names: tuple, sort: list) -> dict:
+    """Projection for the requested fields plus the sort keys the cursor needs"""
+    return {"_id": 0, **{name: 1 for name in names}, **{field: 1 for field, _ in sort}}
+
+
+@lru_cache(maxsize=256)
+def sparse_adapter(model, names: tuple) -> TypeAdapter:
+    """List adapter for a slim model carrying only `names` (built once per shape)"""
+    slim = create_model(
+        f"{model.__name__}Fields",
+        **{name: (model.model_fields[name].annotation, model.model_fields[name]) for name in names},
+    )
+    return TypeAdapter(List[slim])
+
+
+def list_responses(model) -> dict:
+    """OpenAPI responses for a list route whose rows can be trimmed by ?fields=.
+
+    The route returns its own Response when fields are selected, so it
+    declares no response_model; the full model is documented here instead.
+    """
+    return {200: {
+        "model": List[model],
+        "description": f"{model.__name__} list; with ?fields= each row carries only id and the selected fields",
+    }}
+
+
+def sparse_list_response(documents: list, adapter: TypeAdapter, next_cursor=None, total=None) -> Response:
+    response = Response(
+        content=adapter.dump_json(adapter.validate_python(documents)),
+        media_type="application/json",
+    )
+    set_page_headers(response, next_cursor, total)
+    return response
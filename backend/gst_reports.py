@@ -0,0 +1,229 @@
+"""Monthly GST period-close reports.
+
+One streamed aggregation pipeline groups a shopkeeper's invoices for the
+month by tax rate and customer; the rate totals and grand totals are folded
+from the same rows. A month that has ended is stored in gst_reports as an
+immutable snapshot: the period-close job takes the previous month's, and the
+first read of any older month takes its own. Later requests (JSON, CSV or
+PDF) then read one document instead of re-scanning the month's invoices.
+The current month is computed on every request.
+
+Snapshots are only taken once the legacy string-date migration is recorded
+as finished (see migrate_dates), since string-dated invoices would be
+missing from them for good; until then ended months are computed too. To
+close a month by hand, run from backend/:
+    python -m gst_reports --period 2024-05
+"""
+import asyncio
+import csv
+import io
+import logging
+import os
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Optional
+
+from fastapi import HTTPException
+from pymongo.errors import DuplicateKeyError
+
+from analytics import ANALYTICS_TZ
+from migrate_dates import dates_migrated
+
+logger = logging.getLogger(__name__)
+
+GST_REPORT_INDEX = [("user_id", 1), ("period", 1)]
+
+AMOUNT_FIELDS = ("taxable_value", "tax", "total")
+CUSTOMER_COLUMNS = ["tax_rate", "customer_id", "customer_name", "invoice_count", "taxable_value", "tax", "total"]
+
+
+def period_bounds(period: str):
+    """UTC [start, end) of a "YYYY-MM" month in the shop's timezone"""
+    try:
+        start = datetime.strptime(period, "%Y-%m").replace(tzinfo=ANALYTICS_TZ)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Period must look like YYYY-MM")
+    end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+    return start.astimezone(timezone.utc), end.astimezone(timezone.utc)
+
+
+def previous_period(now: Optional[datetime] = None) -> str:
+    local = (now or datetime.now(timezone.utc)).astimezone(ANALYTICS_TZ)
+    year, month = (local.year - 1, 12) if local.month == 1 else (local.year, local.month - 1)
+    return f"{year:04d}-{month:02d}"
+
+
+def is_closed(period: str, now: Optional[datetime] = None) -> bool:
+    """A period is closed once its last local day has ended"""
+    return period_bounds(period)[1] <= (now or datetime.now(timezone.utc))
+
+
+def _amount(value: float) -> float:
+    return round(value or 0, 2)
+
+
+async def build_gst_report(db, user_id: str, period: str) -> dict:
+    """Aggregate one month of invoices by tax rate and customer"""
+    start, end = period_bounds(period)
+    pipeline = [
+        {"$match": {"user_id": user_id, "date": {"$gte": start, "$lt": end}}},
+        {"$group": {
+            "_id": {
+                "tax_rate": {"$ifNull": ["$tax_rate", 0]},
+                "customer_id": {"$ifNull": ["$customer_id", ""]},
+                "customer_name": {"$ifNull": ["$customer_name", ""]},
+            },
+            "invoice_count": {"$sum": 1},
+            "taxable_value": {"$sum": "$subtotal"},
+            "tax": {"$sum": "$tax"},
+            "total": {"$sum": "$total"},
+        }},
+        {"$sort": {"_id.tax_rate": 1, "taxable_value": -1}},
+    ]
+
+    by_customer = []
+    by_rate = defaultdict(lambda: {"invoice_count": 0, "taxable_value": 0.0, "tax": 0.0, "total": 0.0})
+    async for row in db.invoices.aggregate(pipeline, allowDiskUse=True):
+        tax_rate = round(row["_id"]["tax_rate"] * 100, 2)
+        entry = {
+            "tax_rate": tax_rate,
+            "customer_id": row["_id"]["customer_id"],
+            "customer_name": row["_id"]["customer_name"],
+            "invoice_count": row["invoice_count"],
+            "taxable_value": _amount(row["taxable_value"]),
+            "tax": _amount(row["tax"]),
+            "total": _amount(row["total"]),
+        }
+        by_customer.append(entry)
+        rate = by_rate[tax_rate]
+        rate["invoice_count"] += entry["invoice_count"]
+        for field in AMOUNT_FIELDS:
+            rate[field] += entry[field]
+
+    rates = [
+        {"tax_rate": tax_rate, "invoice_count": values["invoice_count"],
+         **{field: _amount(values[field]) for field in AMOUNT_FIELDS}}
+        for tax_rate, values in sorted(by_rate.items())
+    ]
+    totals = {
+        "invoice_count": sum(rate["invoice_count"] for rate in rates),
+        **{field: _amount(sum(rate[field] for rate in rates)) for field in AMOUNT_FIELDS},
+    }
+    return {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "period": period,
+        "period_start": start,
+        "period_end": end,
+        "final": False,
+        "generated_at": datetime.now(timezone.utc),
+        "totals": totals,
+        "by_rate": rates,
+        "by_customer": by_customer,
+    }
+
+
+async def get_gst_report(db, user_id: str, period: str) -> dict:
+    """The snapshot for a closed month, taken now if there is none yet, or a
+    live report (final=False) for an open month or before the date migration"""
+    snapshot = await db.gst_reports.find_one({"user_id": user_id, "period": period}, {"_id": 0})
+    if snapshot:
+        return snapshot
+    if is_closed(period) and await dates_migrated(db):
+        return await snapshot_gst_report(db, user_id, period)
+    return await build_gst_report(db, user_id, period)
+
+
+async def snapshot_gst_report(db, user_id: str, period: str) -> dict:
+    """Store the final report for an ended month, unless one is already stored"""
+    report = await build_gst_report(db, user_id, period)
+    report["final"] = True
+    try:
+        await db.gst_reports.insert_one(dict(report))
+    except DuplicateKeyError:
+        # Another worker closed the period first; its snapshot is authoritative
+        return await db.gst_reports.find_one({"user_id": user_id, "period": period}, {"_id": 0})
+    logger.info(f"GST report snapshot stored for {user_id} {period}")
+    return report
+
+
+async def close_period(db, period: str) -> dict:
+    """Snapshot a closed month for every shopkeeper that invoiced in it"""
+    if not is_closed(period):
+        raise ValueError(f"Period {period} has not ended yet")
+    if not await dates_migrated(db):
+        raise RuntimeError("Legacy string dates have not been migrated; run `python -m migrate_dates` first")
+    start, end = period_bounds(period)
+    user_ids = await db.invoices.distinct("user_id", {"date": {"$gte": start, "$lt": end}})
+    existing = set(await db.gst_reports.distinct("user_id", {"period": period}))
+    created = 0
+    for user_id in user_ids:
+        if user_id and user_id not in existing:
+            await snapshot_gst_report(db, user_id, period)
+            created += 1
+    summary = {"period": period, "shopkeepers": len(user_ids), "snapshots_created": created}
+    logger.info(f"GST period close: {summary}")
+    return summary
+
+
+async def run_period_close(db, interval: float):
+    """Close the previous month every `interval` seconds until cancelled"""
+    while True:
+        try:
+            await close_period(db, previous_period())
+        except Exception as e:
+            logger.error(f"GST period close failed: {str(e)}")
+        await asyncio.sleep(interval)
+
+
+def report_csv(report: dict) -> str:
+    """Per rate and customer rows followed by rate subtotals and the grand total"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CUSTOMER_COLUMNS)
+    for entry in report["by_customer"]:
+        writer.writerow([entry[column] for column in CUSTOMER_COLUMNS])
+    for rate in report["by_rate"]:
+        writer.writerow([rate["tax_rate"], "", f"Subtotal {rate['tax_rate']}%", rate["invoice_count"],
+                         rate["taxable_value"], rate["tax"], rate["total"]])
+    totals = report["totals"]
+    writer.writerow(["", "", "Total", totals["invoice_count"], totals["taxable_value"], totals["tax"], totals["total"]])
+    return buffer.getvalue()
+
+
+async def create_gst_report_indexes(db):
+    await db.gst_reports.create_index(GST_REPORT_INDEX, unique=True)
+
+
+def main():
+    import argparse
+    import json
+    from pathlib import Path
+
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Snapshot monthly GST reports for a closed period")
+    parser.add_argument("--period", default=previous_period(), help="YYYY-MM, defaults to last month")
+    args = parser.parse_args()
+
+    load_dotenv(Path(__file__).parent / '.env')
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True, tzinfo=timezone.utc)
+    db = client[os.environ['DB_NAME']]
+
+    async def run():
+        await create_gst_report_indexes(db)
+        return await close_period(db, args.period)
+
+    try:
+        summary = asyncio.run(run())
+    finally:
+        client.close()
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
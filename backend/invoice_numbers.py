@@ -0,0 +1,64 @@
+"""Invoice numbers reserved from a per-shopkeeper counter.
+
+Numbers come from one atomic $inc on invoice_counters, so concurrent voice
+notes and batch requests are never handed the same number, and a batch of
+any size reserves its whole block in a single round trip. Numbers are not
+gap-free: a number reserved for an invoice that then fails to save is
+skipped. The first time a shopkeeper's counter is used it is seeded from
+their highest existing invoice number, and a unique index on
+(user_id, invoice_number) rejects any duplicate that slips through.
+"""
+import logging
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+logger = logging.getLogger(__name__)
+
+INVOICE_NUMBER_INDEX = [("user_id", 1), ("invoice_number", 1)]
+
+
+def format_invoice_number(user_id: str, sequence: int) -> str:
+    return f"INV-{user_id[:8]}-{sequence:04d}"
+
+
+def invoice_sequence(invoice_number: str) -> int:
+    """The numeric suffix of an invoice number, or 0 if it has none"""
+    suffix = (invoice_number or "").rpartition("-")[2]
+    return int(suffix) if suffix.isdigit() else 0
+
+
+async def _seed_counter(db, user_id: str):
+    # Deleted invoices leave gaps, so the count can be below the highest number in use.
+    # Suffixes grow past four digits, so the maximum is taken here rather than by sorting.
+    highest = 0
+    async for invoice in db.invoices.find({"user_id": user_id}, {"_id": 0, "invoice_number": 1}):
+        highest = max(highest, invoice_sequence(invoice.get("invoice_number")))
+    try:
+        await db.invoice_counters.insert_one({"user_id": user_id, "seq": highest})
+    except DuplicateKeyError:
+        pass  # Seeded concurrently
+
+
+async def reserve_invoice_numbers(db, user_id: str, count: int = 1) -> list:
+    """Reserve `count` consecutive invoice numbers for a shopkeeper"""
+    for _ in range(2):
+        counter = await db.invoice_counters.find_one_and_update(
+            {"user_id": user_id},
+            {"$inc": {"seq": count}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if counter:
+            last = counter["seq"]
+            return [format_invoice_number(user_id, n) for n in range(last - count + 1, last + 1)]
+        await _seed_counter(db, user_id)
+    raise RuntimeError(f"Could not reserve invoice numbers for {user_id}")
+
+
+async def create_invoice_counter_indexes(db):
+    await db.invoice_counters.create_index("user_id", unique=True)
+    try:
+        await db.invoices.create_index(INVOICE_NUMBER_INDEX, unique=True)
+    except OperationFailure as e:
+        # Numbers handed out by the old count-based scheme can repeat; renumber those first
+        logger.error(f"Unique invoice number index not created, duplicate numbers exist: {str(e)}")
@@ -0,0 +1,135 @@
+"""Customer ledger computed by MongoDB aggregation.
+
+Each invoice is a ledger entry: the invoice total is a debit, the amount paid
+against it is a credit and the running balance comes from $setWindowFields.
+Only the requested page is windowed; the balance carried into the page comes
+from the cursor or from one $group over the earlier entries, so a page costs
+the same for a customer with ten invoices or fifty thousand.
+"""
+from datetime import datetime
+from typing import Optional
+
+from pagination import decode_cursor, encode_cursor, invalid_cursor
+
+# Supports the customer match, the (date, id) sort and keyset seeks
+LEDGER_INDEX = [("customer_id", 1), ("date", 1), ("id", 1)]
+
+_AMOUNT = {"$subtract": [{"$ifNull": ["$total", 0]}, {"$ifNull": ["$amount_paid", 0]}]}
+
+_ENTRY_PROJECTION = {
+    "_id": 0,
+    "invoice_id": "$id",
+    "invoice_number": 1,
+    "date": 1,
+    "status": 1,
+    "debit": {"$ifNull": ["$total", 0]},
+    "credit": {"$ifNull": ["$amount_paid", 0]},
+    "balance": {"$round": ["$balance", 2]},
+}
+
+
+def _running_balance_stage(direction: int) -> dict:
+    return {"$setWindowFields": {
+        "sortBy": {"date": direction, "id": direction},
+        "output": {"running": {"$sum": _AMOUNT, "window": {"documents": ["unbounded", "current"]}}},
+    }}
+
+
+async def _balance(db, match: dict) -> float:
+    rows = await db.invoices.aggregate([
+        {"$match": match},
+        {"$group": {"_id": None, "balance": {"$sum": _AMOUNT}}},
+    ]).to_list(1)
+    return round(rows[0]["balance"], 2) if rows else 0.0
+
+
+async def get_customer_ledger(
+    db,
+    customer_id: str,
+    user_id: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    latest: bool = False,
+) -> dict:
+    """Return one page of a customer's ledger.
+
+    user_id limits every entry and balance to one shopkeeper's invoices, which
+    callers acting for a shopkeeper must pass: customers in the shared
+    "default-user" list have invoices from many shops. start/end bound the
+    invoice date (inclusive). Pages run oldest first and
+    next_cursor continues after the last entry. With latest=True the page holds
+    the most recent `limit` entries instead (still returned oldest first).
+    """
+    scope = {"customer_id": customer_id}
+    if user_id:
+        scope["user_id"] = user_id
+    match = dict(scope)
+    date_range = {}
+    if start:
+        date_range["$gte"] = start
+    if end:
+        date_range["$lte"] = end
+    if date_range:
+        match["date"] = date_range
+
+    if latest:
+        # Walk backwards from the newest entry; balance after each entry is the
+        # closing balance minus everything that came later
+        closing_match = dict(scope)
+        if end:
+            closing_match["date"] = {"$lte": end}
+        closing = await _balance(db, closing_match)
+        rows = await db.invoices.aggregate([
+            {"$match": match},
+            {"$sort": {"date": -1, "id": -1}},
+            {"$limit": limit},
+            _running_balance_stage(-1),
+            {"$addFields": {"balance": {"$add": [closing, {"$subtract": [_AMOUNT, "$running"]}]}}},
+            {"$sort": {"date": 1, "id": 1}},
+            {"$project": _ENTRY_PROJECTION},
+        ]).to_list(limit)
+        opening = round(rows[0]["balance"] - rows[0]["debit"] + rows[0]["credit"], 2) if rows else closing
+        return _page(customer_id, rows, opening, has_more=False)
+
+    if cursor:
+        position = decode_cursor(cursor, ["date", "id", "balance"])
+        if not isinstance(position["balance"], (int, float)) or isinstance(position["balance"], bool):
+            raise invalid_cursor()
+        opening = position["balance"]
+        seek = {"$or": [
+            {"date": {"$gt": position["date"]}},
+            {"date": position["date"], "id": {"$gt": position["id"]}},
+        ]}
+        page_match = {"$and": [match, seek]}
+    else:
+        earlier = {**scope, "date": {"$lt": start}} if start else None
+        opening = await _balance(db, earlier) if earlier else 0.0
+        page_match = match
+
+    rows = await db.invoices.aggregate([
+        {"$match": page_match},
+        {"$sort": {"date": 1, "id": 1}},
+        {"$limit": limit + 1},
+        _running_balance_stage(1),
+        {"$addFields": {"balance": {"$add": [opening, "$running"]}}},
+        {"$project": _ENTRY_PROJECTION},
+    ]).to_list(limit + 1)
+    has_more = len(rows) > limit
+    return _page(customer_id, rows[:limit], opening, has_more)
+
+
+def _page(customer_id: str, rows: list, opening: float, has_more: bool) -> dict:
+    closing = rows[-1]["balance"] if rows else opening
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = encode_cursor({"date": last["date"], "id": last["invoice_id"], "balance": last["balance"]})
+    return {
+        "customer_id": customer_id,
+        "opening_balance": round(opening, 2),
+        "closing_balance": round(closing, 2),
+        "entries": rows,
+        "next_cursor": next_cursor,
+    }
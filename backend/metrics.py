@@ -0,0 +1,265 @@
+"""Prometheus metrics for the voice-to-invoice pipeline.
+
+Stage latencies (audio download and pre-processing, transcription, LLM
+extraction, PDF, email, WhatsApp), every MongoDB command, HTTP requests, cache
+hits, fallbacks, voice-note bytes and seconds saved, event-loop lag, Motor
+pool usage and the external-provider queues (see scheduler) are all recorded
+here and exposed in the Prometheus text format by GET /metrics.
+
+Each worker process keeps its own metrics, so with --workers N a scrape would
+only see whichever worker answered it. Set PROMETHEUS_MULTIPROC_DIR to an
+empty directory before starting the server. Every worker then writes its
+metrics there, and /metrics reports the sum over all of them. Gauges add up
+the live workers' values. Empty the directory between runs:
+
+    rm -rf /tmp/voicebill-metrics && mkdir /tmp/voicebill-metrics
+    PROMETHEUS_MULTIPROC_DIR=/tmp/voicebill-metrics uvicorn server:create_app --factory --workers 4
+"""
+import asyncio
+import functools
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# Read by prometheus_client at import; see the module docstring
+PROMETHEUS_MULTIPROC_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+
+# External calls range from a few ms (Mongo) to tens of seconds (transcription)
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+STAGE_LATENCY = Histogram(
+    "voicebill_stage_duration_seconds",
+    "Latency of one voice-to-invoice pipeline stage",
+    ["stage", "outcome"],
+    buckets=STAGE_BUCKETS,
+)
+MONGO_COMMAND_LATENCY = Histogram(
+    "voicebill_mongo_command_duration_seconds",
+    "Latency of MongoDB commands as seen by the driver",
+    ["command", "outcome"],
+    buckets=STAGE_BUCKETS,
+)
+HTTP_LATENCY = Histogram(
+    "voicebill_http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+    buckets=STAGE_BUCKETS,
+)
+HTTP_IN_PROGRESS = Gauge(
+    "voicebill_http_requests_in_progress", "HTTP requests being handled", ["method"], multiprocess_mode="livesum"
+)
+CACHE_REQUESTS = Counter("voicebill_cache_requests_total", "Cache lookups", ["cache", "result"])
+FALLBACKS = Counter("voicebill_fallbacks_total", "Pipeline stages that fell back to a default result", ["stage"])
+AUDIO_BYTES = Counter("voicebill_audio_bytes_total", "Voice-note bytes received and uploaded", ["stage"])
+AUDIO_SECONDS = Counter("voicebill_audio_seconds_total", "Voice-note audio seconds received and uploaded", ["stage"])
+EVENT_LOOP_LAG = Histogram(
+    "voicebill_event_loop_lag_seconds",
+    "How late a periodic asyncio timer fired",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+EVENT_LOOP_BLOCKS = Counter("voicebill_event_loop_blocks_total", "Event-loop stalls longer than LOOP_BLOCK_THRESHOLD_MS")
+MONGO_POOL_CONNECTIONS = Gauge(
+    "voicebill_mongo_pool_connections", "Motor connection pool connections", ["address", "state"],
+    multiprocess_mode="livesum",
+)
+MONGO_POOL_MAX_SIZE = Gauge(
+    "voicebill_mongo_pool_max_size", "Configured maxPoolSize", ["address"], multiprocess_mode="livesum"
+)
+MONGO_POOL_CHECKOUT_FAILURES = Counter(
+    "voicebill_mongo_pool_checkout_failures_total", "Connection check-outs that failed", ["address", "reason"]
+)
+
+SCHEDULER_QUEUE_DEPTH = Gauge(
+    "voicebill_scheduler_queue_depth", "Calls waiting for a provider slot", ["provider"], multiprocess_mode="livesum"
+)
+SCHEDULER_IN_FLIGHT = Gauge(
+    "voicebill_scheduler_in_flight", "Calls holding a provider slot", ["provider"], multiprocess_mode="livesum"
+)
+SCHEDULER_WAITING_TENANTS = Gauge(
+    "voicebill_scheduler_waiting_tenants", "Shopkeepers with calls waiting for a provider slot", ["provider"],
+    multiprocess_mode="livesum",
+)
+SCHEDULER_WAIT = Histogram(
+    "voicebill_scheduler_wait_seconds", "Time a call queued for a provider slot", ["provider"], buckets=STAGE_BUCKETS
+)
+SCHEDULER_SHED = Counter(
+    "voicebill_scheduler_shed_total", "Calls refused because a provider was overloaded", ["provider", "reason"]
+)
+
+
+class _StageTimer:
+    outcome = "ok"
+
+    def fail(self):
+        self.outcome = "error"
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """Time a block as one pipeline stage; exceptions or .fail() mark it an error"""
+    timer = _StageTimer()
+    started = time.perf_counter()
+    try:
+        yield timer
+    except BaseException:
+        timer.fail()
+        raise
+    finally:
+        STAGE_LATENCY.labels(stage, timer.outcome).observe(time.perf_counter() - started)
+
+
+def timed(stage: str, failed=None):
+    """Decorator for sync or async functions; failed(result) flags soft failures"""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with stage_timer(stage) as timer:
+                    result = await func(*args, **kwargs)
+                    if failed and failed(result):
+                        timer.fail()
+                    return result
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage_timer(stage) as timer:
+                result = func(*args, **kwargs)
+                if failed and failed(result):
+                    timer.fail()
+                return result
+        return wrapper
+    return decorator
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def record_fallback(stage: str):
+    FALLBACKS.labels(stage).inc()
+
+
+def record_audio_preprocessing(result: dict):
+    """Bytes and seconds before (original) and after (uploaded) pre-processing"""
+    AUDIO_BYTES.labels("original").inc(result["original_bytes"])
+    AUDIO_BYTES.labels("uploaded").inc(result["processed_bytes"])
+    AUDIO_SECONDS.labels("original").inc(result["original_seconds"])
+    AUDIO_SECONDS.labels("uploaded").inc(result["processed_seconds"])
+
+
+def record_scheduler_state(provider: str, waiting: int, in_flight: int, waiting_tenants: int):
+    SCHEDULER_QUEUE_DEPTH.labels(provider).set(waiting)
+    SCHEDULER_IN_FLIGHT.labels(provider).set(in_flight)
+    SCHEDULER_WAITING_TENANTS.labels(provider).set(waiting_tenants)
+
+
+def record_scheduler_wait(provider: str, seconds: float):
+    SCHEDULER_WAIT.labels(provider).observe(seconds)
+
+
+def record_shed(provider: str, reason: str):
+    SCHEDULER_SHED.labels(provider, reason).inc()
+
+
+async def monitor_event_loop_lag(interval: float = 0.5):
+    """Sleep `interval` repeatedly and record how late each wake-up was"""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, loop.time() - started - interval))
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_COMMAND_LATENCY.labels(event.command_name, "ok").observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        MONGO_COMMAND_LATENCY.labels(event.command_name, "error").observe(event.duration_micros / 1e6)
+
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    @staticmethod
+    def _address(event) -> str:
+        host, port = event.address
+        return f"{host}:{port}"
+
+    def pool_created(self, event):
+        MONGO_POOL_MAX_SIZE.labels(self._address(event)).set(event.options.get("maxPoolSize", 100))
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        MONGO_POOL_CONNECTIONS.labels(self._address(event), "open").inc()
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        MONGO_POOL_CONNECTIONS.labels(self._address(event), "open").dec()
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        MONGO_POOL_CHECKOUT_FAILURES.labels(self._address(event), str(event.reason)).inc()
+
+    def connection_checked_out(self, event):
+        MONGO_POOL_CONNECTIONS.labels(self._address(event), "in_use").inc()
+
+    def connection_checked_in(self, event):
+        MONGO_POOL_CONNECTIONS.labels(self._address(event), "in_use").dec()
+
+
+def mongo_event_listeners() -> list:
+    return [MongoCommandMetrics(), MongoPoolMetrics()]
+
+
+async def metrics_middleware(request, call_next):
+    """Track in-flight requests and latency per route template (not raw path)"""
+    method = request.method
+    HTTP_IN_PROGRESS.labels(method).inc()
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        HTTP_IN_PROGRESS.labels(method).dec()
+        route = request.scope.get("route")
+        HTTP_LATENCY.labels(method, getattr(route, "path", "unmatched"), str(status)).observe(
+            time.perf_counter() - started
+        )
+
+
+def render_metrics():
+    """This process's metrics, or every worker's when PROMETHEUS_MULTIPROC_DIR is set"""
+    if not PROMETHEUS_MULTIPROC_DIR:
+        return generate_latest(), CONTENT_TYPE_LATEST
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_worker_stopped():
+    """Drop a stopping worker's live gauges from the multiprocess totals"""
+    if PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,133 @@
+"""Online backfill converting ISO date strings to native BSON datetimes.
+
+Older documents store date, created_at and last_purchase as .isoformat()
+strings. This migration rewrites them in batches while the app keeps serving
+traffic: each update is conditional on the field still holding the string it
+read, so concurrent writes are never overwritten. It is idempotent and can be
+stopped and restarted at any time.
+
+A finished run is recorded in the migrations collection. The server runs the
+migration before it starts serving unless that record exists, because date
+filters, sorts and GST snapshots only see native datetimes.
+
+Run from backend/:
+    python -m migrate_dates --batch-size 1000
+"""
+import argparse
+import asyncio
+import logging
+from datetime import datetime, timezone
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+DATE_FIELDS = {
+    "users": ["created_at"],
+    "customers": ["created_at", "last_purchase"],
+    "products": ["created_at"],
+    "invoices": ["date", "created_at"],
+    "pending_invoices": ["created_at"],
+    "message_deliveries": ["created_at"],
+}
+
+DEFAULT_BATCH_SIZE = 1000
+MIGRATION_ID = "iso_dates"
+
+
+def parse_iso(value: str):
+    """Parse an ISO timestamp as stored by older code; naive values are UTC"""
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def as_datetime(value):
+    """A stored date as a datetime, whether or not its document has been migrated yet"""
+    return parse_iso(value) if isinstance(value, str) else value
+
+
+async def migrate_field(collection, field: str, batch_size: int = DEFAULT_BATCH_SIZE) -> dict:
+    """Convert one string date field across a collection, batch by batch"""
+    converted = 0
+    unparseable = 0
+    last_id = None
+    while True:
+        query = {field: {"$type": "string"}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await collection.find(query, {"_id": 1, field: 1}).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+
+        operations = []
+        for doc in batch:
+            parsed = parse_iso(doc[field])
+            if parsed is None:
+                unparseable += 1
+                continue
+            operations.append(UpdateOne({"_id": doc["_id"], field: doc[field]}, {"$set": {field: parsed}}))
+        if operations:
+            result = await collection.bulk_write(operations, ordered=False)
+            converted += result.modified_count
+        # Yield between batches so an in-process run does not starve request handling
+        await asyncio.sleep(0)
+
+    return {"collection": collection.name, "field": field, "converted": converted, "unparseable": unparseable}
+
+
+async def migrate_dates(db, batch_size: int = DEFAULT_BATCH_SIZE) -> list:
+    results = []
+    for collection_name, fields in DATE_FIELDS.items():
+        for field in fields:
+            result = await migrate_field(db[collection_name], field, batch_size)
+            logger.info(f"Date migration: {result}")
+            results.append(result)
+    await db.migrations.update_one(
+        {"_id": MIGRATION_ID},
+        {"$set": {"completed_at": datetime.now(timezone.utc), "results": results}},
+        upsert=True
+    )
+    return results
+
+
+async def dates_migrated(db) -> bool:
+    return await db.migrations.find_one({"_id": MIGRATION_ID}, {"_id": 1}) is not None
+
+
+async def ensure_dates_migrated(db, batch_size: int = DEFAULT_BATCH_SIZE):
+    """Run the migration unless a finished run is recorded"""
+    if not await dates_migrated(db):
+        await migrate_dates(db, batch_size)
+
+
+def main():
+    import json
+    import os
+    from pathlib import Path
+
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Convert ISO date strings to BSON datetimes")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    load_dotenv(Path(__file__).parent / '.env')
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True, tzinfo=timezone.utc)
+    try:
+        results = asyncio.run(migrate_dates(client[os.environ['DB_NAME']], args.batch_size))
+    finally:
+        client.close()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Keyset pagination with opaque cursors shared by the list endpoints"""
+import base64
+import json
+from datetime import datetime
+from typing import Iterable
+
+from cachetools import TTLCache
+from fastapi import HTTPException
+
+from metrics import record_cache
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Totals are expensive on big collections; a slightly stale count is fine
+_total_cache = TTLCache(maxsize=1024, ttl=60)
+
+# A dict or list in a cursor would reach the seek filter as a query operator
+_CURSOR_TYPES = (str, int, float, bool, type(None), datetime)
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict) and "$dt" in value:
+        return datetime.fromisoformat(value["$dt"])
+    return value
+
+
+def invalid_cursor() -> HTTPException:
+    return HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def encode_cursor(values: dict) -> str:
+    raw = json.dumps({k: _encode_value(v) for k, v in values.items()}, separators=(',', ':'), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, keys: Iterable[str], optional: Iterable[str] = ()) -> dict:
+    """The position stored in a cursor; a 400 unless it holds scalar values for every key
+    in `keys` and nothing else besides `optional`"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, dict):
+            raise invalid_cursor()
+        values = {k: _decode_value(v) for k, v in values.items()}
+    except (ValueError, TypeError):
+        raise invalid_cursor()
+    keys = set(keys)
+    if not keys <= values.keys() <= keys | set(optional):
+        raise invalid_cursor()
+    if not all(isinstance(v, _CURSOR_TYPES) for v in values.values()):
+        raise invalid_cursor()
+    return values
+
+
+def _seek_filter(sort: list, position: dict) -> dict:
+    """Documents strictly after `position` in the given two-key sort order"""
+    (first, first_dir), (second, second_dir) = sort
+    first_op = "$gt" if first_dir == 1 else "$lt"
+    second_op = "$gt" if second_dir == 1 else "$lt"
+    return {"$or": [
+        {first: {first_op: position[first]}},
+        {first: position[first], second: {second_op: position[second]}},
+    ]}
+
+
+async def _cached_total(collection, query: dict) -> int:
+    key = (collection.name, json.dumps(query, sort_keys=True, default=str))
+    record_cache("page_total", key in _total_cache)
+    if key not in _total_cache:
+        _total_cache[key] = await collection.count_documents(query)
+    return _total_cache[key]
+
+
+async def paginate(
+    collection,
+    query: dict,
+    sort: list,
+    cursor: str = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    include_total: bool = False,
+    projection: dict = None,
+):
+    """Fetch one page ordered by a two-key sort such as [("date", -1), ("id", -1)].
+
+    Returns (documents, next_cursor, total). total is None unless requested; once
+    computed it travels inside the cursor so later pages do not count again.
+    """
+    position = decode_cursor(cursor, [field for field, _ in sort], optional=["total"]) if cursor else {}
+    total = position.get("total")
+    if isinstance(total, bool) or not isinstance(total, (int, type(None))):
+        raise invalid_cursor()
+    page_query = {"$and": [query, _seek_filter(sort, position)]} if position else query
+
+    if include_total and total is None:
+        total = await _cached_total(collection, query)
+
+    documents = await collection.find(page_query, projection or {"_id": 0}).sort(sort).limit(limit + 1).to_list(limit + 1)
+
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        last = documents[-1]
+        values = {field: last.get(field) for field, _ in sort}
+        if total is not None:
+            values["total"] = total
+        next_cursor = encode_cursor(values)
+    return documents, next_cursor, total
+
+
+def set_page_headers(response, next_cursor, total):
+    """Expose pagination state without changing the list response body"""
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    if total is not None:
+        response.headers["X-Total-Count"] = str(total)
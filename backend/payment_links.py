@@ -0,0 +1,136 @@
+"""Razorpay payment-link creation off the event loop, with idempotent caching"""
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from metrics import record_cache
+from scheduler import limit
+
+logger = logging.getLogger(__name__)
+
+
+def amount_in_paise(amount: float) -> int:
+    return int(round(amount * 100))
+
+
+def payment_link_key(invoice_id: str, amount_paise: int) -> str:
+    """Idempotency key for a payment link: one link per invoice and amount"""
+    return f"{invoice_id}:{amount_paise}"
+
+
+class PaymentLinkService:
+    """Create or reuse the payment link for an invoice.
+
+    A link is stored on the invoice together with its idempotency key. As long
+    as the invoice amount is unchanged and the link has not expired, the stored
+    link is returned without contacting Razorpay. Links stored before keys
+    existed are reused as they are. Concurrent requests for the same key share
+    one in-flight Razorpay call. A paid invoice never gets a new link.
+
+    Razorpay allows one live link per reference id (the invoice id), so the
+    previous link is cancelled before a new one is created. That also stops
+    customers paying the old amount.
+    """
+
+    def __init__(self, db, get_razorpay_client, backend_url: str, test_mode: bool = True):
+        """get_razorpay_client: returns the SDK client, only called when a real link is created"""
+        self.db = db
+        self.get_razorpay_client = get_razorpay_client
+        self.backend_url = backend_url
+        self.test_mode = test_mode
+        self._inflight = {}
+
+    def _cached_link(self, invoice_doc: dict, key: str) -> Optional[str]:
+        if not invoice_doc.get('payment_link'):
+            return None
+        stored_key = invoice_doc.get('payment_link_key')
+        if stored_key is not None and stored_key != key:
+            return None
+        expires_at = invoice_doc.get('payment_link_expires_at')
+        if expires_at and expires_at <= time.time():
+            return None
+        return invoice_doc['payment_link']
+
+    def _build_payload(self, invoice_doc: dict, amount_paise: int, key: str, options: dict) -> dict:
+        payload = {
+            "amount": amount_paise,
+            "currency": "INR",
+            "description": f"Invoice {invoice_doc['invoice_number']}",
+            "reference_id": invoice_doc['id'],
+            "customer": {
+                "name": invoice_doc.get('customer_name') or 'Customer',
+                "contact": invoice_doc.get('customer_phone') or '',
+            },
+            "notify": {"sms": False, "email": False},
+            "notes": {"invoice_id": invoice_doc['id'], "idempotency_key": key},
+        }
+        payload.update(options)
+        return payload
+
+    async def get_or_create(self, invoice_doc: dict, **options) -> Optional[str]:
+        """Return the invoice's payment link, creating it only when needed.
+
+        Extra keyword arguments are merged into the Razorpay payload
+        (e.g. notify, reminder_enable, callback_url). For a paid invoice this
+        is the stored link, or None when it never had one.
+        """
+        if invoice_doc.get('status') == 'paid':
+            return invoice_doc.get('payment_link')
+        amount_paise = amount_in_paise(invoice_doc['total'])
+        key = payment_link_key(invoice_doc['id'], amount_paise)
+
+        cached = self._cached_link(invoice_doc, key)
+        record_cache("payment_link", bool(cached))
+        if cached:
+            logger.info(f"Reusing payment link for invoice {invoice_doc['id']}")
+            return cached
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._create(invoice_doc, amount_paise, key, options))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _create(self, invoice_doc: dict, amount_paise: int, key: str, options: dict) -> Optional[str]:
+        # The caller's copy may be stale; another worker could have stored the link already
+        stored = await self.db.invoices.find_one(
+            {"id": invoice_doc['id']},
+            {"_id": 0, "status": 1, "payment_link": 1, "payment_link_key": 1, "payment_link_expires_at": 1, "payment_link_id": 1}
+        )
+        if (stored or {}).get('status') == 'paid':
+            return stored.get('payment_link')
+        cached = self._cached_link(stored or {}, key)
+        if cached:
+            return cached
+
+        update = {"payment_link_key": key}
+        if self.test_mode:
+            payment_link = f"{self.backend_url}/api/test-payment/{invoice_doc['id']}"
+            logger.info(f"Test mode: Generated test payment page {payment_link}")
+        else:
+            previous_link_id = (stored or {}).get('payment_link_id')
+            if previous_link_id:
+                await self._cancel(invoice_doc, previous_link_id)
+            payload = self._build_payload(invoice_doc, amount_paise, key, options)
+            # The Razorpay SDK uses blocking requests; keep it off the event loop
+            async with limit("razorpay", invoice_doc['user_id']):
+                link_obj = await asyncio.to_thread(self.get_razorpay_client().payment_link.create, payload)
+            payment_link = link_obj['short_url']
+            update["payment_link_id"] = link_obj.get('id', '')
+            update["payment_link_expires_at"] = link_obj.get('expire_by') or None
+            logger.info(f"Created Razorpay payment link {update['payment_link_id']} for invoice {invoice_doc['id']}")
+
+        update["payment_link"] = payment_link
+        await self.db.invoices.update_one({"id": invoice_doc['id']}, {"$set": update})
+        return payment_link
+
+    async def _cancel(self, invoice_doc: dict, link_id: str):
+        """Cancel a superseded link; one that already expired or was cancelled is fine"""
+        try:
+            async with limit("razorpay", invoice_doc['user_id']):
+                await asyncio.to_thread(self.get_razorpay_client().payment_link.cancel, link_id)
+            logger.info(f"Cancelled Razorpay payment link {link_id} for invoice {invoice_doc['id']}")
+        except Exception as e:
+            logger.warning(f"Could not cancel payment link {link_id} for invoice {invoice_doc['id']}: {str(e)}")
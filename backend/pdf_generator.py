@@ -11,6 +11,9 @@ import io
 import os
 import qrcode
 
+from metrics import timed
+
+@timed("pdf")
 def generate_invoice_pdf(invoice_data):
     """
     Generate PDF invoice from invoice data
@@ -292,4 +295,109 @@ def generate_invoice_pdf(invoice_data):
     # Build PDF
     doc.build(elements)
     buffer.seek(0)
-    return buffer
\ No newline at end of file
+    return buffer
+
+def generate_gst_report_pdf(report):
+    """
+    Generate a monthly GST summary from a stored GST report
+    Returns: BytesIO object containing PDF
+    """
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch)
+    elements = []
+
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'ReportTitle',
+        parent=styles['Heading1'],
+        fontSize=20,
+        textColor=colors.HexColor('#00897b'),
+        spaceAfter=6,
+        alignment=TA_CENTER,
+        fontName='Helvetica-Bold'
+    )
+    heading_style = ParagraphStyle(
+        'ReportHeading',
+        parent=styles['Heading2'],
+        fontSize=14,
+        textColor=colors.HexColor('#00695c'),
+        spaceAfter=6,
+        fontName='Helvetica-Bold'
+    )
+    note_style = ParagraphStyle(
+        'ReportNote',
+        parent=styles['Normal'],
+        fontSize=9,
+        alignment=TA_CENTER,
+        textColor=colors.grey
+    )
+
+    period_label = datetime.strptime(report['period'], '%Y-%m').strftime('%B %Y')
+    elements.append(Paragraph(f"<b>GST REPORT - {period_label}</b>", title_style))
+    status = "Final (period closed)" if report.get('final') else "Provisional (period still open)"
+    elements.append(Paragraph(
+        f"{status} | Generated {report['generated_at'].strftime('%d %B %Y %H:%M')} UTC",
+        note_style
+    ))
+    elements.append(Spacer(1, 0.3*inch))
+
+    table_style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#00897b')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+        ('TOPPADDING', (0, 0), (-1, -1), 6),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f5f5f5')])
+    ])
+
+    # Summary by rate, with the grand total as the last row
+    totals = report['totals']
+    rate_data = [['GST Rate', 'Invoices', 'Taxable Value', 'Tax', 'Total']]
+    for rate in report['by_rate']:
+        rate_data.append([
+            f"{rate['tax_rate']:g}%",
+            str(rate['invoice_count']),
+            f"Rs. {rate['taxable_value']:.2f}",
+            f"Rs. {rate['tax']:.2f}",
+            f"Rs. {rate['total']:.2f}"
+        ])
+    rate_data.append([
+        'TOTAL',
+        str(totals['invoice_count']),
+        f"Rs. {totals['taxable_value']:.2f}",
+        f"Rs. {totals['tax']:.2f}",
+        f"Rs. {totals['total']:.2f}"
+    ])
+    elements.append(Paragraph("<b>SUMMARY BY RATE</b>", heading_style))
+    rate_table = Table(rate_data, colWidths=[1.2*inch, 0.9*inch, 1.6*inch, 1.4*inch, 1.6*inch])
+    rate_table.setStyle(table_style)
+    rate_table.setStyle(TableStyle([
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+        ('LINEABOVE', (0, -1), (-1, -1), 1.5, colors.HexColor('#00897b')),
+    ]))
+    elements.append(rate_table)
+    elements.append(Spacer(1, 0.3*inch))
+
+    customer_data = [['Customer', 'GST Rate', 'Invoices', 'Taxable Value', 'Tax']]
+    for entry in report['by_customer']:
+        customer_data.append([
+            entry['customer_name'] or 'Walk-in Customer',
+            f"{entry['tax_rate']:g}%",
+            str(entry['invoice_count']),
+            f"Rs. {entry['taxable_value']:.2f}",
+            f"Rs. {entry['tax']:.2f}"
+        ])
+    elements.append(Paragraph("<b>BY CUSTOMER</b>", heading_style))
+    customer_table = Table(customer_data, colWidths=[2.4*inch, 0.9*inch, 0.9*inch, 1.5*inch, 1.3*inch], repeatRows=1)
+    customer_table.setStyle(table_style)
+    elements.append(customer_table)
+    elements.append(Spacer(1, 0.3*inch))
+
+    elements.append(Paragraph("This is a computer-generated report | Generated by VoiceBill", note_style))
+
+    doc.build(elements)
+    buffer.seek(0)
+    return buffer
@@ -0,0 +1,149 @@
+"""On-demand request profiling and event-loop blocking detection.
+
+Both are off by default and cost nothing until enabled.
+
+Request profiling (PROFILING_ENABLED=true) wraps a request in pyinstrument's
+statistical profiler when the caller sends X-Profile with PROFILING_ADMIN_TOKEN,
+or for a random PROFILING_SAMPLE_RATE fraction of requests. Each profile is
+written to PROFILING_OUTPUT_DIR as speedscope JSON (open in speedscope.app or
+convert to a flamegraph).
+
+The blocking detector (LOOP_BLOCK_THRESHOLD_MS > 0) pairs a heartbeat task on
+the event loop with a watchdog thread. When the heartbeat stalls past the
+threshold, the watchdog captures the loop thread's stack, so synchronous
+calls such as requests.get or smtplib show up with the line that blocked.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+import traceback
+from datetime import datetime, timezone
+from pathlib import Path
+
+from metrics import EVENT_LOOP_BLOCKS
+
+logger = logging.getLogger(__name__)
+
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'False').lower() == 'true'
+PROFILING_ADMIN_TOKEN = os.environ.get('PROFILING_ADMIN_TOKEN', '')
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+PROFILING_INTERVAL = float(os.environ.get('PROFILING_INTERVAL', 0.001))
+PROFILING_OUTPUT_DIR = Path(os.environ.get('PROFILING_OUTPUT_DIR', '/tmp/voicebill-profiles'))
+LOOP_BLOCK_THRESHOLD_MS = float(os.environ.get('LOOP_BLOCK_THRESHOLD_MS', 0))
+
+PROFILE_HEADER = "x-profile"
+
+
+def _should_profile(request) -> bool:
+    token = request.headers.get(PROFILE_HEADER)
+    if token and PROFILING_ADMIN_TOKEN and secrets.compare_digest(token, PROFILING_ADMIN_TOKEN):
+        return True
+    return PROFILING_SAMPLE_RATE > 0 and random.random() < PROFILING_SAMPLE_RATE
+
+
+def _profile_path(request, elapsed_ms: float) -> Path:
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+    route = re.sub(r"[^A-Za-z0-9]+", "_", request.url.path).strip("_") or "root"
+    return PROFILING_OUTPUT_DIR / f"{stamp}-{request.method}-{route}-{elapsed_ms:.0f}ms.speedscope.json"
+
+
+def _write_profile(profiler, path: Path):
+    from pyinstrument.renderers import SpeedscopeRenderer
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(profiler.output(renderer=SpeedscopeRenderer()))
+
+
+async def profiling_middleware(request, call_next):
+    """Profile the handler for opted-in or sampled requests; pass through otherwise"""
+    if not PROFILING_ENABLED or not _should_profile(request):
+        return await call_next(request)
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        logger.warning("Profiling requested but pyinstrument is not installed")
+        return await call_next(request)
+
+    profiler = Profiler(interval=PROFILING_INTERVAL, async_mode="enabled")
+    started = time.perf_counter()
+    profiler.start()
+    try:
+        return await call_next(request)
+    finally:
+        profiler.stop()
+        path = _profile_path(request, (time.perf_counter() - started) * 1000)
+        try:
+            await asyncio.to_thread(_write_profile, profiler, path)
+            logger.info(f"Profile written to {path}")
+        except Exception as e:
+            logger.error(f"Failed to write profile: {str(e)}")
+
+
+class LoopBlockDetector:
+    """Report event-loop stalls longer than `threshold` seconds with the blocking stack"""
+
+    def __init__(self, threshold: float, output_dir: Path = PROFILING_OUTPUT_DIR):
+        self.threshold = threshold
+        self.interval = threshold / 4
+        self.output_path = output_dir / "loop-blocks.jsonl"
+        self._last_beat = time.monotonic()
+        self._loop_thread_id = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._heartbeat = None
+
+    async def _beat(self):
+        while True:
+            self._last_beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+
+    def _watch(self):
+        blocked_since = None
+        stack = None
+        while not self._stop.wait(self.interval):
+            stalled = time.monotonic() - self._last_beat
+            if stalled > self.threshold and blocked_since is None:
+                # Still inside the blocking call: this is the stack that matters
+                blocked_since = self._last_beat
+                frame = sys._current_frames().get(self._loop_thread_id)
+                stack = traceback.format_stack(frame) if frame else []
+            elif stalled <= self.threshold and blocked_since is not None:
+                self._report(self._last_beat - blocked_since - self.interval, stack)
+                blocked_since = None
+
+    def _report(self, duration: float, stack: list):
+        EVENT_LOOP_BLOCKS.inc()
+        logger.warning(
+            f"Event loop blocked for ~{duration * 1000:.0f}ms at:\n{''.join(stack[-8:])}"
+        )
+        span = {
+            "at": datetime.now(timezone.utc).isoformat(),
+            "duration_ms": round(duration * 1000, 1),
+            "stack": stack,
+        }
+        try:
+            self.output_path.parent.mkdir(parents=True, exist_ok=True)
+            with self.output_path.open("a") as f:
+                f.write(json.dumps(span) + "\n")
+        except OSError as e:
+            logger.error(f"Failed to record loop block: {str(e)}")
+
+    def start(self):
+        """Call from the running event loop (e.g. a startup hook)"""
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = asyncio.create_task(self._beat())
+        self._thread = threading.Thread(target=self._watch, name="loop-block-detector", daemon=True)
+        self._thread.start()
+        logger.info(f"Event-loop block detector watching for stalls over {self.threshold * 1000:.0f}ms")
+
+    def stop(self):
+        self._stop.set()
+        if self._heartbeat:
+            self._heartbeat.cancel()
@@ -0,0 +1,192 @@
+"""Bulk payment reconciliation against Razorpay.
+
+Pages through Razorpay's payment links and payments for a time window, matches
+them to invoices by reference id and applies the status changes with one
+bulk_write. Each invoice update is guarded on the amount_paid it was computed
+from, so a webhook or a second run that got there first is never overwritten,
+and stamps the run's id on the invoice. Customer dues and analytics rollups
+are then adjusted with one bulk_write each, for the invoices carrying that
+stamp.
+
+Run from backend/ as a cron job:
+    python -m reconciliation --hours 24
+"""
+import argparse
+import asyncio
+import logging
+import time
+import uuid
+from collections import defaultdict
+from datetime import timezone
+
+from pymongo import UpdateOne
+
+from analytics import rollup_operations, write_rollup_operations
+from customer_stats import invoice_deltas
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 100  # Razorpay's maximum page size
+
+
+async def _page_through(fetch_page, collection_key: str, params: dict, page_size: int = PAGE_SIZE):
+    """Yield every entity from a paginated Razorpay listing.
+
+    fetch_page is a blocking SDK call such as razorpay_client.payment.all and is
+    run in a worker thread so the event loop stays responsive.
+    """
+    skip = 0
+    while True:
+        page = await asyncio.to_thread(fetch_page, {**params, "count": page_size, "skip": skip})
+        items = page.get(collection_key, [])
+        for item in items:
+            yield item
+        if len(items) < page_size:
+            break
+        skip += page_size
+
+
+async def collect_payments(razorpay_client, since: int, until: int) -> dict:
+    """Return {invoice_id: {"amount_paid": paise, "payment_id": str}} for the window"""
+    window = {"from": since, "to": until}
+    matched = defaultdict(lambda: {"amount_paid": 0, "payment_id": "", "payment_link_id": ""})
+
+    async for link in _page_through(razorpay_client.payment_link.all, "payment_links", window):
+        invoice_id = link.get("reference_id") or (link.get("notes") or {}).get("invoice_id")
+        if not invoice_id or not link.get("amount_paid"):
+            continue
+        entry = matched[invoice_id]
+        entry["amount_paid"] = max(entry["amount_paid"], link["amount_paid"])
+        entry["payment_link_id"] = link.get("id", "")
+        link_payments = [p for p in link.get("payments") or [] if p.get("status") == "captured"]
+        if link_payments:
+            entry["payment_id"] = link_payments[-1].get("payment_id", "")
+
+    # Payments carry the link's notes, which catches links that fall outside the window
+    captured = defaultdict(int)
+    latest_payment = {}
+    async for payment in _page_through(razorpay_client.payment.all, "items", window):
+        invoice_id = (payment.get("notes") or {}).get("invoice_id")
+        if not invoice_id or payment.get("status") != "captured":
+            continue
+        captured[invoice_id] += payment.get("amount", 0)
+        latest_payment.setdefault(invoice_id, payment["id"])
+
+    for invoice_id, amount in captured.items():
+        entry = matched[invoice_id]
+        entry["amount_paid"] = max(entry["amount_paid"], amount)
+        entry["payment_id"] = entry["payment_id"] or latest_payment[invoice_id]
+
+    return dict(matched)
+
+
+async def reconcile_payments(db, razorpay_client, since: int, until: int = None) -> dict:
+    """Apply Razorpay payments in [since, until] to invoices and customer dues"""
+    until = until or int(time.time())
+    started = time.perf_counter()
+    matched = await collect_payments(razorpay_client, since, until)
+
+    invoices = await db.invoices.find(
+        {"id": {"$in": list(matched)}},
+        {"_id": 0, "id": 1, "user_id": 1, "customer_id": 1, "date": 1, "total": 1, "amount_paid": 1, "amount_due": 1, "status": 1}
+    ).to_list(None)
+
+    changes = []
+    for invoice in invoices:
+        entry = matched[invoice["id"]]
+        total = invoice.get("total", 0)
+        amount_paid = round(min(total, entry["amount_paid"] / 100), 2)
+        if amount_paid <= invoice.get("amount_paid", 0):
+            continue
+
+        amount_due = round(total - amount_paid, 2)
+        status = "paid" if amount_due <= 0 else "partial"
+        update = {
+            "amount_paid": amount_paid,
+            "amount_due": amount_due,
+            "status": status,
+            "payment_status": "completed" if status == "paid" else "pending",
+        }
+        if entry["payment_id"]:
+            update["payment_id"] = entry["payment_id"]
+        changes.append((invoice, update))
+
+    applied = []
+    if changes:
+        run_id = str(uuid.uuid4())
+        # amount_paid None also matches invoices that never had the field
+        await db.invoices.bulk_write([
+            UpdateOne(
+                {"id": invoice["id"], "amount_paid": invoice.get("amount_paid"), "status": {"$ne": "paid"}},
+                {"$set": {**update, "reconciliation_run": run_id}},
+            )
+            for invoice, update in changes
+        ], ordered=False)
+        updated = set(await db.invoices.distinct(
+            "id", {"id": {"$in": [invoice["id"] for invoice, _ in changes]}, "reconciliation_run": run_id}
+        ))
+        applied = [(invoice, update) for invoice, update in changes if invoice["id"] in updated]
+
+    due_deltas = defaultdict(float)
+    rollup_ops = defaultdict(list)
+    for invoice, update in applied:
+        for customer_id, inc in invoice_deltas(invoice, {**invoice, **update}).items():
+            due_deltas[customer_id] += inc["total_due"]
+        for name, ops in rollup_operations(invoice, {**invoice, **update}).items():
+            rollup_ops[name].extend(ops)
+
+    customer_ops = [
+        UpdateOne({"id": customer_id}, {"$inc": {"total_due": round(delta, 2)}})
+        for customer_id, delta in due_deltas.items() if delta
+    ]
+    if customer_ops:
+        await db.customers.bulk_write(customer_ops, ordered=False)
+    await write_rollup_operations(db, rollup_ops)
+
+    summary = {
+        "since": since,
+        "until": until,
+        "payments_matched": len(matched),
+        "invoices_found": len(invoices),
+        "invoices_updated": len(applied),
+        "invoices_skipped": len(changes) - len(applied),
+        "customers_updated": len(customer_ops),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+    logger.info(f"Payment reconciliation: {summary}")
+    return summary
+
+
+def main():
+    import json
+    import os
+    from pathlib import Path
+
+    import razorpay
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Reconcile Razorpay payments with invoices")
+    parser.add_argument("--hours", type=float, default=24, help="size of the window ending now")
+    args = parser.parse_args()
+
+    load_dotenv(Path(__file__).parent / '.env')
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True, tzinfo=timezone.utc)
+    razorpay_client = razorpay.Client(
+        auth=(os.environ.get('RAZORPAY_KEY_ID'), os.environ.get('RAZORPAY_KEY_SECRET')),
+        base_url=os.environ.get('RAZORPAY_BASE_URL', 'https://api.razorpay.com'),
+    )
+    until = int(time.time())
+    try:
+        summary = asyncio.run(reconcile_payments(
+            client[os.environ['DB_NAME']], razorpay_client, until - int(args.hours * 3600), until
+        ))
+    finally:
+        client.close()
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""Concurrency limits and fair queuing for calls to external providers.
+
+Every call to AssemblyAI, local whisper, the LLM gateway, Twilio, Razorpay or
+SMTP holds one of that provider's slots while it runs:
+
+    async with limit("llm", user_id):
+        response = await chat.send_message(message)
+
+A provider allows SCHEDULER_<PROVIDER>_CONCURRENCY calls in flight. At most
+SCHEDULER_<PROVIDER>_TENANT_CONCURRENCY of them can belong to one user_id.
+Calls beyond that wait in a queue per shopkeeper. A freed slot goes to the
+waiting call with the lowest start tag (start-time fair queuing). Each call
+moves its shopkeeper's tag forward by 1 / weight. So a wholesaler who
+forwards 200 voice notes takes turns with a shop that sent one, instead of
+going ahead of it. Weights default to 1 and are set with
+SCHEDULER_TENANT_WEIGHTS ("user-id:2,other-id:0.5").
+
+SCHEDULER_<PROVIDER>_OVERLOAD (default SCHEDULER_OVERLOAD) decides what a
+saturated provider does with new calls:
+
+queue  wait for a slot, however long the queue gets
+shed   raise ProviderOverloaded at once when SCHEDULER_<PROVIDER>_MAX_QUEUE
+       calls are already waiting
+
+A call that waits longer than SCHEDULER_<PROVIDER>_QUEUE_TIMEOUT seconds
+(default SCHEDULER_QUEUE_TIMEOUT; 0 waits forever) raises ProviderOverloaded.
+Left unset it is 0 under queue and 30 under shed. Limits hold per server
+process. Queue depths and shed calls are exported as metrics.
+"""
+import asyncio
+import itertools
+import logging
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+from metrics import record_scheduler_state, record_scheduler_wait, record_shed
+
+logger = logging.getLogger(__name__)
+
+OVERLOAD_POLICIES = ("queue", "shed")
+# provider: (calls in flight, calls in flight for one shopkeeper)
+PROVIDER_LIMITS = {
+    "assemblyai": (20, 4),
+    "whisper": (4, 2),
+    "llm": (20, 4),
+    "twilio": (10, 4),
+    "razorpay": (5, 2),
+    "smtp": (4, 2),
+}
+DEFAULT_LIMITS = (10, 4)
+SCHEDULER_OVERLOAD = os.environ.get('SCHEDULER_OVERLOAD', 'queue')
+SCHEDULER_MAX_QUEUE = int(os.environ.get('SCHEDULER_MAX_QUEUE', 200))
+SCHEDULER_QUEUE_TIMEOUT = os.environ.get('SCHEDULER_QUEUE_TIMEOUT')
+# queue_timeout when none is configured; "queue" promises to wait for a slot
+DEFAULT_QUEUE_TIMEOUTS = {"queue": 0.0, "shed": 30.0}
+
+
+def parse_weights(value: str) -> Dict[str, float]:
+    """{user_id: weight} from "user-id:2,other-id:0.5" """
+    weights = {}
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        tenant, _, weight = entry.rpartition(":")
+        weights[tenant] = float(weight)
+    return weights
+
+
+SCHEDULER_TENANT_WEIGHTS = parse_weights(os.environ.get('SCHEDULER_TENANT_WEIGHTS', ''))
+
+
+class ProviderOverloaded(Exception):
+    """A provider's queue is full, or a call waited past its queue timeout"""
+
+    def __init__(self, provider: str, reason: str):
+        super().__init__(f"{provider} is overloaded ({reason})")
+        self.provider = provider
+        self.reason = reason
+
+
+class ProviderScheduler:
+    """The slots of one provider, shared fairly between shopkeepers"""
+
+    def __init__(
+        self,
+        provider: str,
+        concurrency: int,
+        tenant_concurrency: int,
+        overload: str = SCHEDULER_OVERLOAD,
+        max_queue: int = SCHEDULER_MAX_QUEUE,
+        queue_timeout: Optional[float] = None,
+        weights: Optional[Dict[str, float]] = None,
+    ):
+        if overload not in OVERLOAD_POLICIES:
+            raise ValueError(f"Unknown overload policy {overload!r}; choose one of {', '.join(OVERLOAD_POLICIES)}")
+        self.provider = provider
+        self.concurrency = concurrency
+        self.tenant_concurrency = tenant_concurrency
+        self.overload = overload
+        self.max_queue = max_queue
+        if queue_timeout is None:
+            queue_timeout = float(SCHEDULER_QUEUE_TIMEOUT) if SCHEDULER_QUEUE_TIMEOUT else DEFAULT_QUEUE_TIMEOUTS[overload]
+        self.queue_timeout = queue_timeout
+        self.weights = SCHEDULER_TENANT_WEIGHTS if weights is None else weights
+        self.in_flight = 0
+        self.waiting = 0
+        self._tenant_in_flight: Dict[str, int] = {}
+        # tenant: queued (start tag, sequence, tenant, future), oldest first
+        self._queues: Dict[str, deque] = {}
+        # tenant: start tag of its next call; tags at or below _virtual_time are dropped
+        self._tags: Dict[str, float] = {}
+        self._virtual_time = 0.0
+        self._sequence = itertools.count()
+
+    @classmethod
+    def from_env(cls, provider: str) -> "ProviderScheduler":
+        prefix = f"SCHEDULER_{provider.upper()}_"
+        concurrency, tenant_concurrency = PROVIDER_LIMITS.get(provider, DEFAULT_LIMITS)
+        queue_timeout = os.environ.get(prefix + 'QUEUE_TIMEOUT')
+        return cls(
+            provider,
+            concurrency=int(os.environ.get(prefix + 'CONCURRENCY', concurrency)),
+            tenant_concurrency=int(os.environ.get(prefix + 'TENANT_CONCURRENCY', tenant_concurrency)),
+            overload=os.environ.get(prefix + 'OVERLOAD', SCHEDULER_OVERLOAD),
+            max_queue=int(os.environ.get(prefix + 'MAX_QUEUE', SCHEDULER_MAX_QUEUE)),
+            queue_timeout=float(queue_timeout) if queue_timeout else None,
+        )
+
+    def _next_tag(self, tenant: str) -> float:
+        start = max(self._virtual_time, self._tags.get(tenant, 0.0))
+        self._tags[tenant] = start + 1 / self.weights.get(tenant, 1.0)
+        return start
+
+    def _grant(self, tenant: str, start: float):
+        self.in_flight += 1
+        self._tenant_in_flight[tenant] = self._tenant_in_flight.get(tenant, 0) + 1
+        self._virtual_time = max(self._virtual_time, start)
+
+    def _dequeue(self, entry: tuple):
+        queue = self._queues.get(entry[2])
+        if queue is None or entry not in queue:
+            return
+        queue.remove(entry)
+        if not queue:
+            del self._queues[entry[2]]
+        self.waiting -= 1
+
+    def _dispatch(self):
+        """Hand free slots to the waiting calls with the lowest start tags"""
+        while self.in_flight < self.concurrency:
+            best = None
+            for tenant, queue in self._queues.items():
+                if self._tenant_in_flight.get(tenant, 0) < self.tenant_concurrency and (best is None or queue[0][:2] < best[:2]):
+                    best = queue[0]
+            if best is None:
+                break
+            self._dequeue(best)
+            start, _, tenant, future = best
+            if future.done():
+                continue  # gave up waiting; acquire() is cleaning up
+            self._grant(tenant, start)
+            future.set_result(None)
+        self._record()
+
+    def _record(self):
+        record_scheduler_state(self.provider, self.waiting, self.in_flight, len(self._queues))
+
+    def _shed(self, reason: str) -> ProviderOverloaded:
+        record_shed(self.provider, reason)
+        logger.warning(f"Shedding {self.provider} call: {reason}, {self.waiting} waiting, {self.in_flight} in flight")
+        return ProviderOverloaded(self.provider, reason)
+
+    async def acquire(self, tenant: str):
+        start = self._next_tag(tenant)
+        # Anything already queued is blocked by its own tenant limit, or it would be running
+        if (
+            self.in_flight < self.concurrency
+            and self._tenant_in_flight.get(tenant, 0) < self.tenant_concurrency
+            and tenant not in self._queues
+        ):
+            self._grant(tenant, start)
+            self._record()
+            return
+        if self.overload == "shed" and self.waiting >= self.max_queue:
+            raise self._shed("queue_full")
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (start, next(self._sequence), tenant, future)
+        self._queues.setdefault(tenant, deque()).append(entry)
+        self.waiting += 1
+        self._record()
+        queued_at = time.perf_counter()
+        try:
+            if self.queue_timeout > 0:
+                await asyncio.wait_for(future, self.queue_timeout)
+            else:
+                await future
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # The slot was granted just as the caller gave up
+                self.release(tenant)
+            else:
+                self._dequeue(entry)
+                self._record()
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._shed("timeout") from None
+            raise
+        record_scheduler_wait(self.provider, time.perf_counter() - queued_at)
+
+    def release(self, tenant: str):
+        self.in_flight -= 1
+        self._tenant_in_flight[tenant] -= 1
+        if not self._tenant_in_flight[tenant]:
+            del self._tenant_in_flight[tenant]
+            if tenant not in self._queues and self._tags.get(tenant, 0.0) <= self._virtual_time:
+                self._tags.pop(tenant, None)
+        if not self.in_flight and not self._queues:
+            # Idle: nobody is owed anything from the last busy spell
+            self._tags.clear()
+        self._dispatch()
+
+
+_schedulers: Dict[str, ProviderScheduler] = {}
+
+
+def get_scheduler(provider: str) -> ProviderScheduler:
+    """The provider's scheduler, configured from the environment on first use in each process"""
+    if provider not in _schedulers:
+        _schedulers[provider] = ProviderScheduler.from_env(provider)
+    return _schedulers[provider]
+
+
+@asynccontextmanager
+async def limit(provider: str, tenant: str):
+    """Hold one of the provider's slots for tenant (a user_id) while the block runs"""
+    scheduler = get_scheduler(provider)
+    await scheduler.acquire(tenant)
+    try:
+        yield
+    finally:
+        scheduler.release(tenant)
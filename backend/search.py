@@ -0,0 +1,220 @@
+"""Indexed typeahead search for customers and products.
+
+Every customer and product carries two derived fields:
+
+    name_key       normalized name ("ramesh kumar") for anchored prefix ranges
+    search_tokens  word prefixes ("ra", "ram", ..., "ku", ...), "~" trigrams
+                   of each word for infix matches and phone number prefixes
+
+Both are covered by (user_id, ...) indexes, so a lookup is a handful of index
+seeks scoped to one shopkeeper. User input is never compiled into a regex.
+Names are not unique: a shopkeeper can have two customers called Ramesh.
+
+Documents written before these fields existed are filled in by:
+    python -m search
+and every document's fields are derived again, after a change to how names
+are normalized, by:
+    python -m search --rebuild
+"""
+import asyncio
+import logging
+import re
+import unicodedata
+from typing import Optional
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+MAX_PREFIX = 15  # Longer words still match on their first 15 characters
+MAX_QUERY_TERMS = 5
+MAX_QUERY_LENGTH = 64
+CANDIDATES = 200  # Upper bound on documents ranked per request
+SEARCH_DEFAULT_LIMIT = 10
+SEARCH_MAX_LIMIT = 50
+
+NAME_KEY_INDEX = [("user_id", 1), ("name_key", 1)]
+SEARCH_INDEXES = [
+    [("user_id", 1), ("search_tokens", 1)],
+]
+
+BACKFILL_BATCH_SIZE = 1000
+
+_NON_DIGIT = re.compile(r"\D")
+
+
+def normalize(text: Optional[str]) -> list:
+    """Lower-cased runs of letters, marks and digits.
+
+    Marks are part of the word, so Devanagari vowel signs and viramas stay
+    inside it: "रमेश" is one word, not "रम" and "श".
+    """
+    text = "".join(ch if unicodedata.category(ch)[0] in "LMN" else " " for ch in (text or "").lower())
+    return text.split()
+
+
+def _trigrams(word: str) -> set:
+    return {f"~{word[i:i + 3]}" for i in range(len(word) - 2)}
+
+
+def phone_key(phone: Optional[str]) -> str:
+    """The last 10 digits of a phone number, so +91 98000 12345 equals 9800012345"""
+    return _NON_DIGIT.sub("", phone or "")[-10:]
+
+
+def phone_matches(candidates: list, phone: Optional[str]) -> list:
+    """The documents among same-named `candidates` that a record with `phone` can be.
+
+    Without a phone that is all of them; with one, those with the same number,
+    else those with no number on file. A different number is a different
+    person who happens to share the name.
+    """
+    phone = phone_key(phone)
+    if not phone:
+        return candidates
+    same = [doc for doc in candidates if phone_key(doc.get("phone")) == phone]
+    return same or [doc for doc in candidates if not phone_key(doc.get("phone"))]
+
+
+def search_fields(name: str, phone: Optional[str] = None) -> dict:
+    """Derived fields to $set whenever a customer's or product's name changes"""
+    words = normalize(name)
+    tokens = set()
+    for word in words:
+        tokens.update(word[:i] for i in range(1, min(len(word), MAX_PREFIX) + 1))
+        tokens.update(_trigrams(word))
+    digits = phone_key(phone)
+    tokens.update(digits[:i] for i in range(3, len(digits) + 1))
+    return {"name_key": " ".join(words), "search_tokens": sorted(tokens)}
+
+
+def _rank(doc: dict, phrase: str, terms: list) -> tuple:
+    name_key = " ".join(normalize(doc.get("name")))
+    words = name_key.split()
+    if name_key == phrase:
+        tier = 0
+    elif name_key.startswith(phrase):
+        tier = 1
+    elif all(any(word.startswith(term) for word in words) for term in terms):
+        tier = 2
+    else:
+        tier = 3
+    return tier, len(name_key), name_key
+
+
+async def typeahead(collection, user_id: str, query: str, limit: int = SEARCH_DEFAULT_LIMIT) -> list:
+    """Ranked matches for `query` within one shopkeeper's documents.
+
+    Whole-name prefixes come first (one index range scan), then documents
+    where every query word starts a word of the name, then infix matches via
+    trigrams. Later stages only run while the page is not yet full.
+    """
+    terms = normalize(query[:MAX_QUERY_LENGTH])[:MAX_QUERY_TERMS]
+    if not terms:
+        return []
+    phrase = " ".join(terms)
+    projection = {"_id": 0, "name_key": 0, "search_tokens": 0}
+    limit = min(limit, SEARCH_MAX_LIMIT)
+
+    found = await collection.find(
+        {"user_id": user_id, "name_key": {"$gte": phrase, "$lt": phrase + "\U0010ffff"}}, projection
+    ).sort("name_key", 1).limit(limit).to_list(limit)
+
+    # (tokens, substring check): trigrams can match without the query being a
+    # substring of the name, so those candidates are verified
+    stages = [([term[:MAX_PREFIX] for term in terms], False)]
+    grams = set().union(*(_trigrams(term) for term in terms))
+    if grams:
+        stages.append((sorted(grams), True))
+
+    for tokens, verify in stages:
+        if len(found) >= limit:
+            break
+        seen = [doc["id"] for doc in found]
+        candidates = await collection.find(
+            {"user_id": user_id, "search_tokens": {"$all": tokens}, "id": {"$nin": seen}}, projection
+        ).limit(CANDIDATES).to_list(CANDIDATES)
+        if verify:
+            candidates = [
+                doc for doc in candidates
+                if all(term in " ".join(normalize(doc.get("name"))) for term in terms)
+            ]
+        found.extend(candidates)
+
+    found.sort(key=lambda doc: _rank(doc, phrase, terms))
+    return found[:limit]
+
+
+async def _create_name_key_index(collection):
+    """Plain (user_id, name_key), replacing a unique index on the same keys"""
+    indexes = await collection.index_information()
+    for name, info in indexes.items():
+        if list(info["key"]) == NAME_KEY_INDEX and info.get("unique"):
+            await collection.drop_index(name)
+    await collection.create_index(NAME_KEY_INDEX)
+
+
+async def create_search_indexes(db):
+    for collection in (db.customers, db.products):
+        await _create_name_key_index(collection)
+        for keys in SEARCH_INDEXES:
+            await collection.create_index(keys)
+
+
+async def backfill_search_fields(db, batch_size: int = BACKFILL_BATCH_SIZE, rebuild: bool = False) -> dict:
+    """Derive name_key/search_tokens for documents that do not have them yet
+    (every document with rebuild=True)"""
+    summary = {}
+    query = {} if rebuild else {"search_tokens": {"$exists": False}}
+    for collection in (db.customers, db.products):
+        updated = 0
+        cursor = collection.find(query, {"_id": 1, "name": 1, "phone": 1}).batch_size(batch_size)
+        batch = []
+        async for doc in cursor:
+            batch.append(UpdateOne({"_id": doc["_id"]}, {"$set": search_fields(doc.get("name"), doc.get("phone"))}))
+            if len(batch) >= batch_size:
+                await collection.bulk_write(batch, ordered=False)
+                updated += len(batch)
+                batch = []
+        if batch:
+            await collection.bulk_write(batch, ordered=False)
+            updated += len(batch)
+        summary[collection.name] = updated
+    if any(summary.values()):
+        logger.info(f"Search fields backfilled: {summary}")
+    return summary
+
+
+def main():
+    import argparse
+    import json
+    import os
+    from datetime import timezone
+    from pathlib import Path
+
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Create the search indexes and fill in search fields")
+    parser.add_argument("--rebuild", action="store_true", help="derive the fields again for every document")
+    args = parser.parse_args()
+
+    load_dotenv(Path(__file__).parent / '.env')
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True, tzinfo=timezone.utc)
+    db = client[os.environ['DB_NAME']]
+
+    async def run():
+        await create_search_indexes(db)
+        return await backfill_search_fields(db, rebuild=args.rebuild)
+
+    try:
+        summary = asyncio.run(run())
+    finally:
+        client.close()
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
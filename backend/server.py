@@ -1,4 +1,4 @@
-from fastapi import FastAPI, APIRouter, Request, Form, HTTPException, UploadFile, File
+from fastapi import FastAPI, APIRouter, Depends, Request, Form, HTTPException, UploadFile, File, Query
 from fastapi.responses import StreamingResponse, Response as FastAPIResponse, HTMLResponse
 from dotenv import load_dotenv
 from pathlib import Path
@@ -12,50 +12,106 @@ load_dotenv(ROOT_DIR / '.env')
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import logging
+import re
 from pydantic import BaseModel, Field, ConfigDict
 from typing import List, Optional
 import uuid
-from datetime import datetime, timezone
-from twilio.rest import Client
-from twilio.request_validator import RequestValidator
-from twilio.twiml.messaging_response import MessagingResponse
-import requests
+from datetime import datetime, timedelta, timezone
 import io
-from emergentintegrations.llm.chat import LlmChat, UserMessage
-import razorpay
-from pdf_generator import generate_invoice_pdf
-from translations import translate, get_whatsapp_messages
+from translations import get_whatsapp_messages
+from billing import best_customer_match, build_product_catalog, find_catalog_price, format_invoice_text, invoice_totals, line_total, merge_invoice_data
 from email_service import send_invoice_email
-
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+from whatsapp_sender import WhatsAppSender
+from payment_links import PaymentLinkService
+from reconciliation import reconcile_payments
+from customer_stats import apply_invoice_change, merged_delta_operations, run_periodic_reconciler
+from analytics import ANALYTICS_TZ, apply_rollup_change, create_rollup_indexes, get_summary, merged_rollup_operations, rebuild_rollups, write_rollup_operations
+from invoice_numbers import create_invoice_counter_indexes, reserve_invoice_numbers
+from search import backfill_search_fields, create_search_indexes, phone_matches, search_fields, typeahead, SEARCH_DEFAULT_LIMIT, SEARCH_MAX_LIMIT
+from catalog import get_catalog, invalidate_catalog, refresh_catalog
+from bulk_import import import_records, IMPORT_BATCH_SIZE, MAX_IMPORT_BATCH_SIZE
+from gst_reports import create_gst_report_indexes, get_gst_report, report_csv, run_period_close
+from ledger import get_customer_ledger, LEDGER_INDEX
+from pagination import paginate, set_page_headers, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from export import stream_invoices, MEDIA_TYPES
+from migrate_dates import as_datetime, dates_migrated, ensure_dates_migrated
+from fast_responses import fast_list_response, model_defaults, model_projection
+from fieldsets import list_responses, resolve_fields, sparse_adapter, sparse_list_response, sparse_projection
+from pymongo import ReturnDocument
+import asyncio
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from functools import lru_cache, partial
+from metrics import mark_worker_stopped, metrics_middleware, monitor_event_loop_lag, mongo_event_listeners, record_fallback, render_metrics, stage_timer, timed
+from profiling import LOOP_BLOCK_THRESHOLD_MS, LoopBlockDetector, profiling_middleware
+from audio_preprocessing import AUDIO_PREPROCESSING_ENABLED, preprocess_voice_note, shutdown_pool, start_pool
+from settings import Settings
+from transcription import TranscriptionBackend, create_transcription_backend, transcribe_in_order
+from scheduler import ProviderOverloaded, limit
 
 # Twilio setup
 TWILIO_ACCOUNT_SID = os.environ.get('TWILIO_ACCOUNT_SID', 'your_twilio_account_sid_here')
 TWILIO_AUTH_TOKEN = os.environ.get('TWILIO_AUTH_TOKEN', 'your_twilio_auth_token_here')
 TWILIO_WHATSAPP_NUMBER = os.environ.get('TWILIO_WHATSAPP_NUMBER', 'whatsapp:+14155238886')
 
-twilio_client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
-validator = RequestValidator(TWILIO_AUTH_TOKEN)
+@lru_cache(maxsize=None)
+def get_request_validator():
+    from twilio.request_validator import RequestValidator
+    return RequestValidator(TWILIO_AUTH_TOKEN)
 
 # Emergent LLM Key for text generation (GPT-4o)
 EMERGENT_LLM_KEY = os.environ.get('EMERGENT_LLM_KEY')
 
-# AssemblyAI API Key for speech-to-text transcription
-ASSEMBLYAI_API_KEY = os.environ.get('ASSEMBLYAI_API_KEY')
-
 # Razorpay Configuration
 RAZORPAY_KEY_ID = os.environ.get('RAZORPAY_KEY_ID', 'rzp_test_dummykey123456789')
 RAZORPAY_KEY_SECRET = os.environ.get('RAZORPAY_KEY_SECRET', 'razorpay_test_secret_dummy123')
 RAZORPAY_TEST_MODE = os.environ.get('RAZORPAY_TEST_MODE', 'True').lower() == 'true'
+RAZORPAY_BASE_URL = os.environ.get('RAZORPAY_BASE_URL', 'https://api.razorpay.com')
+
+# Public URL of this backend, used for PDF and payment links
+BACKEND_URL = os.environ.get('REACT_APP_BACKEND_URL', 'https://easy-billing-20.preview.emergentagent.com')
 
-# Initialize Razorpay client
-razorpay_client = razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
+@lru_cache(maxsize=None)
+def get_razorpay_client():
+    """Razorpay SDK client, imported and built on first use (test mode never needs it)"""
+    import razorpay
+    return razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET), base_url=RAZORPAY_BASE_URL)
 
-# Create the main app
-app = FastAPI(title="VoiceBill API")
+class Resources:
+    """Clients owned by one app in one worker process, opened by its lifespan"""
+
+    def __init__(self, settings: Settings):
+        self.client = AsyncIOMotorClient(
+            settings.mongo_url, tz_aware=True, tzinfo=timezone.utc,
+            event_listeners=mongo_event_listeners(), **settings.mongo_client_options()
+        )
+        self.db = self.client[settings.db_name]
+        self.payment_links = PaymentLinkService(self.db, get_razorpay_client, BACKEND_URL, RAZORPAY_TEST_MODE)
+        self.whatsapp_sender = WhatsAppSender(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_WHATSAPP_NUMBER)
+        self.transcriber = create_transcription_backend(settings.transcription_backend)
+
+    async def aclose(self):
+        await self.transcriber.aclose()
+        await self.whatsapp_sender.aclose()
+        self.client.close()
+
+def get_resources(request: Request) -> Resources:
+    return request.app.state.resources
+
+def get_db(request: Request):
+    return request.app.state.resources.db
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    resources = Resources(app.state.settings)
+    app.state.resources = resources
+    loop_block_detector = await start_background_jobs(resources)
+    try:
+        yield
+    finally:
+        await shutdown_background_jobs(loop_block_detector)
+        await resources.aclose()
+        mark_worker_stopped()
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -151,6 +207,7 @@ class Invoice(BaseModel):
     status: str = "unpaid"  # unpaid, paid, partial
     payment_status: str = "pending"  # pending, completed
     payment_link: Optional[str] = ""
+    payment_link_id: Optional[str] = ""  # Razorpay plink_ id, empty in test mode
     payment_id: Optional[str] = ""
     transcription: Optional[str] = ""
     language: str = "en"  # Invoice language
@@ -167,6 +224,47 @@ class PendingInvoice(BaseModel):
     transcription: str
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class LedgerEntry(BaseModel):
+    invoice_id: str
+    invoice_number: str
+    date: datetime
+    status: str = "unpaid"
+    debit: float  # Invoice total
+    credit: float  # Amount paid against it
+    balance: float  # Running balance after this entry
+
+class CustomerLedger(BaseModel):
+    customer_id: str
+    customer_name: str
+    opening_balance: float
+    closing_balance: float
+    entries: List[LedgerEntry]
+    next_cursor: Optional[str] = None
+
+# Opt-in: list endpoints skip per-row model validation and serialize with orjson
+FAST_LIST_RESPONSES = os.environ.get('FAST_LIST_RESPONSES', 'False').lower() == 'true'
+FAST_LIST_SHAPES = {
+    name: (model_projection(model), model_defaults(model))
+    for name, model in {"users": User, "invoices": Invoice, "customers": Customer, "products": Product}.items()
+}
+
+# Named sparse fieldsets for ?fields=<view>; None returns the full document
+LIST_VIEWS = {
+    "invoices": {
+        "summary": ("invoice_number", "customer_name", "date", "total", "status"),
+        "dues": ("invoice_number", "customer_id", "customer_name", "date", "total", "amount_paid", "amount_due", "status"),
+        "full": None,
+    },
+    "customers": {
+        "summary": ("name", "phone", "total_purchases", "total_due"),
+        "full": None,
+    },
+    "products": {
+        "summary": ("name", "price"),
+        "full": None,
+    },
+}
+
 class InvoiceCreate(BaseModel):
     user_id: str
     customer_name: Optional[str] = "Walk-in Customer"
@@ -174,16 +272,21 @@ class InvoiceCreate(BaseModel):
     items: List[InvoiceItem]
     tax_rate: float = 0.0
 
+MAX_INVOICE_BATCH_SIZE = 10000
+# Payment links, PDFs and notifications for a batch run this many at a time
+INVOICE_FOLLOWUP_CONCURRENCY = int(os.environ.get('INVOICE_FOLLOWUP_CONCURRENCY', 8))
+# Batch follow-ups claimed this long ago and still pending are run again; keep it above a full batch's run time
+INVOICE_FOLLOWUP_LEASE = float(os.environ.get('INVOICE_FOLLOWUP_LEASE', 3600))
+
 # ==================== Helper Functions ====================
 
-async def find_customer_by_name(user_id: str, customer_name: str):
+async def find_customer_by_name(db, user_id: str, customer_name: str):
     """Find customer by name with fuzzy matching for typos"""
+    pattern = re.escape(customer_name)
     try:
-        from difflib import SequenceMatcher
-        
         # Try exact match first
         customer = await db.customers.find_one(
-            {"user_id": user_id, "name": {"$regex": f"^{customer_name}$", "$options": "i"}},
+            {"user_id": user_id, "name": {"$regex": f"^{pattern}$", "$options": "i"}},
             {"_id": 0}
         )
         
@@ -193,7 +296,7 @@ async def find_customer_by_name(user_id: str, customer_name: str):
         
         # Try partial match
         customer = await db.customers.find_one(
-            {"user_id": user_id, "name": {"$regex": customer_name, "$options": "i"}},
+            {"user_id": user_id, "name": {"$regex": pattern, "$options": "i"}},
             {"_id": 0}
         )
         
@@ -203,7 +306,7 @@ async def find_customer_by_name(user_id: str, customer_name: str):
         
         # Check default customers with exact match
         customer = await db.customers.find_one(
-            {"user_id": "default-user", "name": {"$regex": f"^{customer_name}$", "$options": "i"}},
+            {"user_id": "default-user", "name": {"$regex": f"^{pattern}$", "$options": "i"}},
             {"_id": 0}
         )
         
@@ -217,14 +320,7 @@ async def find_customer_by_name(user_id: str, customer_name: str):
             {"_id": 0}
         ).to_list(100)
         
-        best_match = None
-        best_ratio = 0.0
-        
-        for cust in all_customers:
-            ratio = SequenceMatcher(None, customer_name.lower(), cust['name'].lower()).ratio()
-            if ratio > best_ratio and ratio >= 0.7:  # 70% similarity threshold
-                best_ratio = ratio
-                best_match = cust
+        best_match, best_ratio = best_customer_match(customer_name, all_customers)
         
         if best_match:
             logger.info(f"Found fuzzy customer match: '{customer_name}' → '{best_match['name']}' (similarity: {best_ratio:.2f})")
@@ -236,14 +332,20 @@ async def find_customer_by_name(user_id: str, customer_name: str):
         logger.error(f"Error finding customer: {str(e)}")
         return None
 
-async def get_or_create_user(phone: str) -> User:
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Treat naive query datetimes as UTC, matching how dates are stored"""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+async def get_or_create_user(db, phone: str) -> User:
     """Get existing user or create a new one"""
     phone_clean = phone.replace("whatsapp:", "")
     user_doc = await db.users.find_one({"phone": phone_clean}, {"_id": 0})
     
     if user_doc:
-        if isinstance(user_doc['created_at'], str):
-            user_doc['created_at'] = datetime.fromisoformat(user_doc['created_at'])
         return User(**user_doc)
     
     # Create new user
@@ -253,120 +355,111 @@ async def get_or_create_user(phone: str) -> User:
         business_name=f"Business {phone_clean[-4:]}"
     )
     doc = new_user.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
     await db.users.insert_one(doc)
     return new_user
 
-async def transcribe_audio(audio_url: str) -> str:
-    """Transcribe audio using AssemblyAI"""
+async def download_voice_note(audio_url: str, user_id: str) -> Optional[List[dict]]:
+    """A voice note's chunks to transcribe, or None if it could not be downloaded"""
+    import requests
     try:
         # Download audio from Twilio
-        response = requests.get(audio_url, auth=(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN))
-        response.raise_for_status()
-        
-        audio_content = response.content
-        logger.info(f"Downloaded audio: {len(audio_content)} bytes")
-        
-        # Save audio temporarily
-        import tempfile
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.ogg') as temp_audio:
-            temp_audio.write(audio_content)
-            temp_audio_path = temp_audio.name
-        
-        try:
-            # Use AssemblyAI for transcription
-            import assemblyai as aai
-            
-            aai.settings.api_key = ASSEMBLYAI_API_KEY
-            
-            # Create transcriber
-            transcriber = aai.Transcriber()
-            
-            # Transcribe the audio file
-            transcript = transcriber.transcribe(temp_audio_path)
-            
-            # Check if transcription was successful
-            if transcript.status == aai.TranscriptStatus.error:
-                logger.error(f"AssemblyAI transcription error: {transcript.error}")
-                return "[Transcription failed]"
-            
-            transcription_text = transcript.text or "[No speech detected]"
-            logger.info(f"Transcription successful: {transcription_text}")
-            return transcription_text
-            
-        finally:
-            # Clean up temporary file
-            import os as os_module
-            try:
-                os_module.unlink(temp_audio_path)
-            except:
-                pass
-        
+        async with limit("twilio", user_id):
+            with stage_timer("audio_download"):
+                response = await asyncio.to_thread(requests.get, audio_url, auth=(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN))
+                response.raise_for_status()
+    except ProviderOverloaded:
+        raise
     except Exception as e:
-        logger.error(f"Transcription error: {str(e)}")
-        return "[Transcription failed]"
+        logger.error(f"Voice note download error: {str(e)}")
+        record_fallback("transcription")
+        return None
+    
+    logger.info(f"Downloaded audio: {len(response.content)} bytes")
+    
+    # Trimmed mono 16 kHz Opus, split if long, or the original if pre-processing fails
+    return await preprocess_voice_note(response.content)
+
+TRANSCRIPTION_FAILED = "[Transcription failed]"
 
-async def extract_invoice_data(transcription: str, user_id: str):
-    """Extract invoice items from transcription using GPT-4o, product catalog, and customer database"""
+async def transcribe_chunk(transcriber: TranscriptionBackend, user_id: str, audio: bytes) -> str:
+    """Transcribe one chunk with the configured backend"""
+    try:
+        async with limit(transcriber.name, user_id):
+            with stage_timer("transcription"):
+                text = await transcriber.transcribe(audio)
+    except ProviderOverloaded:
+        raise
+    except Exception as e:
+        logger.error(f"Transcription error: {str(e)}")
+        record_fallback("transcription")
+        return TRANSCRIPTION_FAILED
+    logger.info(f"Transcription successful ({transcriber.name}): {text}")
+    return text
+
+async def transcribe_and_extract(db, transcriber: TranscriptionBackend, audio_urls: List[str], user_id: str):
+    """(combined transcription, invoice data) for a message's voice notes.
+
+    Every chunk of every note is transcribed at once. Each chunk's text goes
+    to extraction as soon as it and the chunks before it are ready, so a long
+    note's first items are parsed while the rest is still being transcribed.
+    Chunks that failed to transcribe are not extracted. If any chunk's
+    extraction fails, the readable text is extracted again in one request
+    rather than billing a sale with items missing.
+    """
+    notes = await asyncio.gather(*(download_voice_note(url, user_id) for url in audio_urls))
+    transcripts = [[TRANSCRIPTION_FAILED] if chunks is None else [] for chunks in notes]
+    extractions = []
+    try:
+        async for index, text in transcribe_in_order(
+            partial(transcribe_chunk, transcriber, user_id), [chunks or [] for chunks in notes]
+        ):
+            transcripts[index].append(text)
+            if text.strip() and text != TRANSCRIPTION_FAILED:
+                extractions.append(asyncio.create_task(extract_invoice_data(db, text, user_id, fallback=False)))
+        
+        combined_transcription = " ".join(" ".join(texts).strip() or "[No speech detected]" for texts in transcripts)
+        if extractions:
+            results = await asyncio.gather(*extractions, return_exceptions=True)
+            failed = [result for result in results if isinstance(result, Exception)]
+            for error in failed:
+                if isinstance(error, ProviderOverloaded):
+                    raise error
+            if not failed:
+                return combined_transcription, merge_invoice_data(results)
+            logger.warning(f"{len(failed)} of {len(results)} chunk extractions failed; extracting the whole transcript")
+        readable = " ".join(text for texts in transcripts for text in texts if text != TRANSCRIPTION_FAILED).strip()
+        return combined_transcription, await extract_invoice_data(db, readable or combined_transcription, user_id)
+    finally:
+        # Only left running when a provider was overloaded or the request was cancelled
+        for task in extractions:
+            task.cancel()
+
+async def extract_invoice_data(db, transcription: str, user_id: str, fallback: bool = True):
+    """Extract invoice items from transcription using GPT-4o, product catalog, and customer database.
+
+    On failure a placeholder item is returned, or with fallback=False the error is raised.
+    """
     try:
-        # Get user's products AND default/shared products
-        user_products = await db.products.find({"user_id": user_id}, {"_id": 0}).to_list(1000)
-        default_products = await db.products.find({"user_id": "default-user"}, {"_id": 0}).to_list(1000)
+        # Get user's products AND default/shared products (cached per user)
+        catalog = await get_catalog(db, user_id)
+        user_products = catalog["user_products"]
+        default_products = catalog["default_products"]
         
         # Combine both catalogs (user products take priority)
         all_products = default_products + user_products
-        product_catalog = {}
-        for p in all_products:
-            product_catalog[p['name'].lower()] = p['price']
+        product_catalog = build_product_catalog(all_products)
         
         logger.info(f"Loading catalog for user {user_id}: {len(user_products)} user products, {len(default_products)} shared products")
         logger.info(f"Combined catalog: {product_catalog}")
         
         # Get customer list for matching
-        customers = await db.customers.find(
-            {"$or": [{"user_id": user_id}, {"user_id": "default-user"}]},
-            {"_id": 0}
-        ).to_list(100)
-        customer_names = [c['name'] for c in customers]
+        customer_names = [c['name'] for c in catalog["customers"]]
         
         customer_info = ""
         if customer_names:
             customer_info = f"\n\nKnown customers: {', '.join(customer_names[:20])}"
             logger.info(f"Passing customer list to GPT: {customer_names}")
         
-        # Create a mapping for fuzzy matching (handle plurals and variations)
-        def find_catalog_price(item_name: str):
-            """Find price in catalog with fuzzy matching"""
-            item_lower = item_name.lower().strip()
-            
-            # Direct match
-            if item_lower in product_catalog:
-                return product_catalog[item_lower]
-            
-            # Try removing common plural suffixes
-            for suffix in ['s', 'es', 'ies']:
-                if item_lower.endswith(suffix):
-                    singular = item_lower[:-len(suffix)]
-                    if suffix == 'ies':
-                        singular = singular + 'y'
-                    if singular in product_catalog:
-                        logger.info(f"Matched '{item_name}' to '{singular}' in catalog")
-                        return product_catalog[singular]
-            
-            # Try adding 's' (reverse check)
-            plural = item_lower + 's'
-            if plural in product_catalog:
-                logger.info(f"Matched '{item_name}' to '{plural}' in catalog")
-                return product_catalog[plural]
-            
-            # Partial match
-            for catalog_item, price in product_catalog.items():
-                if catalog_item in item_lower or item_lower in catalog_item:
-                    logger.info(f"Partial match '{item_name}' to '{catalog_item}' in catalog")
-                    return price
-            
-            return None
-        
         # Create context for GPT with product catalog and customer list
         catalog_info = ""
         if product_catalog:
@@ -374,6 +467,8 @@ async def extract_invoice_data(transcription: str, user_id: str):
             for name, price in product_catalog.items():
                 catalog_info += f"- {name}: Rs. {price}\n"
         
+        # The LLM SDK is slow to import; load it with the first voice note
+        from emergentintegrations.llm.chat import LlmChat, UserMessage
         chat = LlmChat(
             api_key=EMERGENT_LLM_KEY,
             session_id=f"invoice_{user_id}_{datetime.now().timestamp()}",
@@ -445,7 +540,9 @@ Examples:
             text=f"Extract invoice items from this voice note transcription: {transcription}"
         )
         
-        response = await chat.send_message(user_message)
+        async with limit("llm", user_id):
+            with stage_timer("llm_extraction"):
+                response = await chat.send_message(user_message)
         
         # Parse the response
         import json
@@ -465,7 +562,7 @@ Examples:
         for item in invoice_data.get("items", []):
             logger.info(f"Processing item: {item['name']}, price: {item.get('price')}")
             if item.get("price") is None:
-                catalog_price = find_catalog_price(item['name'])
+                catalog_price = find_catalog_price(item['name'], product_catalog)
                 if catalog_price is not None:
                     item['price'] = catalog_price
                     logger.info(f"✓ Using catalog price for '{item['name']}': Rs. {item['price']}")
@@ -477,7 +574,7 @@ Examples:
         customer_name = invoice_data.get("customer_name", "Walk-in Customer")
         customer_data = None
         if customer_name != "Walk-in Customer":
-            customer_data = await find_customer_by_name(user_id, customer_name)
+            customer_data = await find_customer_by_name(db, user_id, customer_name)
             if customer_data:
                 invoice_data['customer_id'] = customer_data['id']
                 invoice_data['customer_email'] = customer_data.get('email', '')
@@ -492,8 +589,13 @@ Examples:
         logger.info(f"Missing prices: {missing_prices}")
         return invoice_data
         
+    except ProviderOverloaded:
+        raise
     except Exception as e:
         logger.error(f"Invoice extraction error: {str(e)}")
+        if not fallback:
+            raise
+        record_fallback("llm_extraction")
         return {
             "customer_name": "Walk-in Customer",
             "items": [{"name": "Item from voice note", "quantity": 1, "price": 100}],
@@ -502,90 +604,174 @@ Examples:
 
 async def generate_invoice_text(invoice: Invoice, language: str = 'en') -> str:
     """Generate formatted invoice text for WhatsApp with multi-language support"""
-    t = lambda key: translate(key, language)
-    
-    lines = [
-        f"📄 {t('invoice')}",
-        "━━━━━━━━━━━━━━━━━━━━━━━",
-        f"{t('invoice_number')}: {invoice.invoice_number}",
-        f"{t('date')}: {invoice.date.strftime('%Y-%m-%d %H:%M')}",
-        f"{t('customer')}: {invoice.customer_name}",
-    ]
-    
-    # Add customer phone if available
-    if invoice.customer_phone:
-        lines.append(f"📱 Phone: {invoice.customer_phone}")
-    
-    # Add customer email if available
-    if invoice.customer_email:
-        lines.append(f"📧 Email: {invoice.customer_email}")
-    
-    lines.extend([
-        "",
-        t('items') + ":"
-    ])
-    
-    for item in invoice.items:
-        lines.append(f"\n• {item.name}")
-        lines.append(f"  {t('quantity')}: {item.quantity} × ₹{item.price:.2f} = ₹{item.total:.2f}")
-    
-    lines.extend([
-        "",
-        "━━━━━━━━━━━━━━━━━━━━━━━",
-        f"{t('subtotal')}:    ₹{invoice.subtotal:.2f}",
-        f"{t('tax')} ({invoice.tax_rate*100:.0f}%):      ₹{invoice.tax:.2f}",
-        "━━━━━━━━━━━━━━━━━━━━━━━",
-        f"{t('grand_total')}:       ₹{invoice.total:.2f}",
-        ""
-    ])
-    
-    # Add credit/due information if partial payment
-    if invoice.amount_paid > 0:
-        lines.extend([
-            f"{t('amount_paid')}:  ₹{invoice.amount_paid:.2f}",
-            f"{t('amount_due')}:   ₹{invoice.amount_due:.2f}",
-            ""
-        ])
-    
-    # Get backend URL for links
     backend_url = os.environ.get('REACT_APP_BACKEND_URL', 'https://easy-billing-20.preview.emergentagent.com')
-    pdf_link = f"{backend_url}/api/invoices/{invoice.id}/pdf"
-    
-    # Add PDF download link
-    lines.extend([
-        f"📄 {t('download_pdf')}:",
-        pdf_link,
-        ""
-    ])
-    
-    # Add payment link if available
-    if invoice.payment_link:
-        lines.extend([
-            f"💳 {t('pay_now')}:",
-            invoice.payment_link,
-            ""
-        ])
-    else:
-        lines.append(f"💳 {t('payment_due')}")
-        lines.append("")
-    
-    lines.append(t('thank_you'))
-    
-    return "\n".join(lines)
+    return format_invoice_text(invoice, language, backend_url)
 
-async def send_whatsapp_message(to: str, message: str):
-    """Send WhatsApp message via Twilio"""
+@timed("whatsapp", failed=lambda delivered: not delivered)
+async def send_whatsapp_message(resources: Resources, to: str, message: str, user_id: str):
+    """Send WhatsApp message via Twilio and record the delivery result"""
     try:
-        msg = twilio_client.messages.create(
-            body=message,
-            from_=TWILIO_WHATSAPP_NUMBER,
-            to=to
-        )
-        logger.info(f"Message sent: {msg.sid}")
-        return True
-    except Exception as e:
-        logger.error(f"Failed to send message: {str(e)}")
+        async with limit("twilio", user_id):
+            result = await resources.whatsapp_sender.send(to, message)
+    except ProviderOverloaded as e:
+        logger.error(f"Failed to send message to {to}: {str(e)}")
         return False
+    try:
+        await resources.db.message_deliveries.insert_one(dict(result))
+    except Exception as e:
+        logger.error(f"Failed to record message delivery: {str(e)}")
+    return result["delivered"]
+
+async def run_bulk_import(db, collection, create_model, full_model, user_id: str, file: UploadFile, batch_size: int):
+    """Import an uploaded CSV/XLSX and refresh the shopkeeper's catalog cache once"""
+    try:
+        summary = await import_records(collection, create_model, full_model, user_id, file, batch_size)
+    finally:
+        await file.close()
+        # One refresh for the whole file instead of one invalidation per row; also after
+        # an unreadable file, whose earlier batches were saved
+        await refresh_catalog(db, user_id)
+    return {"success": summary["failed"] == 0, **summary}
+
+async def record_invoice_change(db, before: Optional[dict], after: Optional[dict]):
+    """Propagate one invoice write to customer totals and analytics rollups"""
+    await apply_invoice_change(db, before, after)
+    await apply_rollup_change(db, before, after)
+
+async def record_invoice_changes(db, changes: list):
+    """Bulk form of record_invoice_change: one write per customer and period"""
+    customer_ops = merged_delta_operations(changes)
+    if customer_ops:
+        await db.customers.bulk_write(customer_ops, ordered=False)
+    await write_rollup_operations(db, merged_rollup_operations(changes))
+
+async def match_batch_customers(db, invoices: List[InvoiceCreate]) -> dict:
+    """Known customers for a batch, listed by (user_id, name_key), one query per shopkeeper"""
+    wanted = defaultdict(set)
+    for invoice_input in invoices:
+        wanted[invoice_input.user_id].add(search_fields(invoice_input.customer_name or "")["name_key"])
+    customers = defaultdict(list)
+    for user_id, name_keys in wanted.items():
+        async for customer in db.customers.find(
+            {"user_id": user_id, "name_key": {"$in": list(name_keys)}},
+            {"_id": 0, "id": 1, "name_key": 1, "phone": 1, "email": 1, "address": 1}
+        ):
+            customers[(user_id, customer["name_key"])].append(customer)
+    return customers
+
+async def send_invoice_followups(resources: Resources, invoice_docs: List[dict], notify: bool):
+    """Payment links, then (if notify) emailed PDFs and WhatsApp messages to customers.
+
+    Each invoice's invoice_followups marker is removed once its follow-up has
+    finished or failed, so a worker that stops mid-batch leaves the rest for
+    resume_invoice_followups.
+    """
+    db = resources.db
+    semaphore = asyncio.Semaphore(INVOICE_FOLLOWUP_CONCURRENCY)
+
+    async def deliver(doc: dict):
+        try:
+            doc["payment_link"] = await resources.payment_links.get_or_create(doc)
+        except Exception as e:
+            logger.error(f"Payment link creation failed for {doc['invoice_number']}: {str(e)}")
+        if not notify:
+            return
+        invoice = Invoice(**doc)
+        if invoice.customer_email:
+            try:
+                from pdf_generator import generate_invoice_pdf
+                pdf_buffer = await asyncio.to_thread(generate_invoice_pdf, doc)
+                async with limit("smtp", invoice.user_id):
+                    email_sent = await asyncio.to_thread(
+                        send_invoice_email,
+                        to_email=invoice.customer_email,
+                        customer_name=invoice.customer_name,
+                        invoice_number=invoice.invoice_number,
+                        total_amount=invoice.total,
+                        pdf_content=pdf_buffer.read(),
+                        payment_link=invoice.payment_link,
+                        language=invoice.language
+                    )
+                if email_sent:
+                    await db.invoices.update_one({"id": invoice.id}, {"$set": {"email_sent": True}})
+            except Exception as e:
+                logger.error(f"Email sending failed for {invoice.invoice_number}: {str(e)}")
+        if invoice.customer_phone:
+            invoice_text = await generate_invoice_text(invoice, invoice.language)
+            await send_whatsapp_message(resources, f"whatsapp:{invoice.customer_phone}", invoice_text, invoice.user_id)
+
+    async def follow_up(doc: dict):
+        async with semaphore:
+            try:
+                await deliver(doc)
+            except Exception as e:
+                logger.error(f"Follow-up failed for {doc['invoice_number']}: {str(e)}")
+        # Not reached when cancelled at shutdown, which leaves the marker to resume from
+        await db.invoice_followups.delete_one({"invoice_id": doc["id"]})
+
+    await asyncio.gather(*(follow_up(doc) for doc in invoice_docs))
+    logger.info(f"Follow-ups finished for {len(invoice_docs)} batch invoices")
+
+async def resume_invoice_followups(resources: Resources):
+    """Claim batch follow-ups whose lease has run out and send them again.
+
+    Markers are claimed with one update_many, which takes each marker for one
+    worker only. Payment links are reused, but a customer whose email or
+    WhatsApp message went out just before the worker stopped gets it twice.
+    """
+    db = resources.db
+    now = datetime.now(timezone.utc)
+    claim = str(uuid.uuid4())
+    await db.invoice_followups.update_many(
+        {"claimed_at": {"$lt": now - timedelta(seconds=INVOICE_FOLLOWUP_LEASE)}},
+        {"$set": {"claimed_at": now, "claim": claim}},
+    )
+    markers = await db.invoice_followups.find({"claim": claim}, {"_id": 0}).to_list(None)
+    if not markers:
+        return 0
+    notify = {marker["invoice_id"]: marker.get("notify", False) for marker in markers}
+    docs = await db.invoices.find({"id": {"$in": list(notify)}}, {"_id": 0}).to_list(None)
+    # Invoices deleted since the batch need nothing more
+    found = {doc["id"] for doc in docs}
+    await db.invoice_followups.delete_many({"invoice_id": {"$in": [i for i in notify if i not in found]}})
+    logger.info(f"Resuming follow-ups for {len(docs)} batch invoices")
+    for flag in (True, False):
+        batch = [doc for doc in docs if notify[doc["id"]] == flag]
+        if batch:
+            await send_invoice_followups(resources, batch, flag)
+    return len(docs)
+
+async def run_followup_resumer(resources: Resources, interval: float):
+    """Resume abandoned batch follow-ups every `interval` seconds until cancelled"""
+    while True:
+        try:
+            await resume_invoice_followups(resources)
+        except Exception as e:
+            logger.error(f"Resuming batch follow-ups failed: {str(e)}")
+        await asyncio.sleep(interval)
+
+async def mark_invoice_paid(db, invoice_id: str, payment_id: str):
+    """Mark an invoice fully paid and settle the customer's due amount"""
+    before = await db.invoices.find_one({"id": invoice_id}, {"_id": 0})
+    if not before:
+        return None
+    update = {
+        "status": "paid",
+        "payment_status": "completed",
+        "payment_id": payment_id,
+        "amount_paid": before.get('total', 0),
+        "amount_due": 0,
+    }
+    # Only the first request to flip the invoice applies the customer delta
+    before = await db.invoices.find_one_and_update(
+        {"id": invoice_id, "status": {"$ne": "paid"}},
+        {"$set": update},
+        projection={"_id": 0},
+        return_document=ReturnDocument.BEFORE
+    )
+    if before:
+        await record_invoice_change(db, before, {**before, **update})
+    return before
 
 # ==================== API Routes ====================
 
@@ -610,42 +796,35 @@ async def whatsapp_webhook(
     To: str = Form(...),
     Body: str = Form(default=""),
     NumMedia: int = Form(default=0),
+    resources: Resources = Depends(get_resources),
 ):
     """Handle incoming WhatsApp messages"""
+    from twilio.twiml.messaging_response import MessagingResponse
+    db = resources.db
+    user = None
     try:
         form_data = await request.form()
         
         # Validate Twilio signature (skip in development)
         # twilio_signature = request.headers.get("X-Twilio-Signature", "")
-        # if not validator.validate(str(request.url), form_data, twilio_signature):
+        # if not get_request_validator().validate(str(request.url), form_data, twilio_signature):
         #     raise HTTPException(status_code=403, detail="Invalid signature")
         
         logger.info(f"Received message from {From} with {NumMedia} media")
         
         # Get or create user
-        user = await get_or_create_user(From)
+        user = await get_or_create_user(db, From)
         
         response = MessagingResponse()
         
         # Handle voice messages
         if NumMedia > 0:
-            all_transcriptions = []
-            audio_count = 0
-            
-            # Collect all audio transcriptions
-            for i in range(NumMedia):
-                media_url = form_data.get(f"MediaUrl{i}")
-                content_type = form_data.get(f"MediaContentType{i}", "")
-                
-                if content_type.startswith("audio/"):
-                    audio_count += 1
-                    try:
-                        # Transcribe audio
-                        transcription = await transcribe_audio(str(media_url))
-                        logger.info(f"Audio {i+1} transcription: {transcription}")
-                        all_transcriptions.append(transcription)
-                    except Exception as e:
-                        logger.error(f"Failed to transcribe audio {i+1}: {str(e)}")
+            audio_urls = [
+                str(form_data.get(f"MediaUrl{i}"))
+                for i in range(NumMedia)
+                if form_data.get(f"MediaContentType{i}", "").startswith("audio/")
+            ]
+            audio_count = len(audio_urls)
             
             # If we have audio files, process them
             if audio_count > 0:
@@ -654,13 +833,12 @@ async def whatsapp_webhook(
                 else:
                     response.message("🎤 Processing your voice message...")
                 
-                # Combine all transcriptions
-                combined_transcription = " ".join(all_transcriptions)
+                # Transcribe all voice notes and extract invoice data chunk by chunk
+                combined_transcription, invoice_data = await transcribe_and_extract(
+                    db, resources.transcriber, audio_urls, user.id
+                )
                 logger.info(f"Combined transcription ({audio_count} audios): {combined_transcription}")
                 
-                # Extract invoice data from combined transcription
-                invoice_data = await extract_invoice_data(combined_transcription, user.id)
-                
                 # Check if prices are missing
                 missing_prices = invoice_data.get("missing_prices", [])
                 if missing_prices:
@@ -672,7 +850,6 @@ async def whatsapp_webhook(
                         transcription=combined_transcription
                     )
                     doc = pending.model_dump()
-                    doc['created_at'] = doc['created_at'].isoformat()
                     await db.pending_invoices.insert_one(doc)
                     
                     # Ask for prices in a simple text message
@@ -697,25 +874,21 @@ async def whatsapp_webhook(
                     return FastAPIResponse(content=str(response), media_type="application/xml")
                 
                 # Calculate totals
-                items = []
-                subtotal = 0
-                for item_data in invoice_data.get("items", []):
-                    total = item_data["quantity"] * item_data["price"]
-                    items.append(InvoiceItem(
+                items = [
+                    InvoiceItem(
                         name=item_data["name"],
                         quantity=item_data["quantity"],
                         price=item_data["price"],
-                        total=total
-                    ))
-                    subtotal += total
+                        total=line_total(item_data["quantity"], item_data["price"])
+                    )
+                    for item_data in invoice_data.get("items", [])
+                ]
                 
                 tax_rate = 0.18  # 18% GST
-                tax = subtotal * tax_rate
-                total = subtotal + tax
+                subtotal, tax, total = invoice_totals([item.total for item in items], tax_rate)
                 
                 # Generate invoice number
-                invoice_count = await db.invoices.count_documents({"user_id": user.id})
-                invoice_number = f"INV-{user.id[:8]}-{invoice_count + 1:04d}"
+                invoice_number = (await reserve_invoice_numbers(db, user.id))[0]
                 
                 # Get customer data if found
                 customer_id = invoice_data.get("customer_id")
@@ -746,34 +919,12 @@ async def whatsapp_webhook(
                 
                 # Save to database first
                 doc = invoice.model_dump()
-                doc['date'] = doc['date'].isoformat()
-                doc['created_at'] = doc['created_at'].isoformat()
                 await db.invoices.insert_one(doc)
+                await record_invoice_change(db, None, doc)
                 
                 # Create payment link
                 try:
-                    backend_url = os.environ.get('REACT_APP_BACKEND_URL', 'https://easy-billing-20.preview.emergentagent.com')
-                    if RAZORPAY_TEST_MODE:
-                        payment_link = f"{backend_url}/api/test-payment/{invoice.id}"
-                    else:
-                        payment_data = {
-                            "amount": int(invoice.total * 100),
-                            "currency": "INR",
-                            "description": f"Invoice {invoice.invoice_number}",
-                            "customer": {
-                                "name": invoice.customer_name,
-                                "contact": invoice.customer_phone,
-                            },
-                            "notify": {"sms": False, "email": False}
-                        }
-                        payment_link_obj = razorpay_client.payment_link.create(payment_data)
-                        payment_link = payment_link_obj['short_url']
-                    
-                    # Update invoice with payment link
-                    await db.invoices.update_one(
-                        {"id": invoice.id},
-                        {"$set": {"payment_link": payment_link, "payment_status": "pending"}}
-                    )
+                    payment_link = await resources.payment_links.get_or_create(doc)
                     invoice.payment_link = payment_link
                 except Exception as e:
                     logger.error(f"Payment link creation failed: {str(e)}")
@@ -783,22 +934,23 @@ async def whatsapp_webhook(
                 if customer_email:
                     try:
                         # Generate PDF
+                        from pdf_generator import generate_invoice_pdf
                         invoice_doc = invoice.model_dump()
-                        invoice_doc['date'] = invoice.date.isoformat()
-                        invoice_doc['created_at'] = invoice.created_at.isoformat()
                         pdf_buffer = generate_invoice_pdf(invoice_doc)
                         pdf_content = pdf_buffer.read()
                         
                         # Send email
-                        email_sent = send_invoice_email(
-                            to_email=customer_email,
-                            customer_name=invoice.customer_name,
-                            invoice_number=invoice.invoice_number,
-                            total_amount=invoice.total,
-                            pdf_content=pdf_content,
-                            payment_link=invoice.payment_link,
-                            language=user.language
-                        )
+                        async with limit("smtp", user.id):
+                            email_sent = await asyncio.to_thread(
+                                send_invoice_email,
+                                to_email=customer_email,
+                                customer_name=invoice.customer_name,
+                                invoice_number=invoice.invoice_number,
+                                total_amount=invoice.total,
+                                pdf_content=pdf_content,
+                                payment_link=invoice.payment_link,
+                                language=user.language
+                            )
                         
                         if email_sent:
                             await db.invoices.update_one(
@@ -806,22 +958,12 @@ async def whatsapp_webhook(
                                 {"$set": {"email_sent": True}}
                             )
                             logger.info(f"✓ Invoice emailed to {customer_email}")
-                        
-                        # Update customer stats
-                        if customer_id:
-                            await db.customers.update_one(
-                                {"id": customer_id},
-                                {
-                                    "$inc": {"total_purchases": invoice.total, "total_due": invoice.amount_due},
-                                    "$set": {"last_purchase": datetime.now(timezone.utc).isoformat()}
-                                }
-                            )
                     except Exception as e:
                         logger.error(f"Email sending failed: {str(e)}")
                 
                 # Generate and send invoice with payment link
                 invoice_text = await generate_invoice_text(invoice, user.language)
-                await send_whatsapp_message(From, invoice_text)
+                await send_whatsapp_message(resources, From, invoice_text, user.id)
                 
                 return {"status": "success", "message": "Invoice sent"}
             else:
@@ -841,6 +983,7 @@ async def whatsapp_webhook(
                 # User is replying with prices for pending invoice
                 try:
                     # Extract prices from text using GPT
+                    from emergentintegrations.llm.chat import LlmChat, UserMessage
                     chat = LlmChat(
                         api_key=EMERGENT_LLM_KEY,
                         session_id=f"price_{user.id}_{datetime.now().timestamp()}",
@@ -852,7 +995,9 @@ Return JSON with prices array:
 Extract numbers mentioned as prices. Be lenient with format."""
                     ).with_model("openai", "gpt-4o")
                     
-                    price_response = await chat.send_message(UserMessage(text=Body))
+                    async with limit("llm", user.id):
+                        with stage_timer("llm_prices"):
+                            price_response = await chat.send_message(UserMessage(text=Body))
                     
                     import json
                     price_text = price_response.strip()
@@ -872,24 +1017,20 @@ Extract numbers mentioned as prices. Be lenient with format."""
                             item['price'] = prices[i]
                         
                         # Now generate the invoice
-                        items = []
-                        subtotal = 0
-                        for item_data in pending['items']:
-                            total = item_data["quantity"] * item_data["price"]
-                            items.append(InvoiceItem(
+                        items = [
+                            InvoiceItem(
                                 name=item_data["name"],
                                 quantity=item_data["quantity"],
                                 price=item_data["price"],
-                                total=total
-                            ))
-                            subtotal += total
+                                total=line_total(item_data["quantity"], item_data["price"])
+                            )
+                            for item_data in pending['items']
+                        ]
                         
                         tax_rate = 0.18
-                        tax = subtotal * tax_rate
-                        total = subtotal + tax
+                        subtotal, tax, total = invoice_totals([item.total for item in items], tax_rate)
                         
-                        invoice_count = await db.invoices.count_documents({"user_id": user.id})
-                        invoice_number = f"INV-{user.id[:8]}-{invoice_count + 1:04d}"
+                        invoice_number = (await reserve_invoice_numbers(db, user.id))[0]
                         
                         invoice = Invoice(
                             user_id=user.id,
@@ -900,47 +1041,35 @@ Extract numbers mentioned as prices. Be lenient with format."""
                             tax_rate=tax_rate,
                             tax=tax,
                             total=total,
+                            amount_due=total,
                             transcription=pending['transcription']
                         )
                         
                         # Save invoice
                         doc = invoice.model_dump()
-                        doc['date'] = doc['date'].isoformat()
-                        doc['created_at'] = doc['created_at'].isoformat()
                         await db.invoices.insert_one(doc)
+                        await record_invoice_change(db, None, doc)
                         
                         # Create payment link
-                        backend_url = os.environ.get('REACT_APP_BACKEND_URL', 'https://easy-billing-20.preview.emergentagent.com')
-                        if RAZORPAY_TEST_MODE:
-                            payment_link = f"{backend_url}/api/test-payment/{invoice.id}"
-                        else:
-                            payment_data = {
-                                "amount": int(invoice.total * 100),
-                                "currency": "INR",
-                                "description": f"Invoice {invoice.invoice_number}",
-                                "customer": {"name": invoice.customer_name}
-                            }
-                            payment_link_obj = razorpay_client.payment_link.create(payment_data)
-                            payment_link = payment_link_obj['short_url']
-                        
-                        await db.invoices.update_one(
-                            {"id": invoice.id},
-                            {"$set": {"payment_link": payment_link}}
-                        )
-                        invoice.payment_link = payment_link
+                        try:
+                            invoice.payment_link = await resources.payment_links.get_or_create(doc)
+                        except Exception as e:
+                            logger.error(f"Payment link creation failed: {str(e)}")
                         
                         # Delete pending invoice
                         await db.pending_invoices.delete_one({"id": pending['id']})
                         
                         # Send invoice
                         invoice_text = await generate_invoice_text(invoice)
-                        await send_whatsapp_message(From, invoice_text)
+                        await send_whatsapp_message(resources, From, invoice_text, user.id)
                         
                         return FastAPIResponse(content=str(MessagingResponse()), media_type="application/xml")
                     else:
                         response.message("Please provide prices for all items.")
                         return FastAPIResponse(content=str(response), media_type="application/xml")
                         
+                except ProviderOverloaded:
+                    raise
                 except Exception as e:
                     logger.error(f"Price extraction error: {str(e)}")
                     response.message("Couldn't understand the price. Please try again with just numbers.")
@@ -961,7 +1090,23 @@ Extract numbers mentioned as prices. Be lenient with format."""
                     response.message("✅ Language changed to English. I'll now respond in English.")
                 return FastAPIResponse(content=str(response), media_type="application/xml")
             
-            if "help" in body_lower:
+            if body_lower.strip().startswith("balance"):
+                # "balance <customer name>" shows the customer's latest ledger entries
+                customer_name = Body.strip()[len("balance"):].strip()
+                customer = await find_customer_by_name(db, user.id, customer_name) if customer_name else None
+                if not customer_name:
+                    response.message(messages['balance_usage'])
+                elif not customer:
+                    response.message(messages['customer_not_found'].format(name=customer_name))
+                else:
+                    ledger = await get_customer_ledger(db, customer['id'], user_id=user.id, limit=5, latest=True)
+                    msg = messages['balance_header'].format(name=customer['name'])
+                    for entry in ledger['entries']:
+                        date = as_datetime(entry['date']).strftime('%Y-%m-%d')
+                        msg += f"• {entry['invoice_number']} ({date}): ₹{entry['debit']:.2f} - ₹{entry['credit']:.2f} → ₹{entry['balance']:.2f}\n"
+                    msg += messages['balance_total'].format(balance=ledger['closing_balance'])
+                    response.message(msg)
+            elif "help" in body_lower:
                 response.message(messages['help'])
             elif "invoice" in body_lower or "list" in body_lower or "चालान" in body_lower:
                 # Get recent invoices
@@ -973,7 +1118,7 @@ Extract numbers mentioned as prices. Be lenient with format."""
                 if invoices:
                     msg = messages['recent_invoices']
                     for inv in invoices:
-                        date = datetime.fromisoformat(inv['date']).strftime('%Y-%m-%d')
+                        date = as_datetime(inv['date']).strftime('%Y-%m-%d')
                         msg += f"• {inv['invoice_number']} - ₹{inv['total']:.2f} ({date})\n"
                     response.message(msg)
                 else:
@@ -983,6 +1128,12 @@ Extract numbers mentioned as prices. Be lenient with format."""
         
         return FastAPIResponse(content=str(response), media_type="application/xml")
         
+    except ProviderOverloaded as e:
+        # Shed before anything was saved, so resending the message is safe
+        logger.warning(f"Webhook shed: {str(e)}")
+        response = MessagingResponse()
+        response.message(get_whatsapp_messages(user.language if user else 'en')['busy'])
+        return FastAPIResponse(content=str(response), media_type="application/xml")
     except Exception as e:
         logger.error(f"Webhook error: {str(e)}", exc_info=True)
         response = MessagingResponse()
@@ -992,56 +1143,202 @@ Extract numbers mentioned as prices. Be lenient with format."""
 
 # User routes
 @api_router.post("/users", response_model=User)
-async def create_user(user_input: UserCreate):
+async def create_user(user_input: UserCreate, db=Depends(get_db)):
     user = User(**user_input.model_dump())
     doc = user.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
     await db.users.insert_one(doc)
     return user
 
 @api_router.get("/users", response_model=List[User])
-async def get_users():
-    users = await db.users.find({}, {"_id": 0}).to_list(100)
-    for user in users:
-        if isinstance(user['created_at'], str):
-            user['created_at'] = datetime.fromisoformat(user['created_at'])
+async def get_users(
+    response: FastAPIResponse,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    include_total: bool = False,
+    db=Depends(get_db),
+):
+    projection, defaults = FAST_LIST_SHAPES["users"] if FAST_LIST_RESPONSES else (None, None)
+    users, next_cursor, total = await paginate(
+        db.users, {}, [("name", 1), ("id", 1)], cursor, limit, include_total, projection
+    )
+    if FAST_LIST_RESPONSES:
+        return fast_list_response(users, defaults, next_cursor, total)
+    set_page_headers(response, next_cursor, total)
     return users
 
 # Invoice routes
-@api_router.get("/invoices", response_model=List[Invoice])
-async def get_invoices(user_id: Optional[str] = None):
+@api_router.get("/invoices", response_model=None, responses=list_responses(Invoice))
+async def get_invoices(
+    response: FastAPIResponse,
+    user_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    include_total: bool = False,
+    fields: Optional[str] = None,
+    due: bool = False,
+    db=Depends(get_db),
+):
+    """Get invoices newest first, one page at a time (see X-Next-Cursor).
+
+    fields takes a view (summary, dues, full) or a comma separated field list.
+    due=true lists only invoices with an amount still due.
+    """
+    query = {"user_id": user_id} if user_id else {}
+    if due:
+        query["amount_due"] = {"$gt": 0}
+    sort = [("date", -1), ("id", -1)]
+    names = resolve_fields(Invoice, fields, LIST_VIEWS["invoices"])
+    if names:
+        invoices, next_cursor, total = await paginate(
+            db.invoices, query, sort, cursor, limit, include_total, sparse_projection(names, sort)
+        )
+        return sparse_list_response(invoices, sparse_adapter(Invoice, names), next_cursor, total)
+    projection, defaults = FAST_LIST_SHAPES["invoices"] if FAST_LIST_RESPONSES else (None, None)
+    invoices, next_cursor, total = await paginate(
+        db.invoices, query, sort, cursor, limit, include_total, projection
+    )
+    if FAST_LIST_RESPONSES:
+        return fast_list_response(invoices, defaults, next_cursor, total)
+    set_page_headers(response, next_cursor, total)
+    return [Invoice(**doc) for doc in invoices]
+
+# Registered before /invoices/{invoice_id} so "export" and "stats" are not taken as ids
+@api_router.get("/invoices/export")
+async def export_invoices(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    user_id: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    db=Depends(get_db),
+):
+    """Stream invoices as CSV (one row per line item) or NDJSON"""
     query = {"user_id": user_id} if user_id else {}
-    invoices = await db.invoices.find(query, {"_id": 0}).sort("date", -1).to_list(100)
-    for invoice in invoices:
-        if isinstance(invoice['date'], str):
-            invoice['date'] = datetime.fromisoformat(invoice['date'])
-        if isinstance(invoice['created_at'], str):
-            invoice['created_at'] = datetime.fromisoformat(invoice['created_at'])
-    return invoices
+    date_range = {}
+    if start:
+        date_range["$gte"] = _as_utc(start)
+    if end:
+        date_range["$lte"] = _as_utc(end)
+    if date_range:
+        query["date"] = date_range
+    
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')
+    return StreamingResponse(
+        stream_invoices(db, query, format),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f"attachment; filename=invoices_{stamp}.{format}"}
+    )
+
+@api_router.get("/invoices/stats")
+async def invoice_stats(user_id: Optional[str] = None, db=Depends(get_db)):
+    """Invoice count, this month's count, revenue and dues, so dashboards need not load every invoice"""
+    month_start = datetime.now(ANALYTICS_TZ).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    rows = await db.invoices.aggregate([
+        {"$match": {"user_id": user_id} if user_id else {}},
+        {"$group": {
+            "_id": None,
+            "total": {"$sum": 1},
+            "this_month": {"$sum": {"$cond": [{"$gte": ["$date", month_start]}, 1, 0]}},
+            "revenue": {"$sum": "$total"},
+            "due_count": {"$sum": {"$cond": [{"$gt": ["$amount_due", 0]}, 1, 0]}},
+            "total_due": {"$sum": {"$cond": [{"$gt": ["$amount_due", 0]}, "$amount_due", 0]}},
+        }},
+    ]).to_list(1)
+    stats = rows[0] if rows else {"total": 0, "this_month": 0, "revenue": 0, "due_count": 0, "total_due": 0}
+    stats.pop("_id", None)
+    return {**stats, "revenue": round(stats["revenue"], 2), "total_due": round(stats["total_due"], 2)}
 
 @api_router.get("/invoices/{invoice_id}", response_model=Invoice)
-async def get_invoice(invoice_id: str):
+async def get_invoice(invoice_id: str, db=Depends(get_db)):
     invoice_doc = await db.invoices.find_one({"id": invoice_id}, {"_id": 0})
     if not invoice_doc:
         raise HTTPException(status_code=404, detail="Invoice not found")
-    if isinstance(invoice_doc['date'], str):
-        invoice_doc['date'] = datetime.fromisoformat(invoice_doc['date'])
-    if isinstance(invoice_doc['created_at'], str):
-        invoice_doc['created_at'] = datetime.fromisoformat(invoice_doc['created_at'])
     return Invoice(**invoice_doc)
 
+# Batch invoice creation
+@api_router.post("/invoices/batch")
+async def create_invoices_batch(
+    invoices: List[InvoiceCreate],
+    notify: bool = False,
+    resources: Resources = Depends(get_resources),
+):
+    """Create up to MAX_INVOICE_BATCH_SIZE invoices with one insert.
+
+    Invoice numbers are reserved in one block per shopkeeper. Payment links,
+    PDFs and (with notify=true) customer notifications run in the background;
+    an invoice_followups marker per invoice lets another worker finish them if
+    this one stops first.
+    """
+    db = resources.db
+    if not invoices:
+        raise HTTPException(status_code=400, detail="No invoices in batch")
+    if len(invoices) > MAX_INVOICE_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_INVOICE_BATCH_SIZE} invoices per batch")
+
+    counts = defaultdict(int)
+    for invoice_input in invoices:
+        counts[invoice_input.user_id] += 1
+    numbers = {user_id: iter(await reserve_invoice_numbers(db, user_id, count)) for user_id, count in counts.items()}
+    customers = await match_batch_customers(db, invoices)
+
+    docs = []
+    for invoice_input in invoices:
+        items = [
+            InvoiceItem(name=item.name, quantity=item.quantity, price=item.price, total=line_total(item.quantity, item.price))
+            for item in invoice_input.items
+        ]
+        subtotal, tax, total = invoice_totals([item.total for item in items], invoice_input.tax_rate)
+        # Several customers with this name and no phone to choose between: leave the invoice unlinked
+        candidates = customers[(invoice_input.user_id, search_fields(invoice_input.customer_name or "")["name_key"])]
+        matches = phone_matches(candidates, invoice_input.customer_phone)
+        customer = matches[0] if len(matches) == 1 else {}
+        invoice = Invoice(
+            user_id=invoice_input.user_id,
+            customer_id=customer.get("id"),
+            invoice_number=next(numbers[invoice_input.user_id]),
+            customer_name=invoice_input.customer_name,
+            customer_phone=invoice_input.customer_phone or customer.get("phone", ""),
+            customer_email=customer.get("email", ""),
+            customer_address=customer.get("address", ""),
+            items=items,
+            subtotal=subtotal,
+            tax_rate=invoice_input.tax_rate,
+            tax=tax,
+            total=total,
+            amount_due=total,
+        )
+        docs.append(invoice.model_dump())
+
+    # insert_many adds _id to the documents it is given
+    await db.invoices.insert_many([dict(doc) for doc in docs], ordered=False)
+    await record_invoice_changes(db, [(None, doc) for doc in docs])
+    claimed_at = datetime.now(timezone.utc)
+    await db.invoice_followups.insert_many(
+        [{"invoice_id": doc["id"], "notify": notify, "claimed_at": claimed_at} for doc in docs], ordered=False
+    )
+    spawn_background(send_invoice_followups(resources, docs, notify))
+
+    return {
+        "success": True,
+        "created": len(docs),
+        "invoices": [
+            {"id": doc["id"], "invoice_number": doc["invoice_number"], "total": doc["total"]}
+            for doc in docs
+        ],
+    }
+
 # Delete Invoice
 @api_router.delete("/invoices/{invoice_id}")
-async def delete_invoice(invoice_id: str):
+async def delete_invoice(invoice_id: str, db=Depends(get_db)):
     """Delete an invoice"""
-    result = await db.invoices.delete_one({"id": invoice_id})
-    if result.deleted_count == 0:
+    invoice_doc = await db.invoices.find_one_and_delete({"id": invoice_id}, {"_id": 0})
+    if not invoice_doc:
         raise HTTPException(status_code=404, detail="Invoice not found")
+    await record_invoice_change(db, invoice_doc, None)
     return {"success": True, "message": "Invoice deleted successfully"}
 
 # Update Invoice (for marking as paid, etc.)
 @api_router.put("/invoices/{invoice_id}")
-async def update_invoice(invoice_id: str, request: Request):
+async def update_invoice(invoice_id: str, request: Request, db=Depends(get_db)):
     """Update invoice details (status, payment info, etc.)"""
     try:
         # Get update data from request body
@@ -1059,29 +1356,19 @@ async def update_invoice(invoice_id: str, request: Request):
             update_data['amount_due'] = 0
             update_data['status'] = 'paid'
         
-        # Update in database
-        result = await db.invoices.update_one(
+        # Update in database, keeping the exact previous version for the customer delta
+        before = await db.invoices.find_one_and_update(
             {"id": invoice_id},
-            {"$set": update_data}
+            {"$set": update_data},
+            projection={"_id": 0},
+            return_document=ReturnDocument.BEFORE
         )
         
-        if result.modified_count == 0 and result.matched_count == 0:
+        if not before:
             raise HTTPException(status_code=404, detail="Invoice not found")
         
-        # Update customer's total_due if customer_id exists
-        if invoice_doc.get('customer_id') and 'amount_due' in update_data:
-            # Recalculate customer's total due from all invoices
-            customer_invoices = await db.invoices.find(
-                {"customer_id": invoice_doc['customer_id']},
-                {"_id": 0}
-            ).to_list(1000)
-            
-            total_customer_due = sum(inv.get('amount_due', 0) for inv in customer_invoices)
-            
-            await db.customers.update_one(
-                {"id": invoice_doc['customer_id']},
-                {"$set": {"total_due": total_customer_due}}
-            )
+        # Apply the change in amounts to customer totals and analytics rollups
+        await record_invoice_change(db, before, {**before, **update_data})
         
         return {"success": True, "message": "Invoice updated successfully"}
     
@@ -1093,7 +1380,7 @@ async def update_invoice(invoice_id: str, request: Request):
 
 # PDF Invoice Download
 @api_router.get("/invoices/{invoice_id}/pdf")
-async def download_invoice_pdf(invoice_id: str):
+async def download_invoice_pdf(invoice_id: str, db=Depends(get_db)):
     """Generate and download PDF invoice"""
     try:
         # Get invoice from database
@@ -1101,7 +1388,8 @@ async def download_invoice_pdf(invoice_id: str):
         if not invoice_doc:
             raise HTTPException(status_code=404, detail="Invoice not found")
         
-        # Generate PDF
+        # Generate PDF (reportlab is imported on first use)
+        from pdf_generator import generate_invoice_pdf
         pdf_buffer = generate_invoice_pdf(invoice_doc)
         
         # Return as downloadable file
@@ -1118,46 +1406,23 @@ async def download_invoice_pdf(invoice_id: str):
 
 # Create Payment Link for Invoice
 @api_router.post("/invoices/{invoice_id}/create-payment")
-async def create_payment_link(invoice_id: str):
+async def create_payment_link(invoice_id: str, resources: Resources = Depends(get_resources)):
     """Create Razorpay payment link for invoice"""
     try:
         # Get invoice
-        invoice_doc = await db.invoices.find_one({"id": invoice_id}, {"_id": 0})
+        invoice_doc = await resources.db.invoices.find_one({"id": invoice_id}, {"_id": 0})
         if not invoice_doc:
             raise HTTPException(status_code=404, detail="Invoice not found")
+        if invoice_doc.get('status') == 'paid':
+            raise HTTPException(status_code=409, detail="Invoice is already paid")
         
-        backend_url = os.environ.get('REACT_APP_BACKEND_URL', 'https://easy-billing-20.preview.emergentagent.com')
-        
-        if RAZORPAY_TEST_MODE:
-            # In test mode, create our own test payment page
-            payment_link = f"{backend_url}/api/test-payment/{invoice_id}"
-            logger.info(f"Test mode: Generated test payment page {payment_link}")
-        else:
-            # Create actual Razorpay payment link
-            payment_data = {
-                "amount": int(invoice_doc['total'] * 100),  # Amount in paise
-                "currency": "INR",
-                "description": f"Invoice {invoice_doc['invoice_number']}",
-                "customer": {
-                    "name": invoice_doc.get('customer_name', 'Customer'),
-                    "contact": invoice_doc.get('customer_phone', ''),
-                },
-                "notify": {
-                    "sms": True,
-                    "email": False
-                },
-                "reminder_enable": True,
-                "callback_url": f"{backend_url}/api/payment-callback",
-                "callback_method": "get"
-            }
-            
-            payment_link_obj = razorpay_client.payment_link.create(payment_data)
-            payment_link = payment_link_obj['short_url']
-        
-        # Update invoice with payment link
-        await db.invoices.update_one(
-            {"id": invoice_id},
-            {"$set": {"payment_link": payment_link}}
+        # Returns the stored link when one already exists for this invoice and amount
+        payment_link = await resources.payment_links.get_or_create(
+            invoice_doc,
+            notify={"sms": True, "email": False},
+            reminder_enable=True,
+            callback_url=f"{BACKEND_URL}/api/payment-callback",
+            callback_method="get",
         )
         
         return {
@@ -1167,6 +1432,10 @@ async def create_payment_link(invoice_id: str):
             "test_mode": RAZORPAY_TEST_MODE
         }
     
+    except HTTPException:
+        raise
+    except ProviderOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
     except Exception as e:
         logger.error(f"Payment link creation error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to create payment link: {str(e)}")
@@ -1178,7 +1447,8 @@ async def payment_callback(
     razorpay_payment_link_id: str,
     razorpay_payment_link_reference_id: str,
     razorpay_payment_link_status: str,
-    razorpay_signature: str
+    razorpay_signature: str,
+    db=Depends(get_db),
 ):
     """Handle payment callback from Razorpay"""
     try:
@@ -1186,13 +1456,7 @@ async def payment_callback(
         invoice_id = razorpay_payment_link_reference_id
         
         if razorpay_payment_link_status == "paid":
-            await db.invoices.update_one(
-                {"id": invoice_id},
-                {"$set": {
-                    "status": "paid",
-                    "payment_id": razorpay_payment_id
-                }}
-            )
+            await mark_invoice_paid(db, invoice_id, razorpay_payment_id)
             logger.info(f"Invoice {invoice_id} marked as paid")
         
         return {"status": "success", "message": "Payment processed"}
@@ -1201,9 +1465,23 @@ async def payment_callback(
         logger.error(f"Payment callback error: {str(e)}")
         return {"status": "error", "message": str(e)}
 
+# Reconcile payments that never reached the callback
+@api_router.post("/payments/reconcile")
+async def reconcile_payments_route(hours: float = 24, db=Depends(get_db)):
+    """Match Razorpay payments from the last `hours` to invoices in bulk"""
+    if RAZORPAY_TEST_MODE:
+        return {"success": False, "message": "Reconciliation needs live Razorpay keys", "test_mode": True}
+    try:
+        until = int(datetime.now(timezone.utc).timestamp())
+        summary = await reconcile_payments(db, get_razorpay_client(), since=until - int(hours * 3600), until=until)
+        return {"success": True, **summary}
+    except Exception as e:
+        logger.error(f"Payment reconciliation error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to reconcile payments: {str(e)}")
+
 # Test Payment Page (for test mode)
 @api_router.get("/test-payment/{invoice_id}")
-async def test_payment_page(invoice_id: str):
+async def test_payment_page(invoice_id: str, db=Depends(get_db)):
     """Test payment page for demo/testing"""
     from fastapi.responses import HTMLResponse
     
@@ -1429,55 +1707,95 @@ async def test_payment_page(invoice_id: str):
 
 # Test Payment Success Handler
 @api_router.post("/test-payment-success/{invoice_id}")
-async def test_payment_success(invoice_id: str):
+async def test_payment_success(invoice_id: str, db=Depends(get_db)):
     """Handle test payment success"""
-    await db.invoices.update_one(
-        {"id": invoice_id},
-        {"$set": {
-            "status": "paid",
-            "payment_id": f"test_payment_{invoice_id[:8]}"
-        }}
-    )
+    await mark_invoice_paid(db, invoice_id, f"test_payment_{invoice_id[:8]}")
     return {"status": "success", "message": "Test payment completed"}
 
 # Customer Management CRUD
 @api_router.post("/customers", response_model=Customer)
-async def create_customer(customer_input: CustomerCreate):
+async def create_customer(customer_input: CustomerCreate, db=Depends(get_db)):
     """Create a new customer"""
     customer = Customer(**customer_input.model_dump())
     doc = customer.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    if doc.get('last_purchase'):
-        doc['last_purchase'] = doc['last_purchase'].isoformat()
+    doc.update(search_fields(customer.name, customer.phone))
     await db.customers.insert_one(doc)
+    invalidate_catalog(customer.user_id)
     return customer
 
-@api_router.get("/customers", response_model=List[Customer])
-async def get_customers(user_id: Optional[str] = None):
-    """Get all customers, optionally filtered by user"""
+# Bulk import from CSV/XLSX (columns named like CustomerCreate fields)
+@api_router.post("/customers/import")
+async def import_customers(
+    user_id: str = Form(...),
+    file: UploadFile = File(...),
+    batch_size: int = Query(IMPORT_BATCH_SIZE, ge=1, le=MAX_IMPORT_BATCH_SIZE),
+    db=Depends(get_db),
+):
+    """Create or update customers by name; returns a per-row error report"""
+    return await run_bulk_import(db, db.customers, CustomerCreate, Customer, user_id, file, batch_size)
+
+@api_router.get("/customers", response_model=None, responses=list_responses(Customer))
+async def get_customers(
+    response: FastAPIResponse,
+    user_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    include_total: bool = False,
+    fields: Optional[str] = None,
+    db=Depends(get_db),
+):
+    """Get customers by name, optionally filtered by user, one page at a time"""
     query = {"user_id": user_id} if user_id else {}
-    customers = await db.customers.find(query, {"_id": 0}).sort("name", 1).to_list(1000)
-    for customer in customers:
-        if isinstance(customer['created_at'], str):
-            customer['created_at'] = datetime.fromisoformat(customer['created_at'])
-        if customer.get('last_purchase') and isinstance(customer['last_purchase'], str):
-            customer['last_purchase'] = datetime.fromisoformat(customer['last_purchase'])
-    return customers
+    sort = [("name", 1), ("id", 1)]
+    names = resolve_fields(Customer, fields, LIST_VIEWS["customers"])
+    if names:
+        customers, next_cursor, total = await paginate(
+            db.customers, query, sort, cursor, limit, include_total, sparse_projection(names, sort)
+        )
+        return sparse_list_response(customers, sparse_adapter(Customer, names), next_cursor, total)
+    projection, defaults = FAST_LIST_SHAPES["customers"] if FAST_LIST_RESPONSES else (None, None)
+    customers, next_cursor, total = await paginate(
+        db.customers, query, sort, cursor, limit, include_total, projection
+    )
+    if FAST_LIST_RESPONSES:
+        return fast_list_response(customers, defaults, next_cursor, total)
+    set_page_headers(response, next_cursor, total)
+    return [Customer(**doc) for doc in customers]
 
 @api_router.get("/customers/{customer_id}", response_model=Customer)
-async def get_customer(customer_id: str):
+async def get_customer(customer_id: str, db=Depends(get_db)):
     """Get a specific customer by ID"""
     customer_doc = await db.customers.find_one({"id": customer_id}, {"_id": 0})
     if not customer_doc:
         raise HTTPException(status_code=404, detail="Customer not found")
-    if isinstance(customer_doc['created_at'], str):
-        customer_doc['created_at'] = datetime.fromisoformat(customer_doc['created_at'])
-    if customer_doc.get('last_purchase') and isinstance(customer_doc['last_purchase'], str):
-        customer_doc['last_purchase'] = datetime.fromisoformat(customer_doc['last_purchase'])
     return Customer(**customer_doc)
 
+@api_router.get("/customers/{customer_id}/ledger", response_model=CustomerLedger)
+async def get_customer_ledger_route(
+    customer_id: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    user_id: Optional[str] = None,
+    db=Depends(get_db),
+):
+    """Customer statement: invoices with a running balance, oldest first.
+
+    user_id limits it to one shopkeeper's invoices, for customers shared
+    between shops.
+    """
+    customer_doc = await db.customers.find_one({"id": customer_id}, {"_id": 0, "name": 1})
+    if not customer_doc:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    ledger = await get_customer_ledger(
+        db, customer_id, user_id=user_id, start=_as_utc(start), end=_as_utc(end), cursor=cursor, limit=limit
+    )
+    ledger['customer_name'] = customer_doc['name']
+    return ledger
+
 @api_router.put("/customers/{customer_id}", response_model=Customer)
-async def update_customer(customer_id: str, customer_input: CustomerCreate):
+async def update_customer(customer_id: str, customer_input: CustomerCreate, db=Depends(get_db)):
     """Update a customer"""
     customer_doc = await db.customers.find_one({"id": customer_id}, {"_id": 0})
     if not customer_doc:
@@ -1485,74 +1803,97 @@ async def update_customer(customer_id: str, customer_input: CustomerCreate):
     
     # Update customer
     update_data = customer_input.model_dump()
+    update_data.update(search_fields(customer_input.name, customer_input.phone))
     await db.customers.update_one(
         {"id": customer_id},
         {"$set": update_data}
     )
+    invalidate_catalog(customer_doc['user_id'])
+    invalidate_catalog(update_data['user_id'])
     
     # Return updated customer
     updated_doc = await db.customers.find_one({"id": customer_id}, {"_id": 0})
-    if isinstance(updated_doc['created_at'], str):
-        updated_doc['created_at'] = datetime.fromisoformat(updated_doc['created_at'])
-    if updated_doc.get('last_purchase') and isinstance(updated_doc['last_purchase'], str):
-        updated_doc['last_purchase'] = datetime.fromisoformat(updated_doc['last_purchase'])
     return Customer(**updated_doc)
 
 @api_router.delete("/customers/{customer_id}")
-async def delete_customer(customer_id: str):
+async def delete_customer(customer_id: str, db=Depends(get_db)):
     """Delete a customer"""
-    result = await db.customers.delete_one({"id": customer_id})
-    if result.deleted_count == 0:
+    customer_doc = await db.customers.find_one_and_delete({"id": customer_id}, {"_id": 0, "user_id": 1})
+    if not customer_doc:
         raise HTTPException(status_code=404, detail="Customer not found")
+    invalidate_catalog(customer_doc['user_id'])
     return {"success": True, "message": "Customer deleted"}
 
 @api_router.get("/customers/search/{query}")
-async def search_customers(query: str, user_id: Optional[str] = None):
-    """Search customers by name"""
-    search_filter = {"name": {"$regex": query, "$options": "i"}}
-    if user_id:
-        search_filter["user_id"] = user_id
-    
-    customers = await db.customers.find(search_filter, {"_id": 0}).to_list(100)
-    for customer in customers:
-        if isinstance(customer['created_at'], str):
-            customer['created_at'] = datetime.fromisoformat(customer['created_at'])
-        if customer.get('last_purchase') and isinstance(customer['last_purchase'], str):
-            customer['last_purchase'] = datetime.fromisoformat(customer['last_purchase'])
-    return customers
+async def search_customers(
+    query: str,
+    user_id: str,
+    limit: int = Query(SEARCH_DEFAULT_LIMIT, ge=1, le=SEARCH_MAX_LIMIT),
+    db=Depends(get_db),
+):
+    """Typeahead search over one shopkeeper's customers by name or phone"""
+    return await typeahead(db.customers, user_id, query, limit)
 
 # Product Catalog CRUD
 @api_router.post("/products", response_model=Product)
-async def create_product(product_input: ProductCreate):
+async def create_product(product_input: ProductCreate, db=Depends(get_db)):
     """Create a new product in catalog"""
     product = Product(**product_input.model_dump())
     doc = product.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
+    doc.update(search_fields(product.name))
     await db.products.insert_one(doc)
+    invalidate_catalog(product.user_id)
     return product
 
-@api_router.get("/products", response_model=List[Product])
-async def get_products(user_id: Optional[str] = None):
-    """Get all products, optionally filtered by user"""
+# Bulk import from CSV/XLSX (columns: name, price, description)
+@api_router.post("/products/import")
+async def import_products(
+    user_id: str = Form(...),
+    file: UploadFile = File(...),
+    batch_size: int = Query(IMPORT_BATCH_SIZE, ge=1, le=MAX_IMPORT_BATCH_SIZE),
+    db=Depends(get_db),
+):
+    """Create or update catalog products by name; returns a per-row error report"""
+    return await run_bulk_import(db, db.products, ProductCreate, Product, user_id, file, batch_size)
+
+@api_router.get("/products", response_model=None, responses=list_responses(Product))
+async def get_products(
+    response: FastAPIResponse,
+    user_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    include_total: bool = False,
+    fields: Optional[str] = None,
+    db=Depends(get_db),
+):
+    """Get products by name, optionally filtered by user, one page at a time"""
     query = {"user_id": user_id} if user_id else {}
-    products = await db.products.find(query, {"_id": 0}).to_list(1000)
-    for product in products:
-        if isinstance(product['created_at'], str):
-            product['created_at'] = datetime.fromisoformat(product['created_at'])
-    return products
+    sort = [("name", 1), ("id", 1)]
+    names = resolve_fields(Product, fields, LIST_VIEWS["products"])
+    if names:
+        products, next_cursor, total = await paginate(
+            db.products, query, sort, cursor, limit, include_total, sparse_projection(names, sort)
+        )
+        return sparse_list_response(products, sparse_adapter(Product, names), next_cursor, total)
+    projection, defaults = FAST_LIST_SHAPES["products"] if FAST_LIST_RESPONSES else (None, None)
+    products, next_cursor, total = await paginate(
+        db.products, query, sort, cursor, limit, include_total, projection
+    )
+    if FAST_LIST_RESPONSES:
+        return fast_list_response(products, defaults, next_cursor, total)
+    set_page_headers(response, next_cursor, total)
+    return [Product(**doc) for doc in products]
 
 @api_router.get("/products/{product_id}", response_model=Product)
-async def get_product(product_id: str):
+async def get_product(product_id: str, db=Depends(get_db)):
     """Get a specific product by ID"""
     product_doc = await db.products.find_one({"id": product_id}, {"_id": 0})
     if not product_doc:
         raise HTTPException(status_code=404, detail="Product not found")
-    if isinstance(product_doc['created_at'], str):
-        product_doc['created_at'] = datetime.fromisoformat(product_doc['created_at'])
     return Product(**product_doc)
 
 @api_router.put("/products/{product_id}", response_model=Product)
-async def update_product(product_id: str, product_input: ProductCreate):
+async def update_product(product_id: str, product_input: ProductCreate, db=Depends(get_db)):
     """Update a product"""
     product_doc = await db.products.find_one({"id": product_id}, {"_id": 0})
     if not product_doc:
@@ -1560,50 +1901,197 @@ async def update_product(product_id: str, product_input: ProductCreate):
     
     # Update product
     update_data = product_input.model_dump()
+    update_data.update(search_fields(product_input.name))
     await db.products.update_one(
         {"id": product_id},
         {"$set": update_data}
     )
+    invalidate_catalog(product_doc['user_id'])
+    invalidate_catalog(update_data['user_id'])
     
     # Return updated product
     updated_doc = await db.products.find_one({"id": product_id}, {"_id": 0})
-    if isinstance(updated_doc['created_at'], str):
-        updated_doc['created_at'] = datetime.fromisoformat(updated_doc['created_at'])
     return Product(**updated_doc)
 
 @api_router.delete("/products/{product_id}")
-async def delete_product(product_id: str):
+async def delete_product(product_id: str, db=Depends(get_db)):
     """Delete a product"""
-    result = await db.products.delete_one({"id": product_id})
-    if result.deleted_count == 0:
+    product_doc = await db.products.find_one_and_delete({"id": product_id}, {"_id": 0, "user_id": 1})
+    if not product_doc:
         raise HTTPException(status_code=404, detail="Product not found")
+    invalidate_catalog(product_doc['user_id'])
     return {"success": True, "message": "Product deleted"}
 
 # Search products by name
 @api_router.get("/products/search/{query}")
-async def search_products(query: str, user_id: Optional[str] = None):
-    """Search products by name"""
-    search_filter = {"name": {"$regex": query, "$options": "i"}}
-    if user_id:
-        search_filter["user_id"] = user_id
-    
-    products = await db.products.find(search_filter, {"_id": 0}).to_list(100)
-    for product in products:
-        if isinstance(product['created_at'], str):
-            product['created_at'] = datetime.fromisoformat(product['created_at'])
-    return products
-
-# Include the router in the main app
-app.include_router(api_router)
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+async def search_products(
+    query: str,
+    user_id: str,
+    limit: int = Query(SEARCH_DEFAULT_LIMIT, ge=1, le=SEARCH_MAX_LIMIT),
+    db=Depends(get_db),
+):
+    """Typeahead search over one shopkeeper's products by name"""
+    return await typeahead(db.products, user_id, query, limit)
+
+# Analytics dashboard served from the incremental rollups
+@api_router.get("/analytics/summary")
+async def analytics_summary(
+    user_id: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    granularity: str = Query("day", pattern="^(day|month)$"),
+    top: int = Query(5, ge=1, le=50),
+    db=Depends(get_db),
+):
+    """Revenue, tax, invoice count, dues and top products per day or month"""
+    return await get_summary(db, user_id, _as_utc(start), _as_utc(end), granularity, top)
+
+@api_router.post("/analytics/rebuild")
+async def rebuild_analytics(user_id: Optional[str] = None, db=Depends(get_db)):
+    """Regenerate the rollups from raw invoices (same as `python -m analytics`)"""
+    try:
+        summary = await rebuild_rollups(db, user_id)
+        return {"success": True, **summary}
+    except Exception as e:
+        logger.error(f"Analytics rebuild error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to rebuild analytics: {str(e)}")
+
+# Monthly GST report (snapshotted by the period-close job)
+@api_router.get("/reports/gst/{period}")
+async def gst_report(
+    period: str,
+    user_id: str,
+    format: str = Query("json", pattern="^(json|csv|pdf)$"),
+    db=Depends(get_db),
+):
+    """GST taxable value and tax by rate and customer for a YYYY-MM period"""
+    report = await get_gst_report(db, user_id, period)
+    filename = f"GST_{period}"
+    if format == "csv":
+        return FastAPIResponse(
+            content=report_csv(report),
+            media_type="text/csv",
+            headers={"Content-Disposition": f"attachment; filename={filename}.csv"}
+        )
+    if format == "pdf":
+        from pdf_generator import generate_gst_report_pdf
+        pdf_buffer = await asyncio.to_thread(generate_gst_report_pdf, report)
+        return StreamingResponse(
+            pdf_buffer,
+            media_type="application/pdf",
+            headers={"Content-Disposition": f"attachment; filename={filename}.pdf"}
+        )
+    return report
+
+# Periodically repair any drift in customer totals (0 disables)
+CUSTOMER_STATS_RECONCILE_INTERVAL = float(os.environ.get('CUSTOMER_STATS_RECONCILE_INTERVAL', 3600))
+# Convert legacy ISO-string dates before serving, once (same as `python -m migrate_dates`)
+MIGRATE_DATES_ON_STARTUP = os.environ.get('MIGRATE_DATES_ON_STARTUP', 'True').lower() == 'true'
+# Derive typeahead fields for customers/products saved before search existed
+SEARCH_BACKFILL_ON_STARTUP = os.environ.get('SEARCH_BACKFILL_ON_STARTUP', 'True').lower() == 'true'
+# Snapshot last month's GST reports this often (0 disables; same as `python -m gst_reports`)
+GST_PERIOD_CLOSE_INTERVAL = float(os.environ.get('GST_PERIOD_CLOSE_INTERVAL', 6 * 3600))
+# Look for batch follow-ups left behind by a stopped worker this often (0 disables)
+INVOICE_FOLLOWUP_RESUME_INTERVAL = float(os.environ.get('INVOICE_FOLLOWUP_RESUME_INTERVAL', 600))
+# How often to sample event-loop lag for /metrics (0 disables)
+EVENT_LOOP_LAG_INTERVAL = float(os.environ.get('EVENT_LOOP_LAG_INTERVAL', 0.5))
+background_tasks = set()
+
+def spawn_background(coroutine):
+    """Run a coroutine after the response, keeping a reference until it finishes"""
+    task = asyncio.create_task(coroutine)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+async def create_indexes(db):
+    """Ensure every index exists; the requests are independent, so send them together"""
+    await asyncio.gather(
+        db.invoices.create_index(LEDGER_INDEX),
+        # Keyset pagination indexes for the list endpoints
+        db.invoices.create_index([("user_id", 1), ("date", -1), ("id", -1)]),
+        db.invoices.create_index([("date", -1), ("id", -1)]),
+        *(
+            collection.create_index(keys)
+            for collection in (db.customers, db.products)
+            for keys in ([("user_id", 1), ("name", 1), ("id", 1)], [("name", 1), ("id", 1)])
+        ),
+        db.users.create_index([("name", 1), ("id", 1)]),
+        create_rollup_indexes(db),
+        create_gst_report_indexes(db),
+        create_search_indexes(db),
+        create_invoice_counter_indexes(db),
+        db.invoice_followups.create_index("invoice_id"),
+        db.invoice_followups.create_index("claimed_at"),
+        db.invoice_followups.create_index("claim"),
+    )
+
+async def start_background_jobs(resources: Resources) -> Optional[LoopBlockDetector]:
+    """Create indexes and start the periodic jobs; returns the loop-block detector, if enabled"""
+    db = resources.db
+    await create_indexes(db)
+    # Date filters and sorts only see native datetimes, so this finishes before requests are served
+    if MIGRATE_DATES_ON_STARTUP:
+        await ensure_dates_migrated(db)
+    elif not await dates_migrated(db):
+        logger.warning("Legacy string dates have not been migrated; run `python -m migrate_dates`")
+    jobs = []
+    if CUSTOMER_STATS_RECONCILE_INTERVAL > 0:
+        jobs.append(run_periodic_reconciler(db, CUSTOMER_STATS_RECONCILE_INTERVAL))
+    if SEARCH_BACKFILL_ON_STARTUP:
+        jobs.append(backfill_search_fields(db))
+    if GST_PERIOD_CLOSE_INTERVAL > 0:
+        jobs.append(run_period_close(db, GST_PERIOD_CLOSE_INTERVAL))
+    if INVOICE_FOLLOWUP_RESUME_INTERVAL > 0:
+        jobs.append(run_followup_resumer(resources, INVOICE_FOLLOWUP_RESUME_INTERVAL))
+    if EVENT_LOOP_LAG_INTERVAL > 0:
+        jobs.append(monitor_event_loop_lag(EVENT_LOOP_LAG_INTERVAL))
+    if AUDIO_PREPROCESSING_ENABLED:
+        jobs.append(start_pool())
+    jobs.append(resources.transcriber.start())
+    for job in jobs:
+        spawn_background(job)
+    # Log the stack of anything that blocks the event loop longer than this (0 disables)
+    if LOOP_BLOCK_THRESHOLD_MS <= 0:
+        return None
+    loop_block_detector = LoopBlockDetector(LOOP_BLOCK_THRESHOLD_MS / 1000)
+    loop_block_detector.start()
+    return loop_block_detector
+
+async def shutdown_background_jobs(loop_block_detector: Optional[LoopBlockDetector]):
+    if loop_block_detector:
+        loop_block_detector.stop()
+    for task in list(background_tasks):
+        task.cancel()
+    shutdown_pool()
+
+# Prometheus scrape endpoint, served outside /api
+async def metrics():
+    content, media_type = render_metrics()
+    return FastAPIResponse(content=content, media_type=media_type)
+
+def create_app(settings: Optional[Settings] = None) -> FastAPI:
+    """Build the app; its clients open in the lifespan, once per worker process.
+
+    Run several workers with `uvicorn server:create_app --factory --workers N`.
+    """
+    app = FastAPI(title="VoiceBill API", lifespan=lifespan)
+    app.state.settings = settings or Settings.from_env()
+    app.include_router(api_router)
+    app.add_api_route("/metrics", metrics, methods=["GET"], include_in_schema=False)
+
+    # Off unless PROFILING_ENABLED; registered first so it sits closest to the handler
+    app.middleware("http")(profiling_middleware)
+    app.middleware("http")(metrics_middleware)
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_credentials=True,
+        allow_origins=app.state.settings.cors_origins,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["X-Next-Cursor", "X-Total-Count"],
+    )
+    return app
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+app = create_app()
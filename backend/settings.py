@@ -0,0 +1,51 @@
+"""Per-process settings for create_app().
+
+Every worker process opens its own Mongo connection pool, so the most
+connections one host can hold is workers × MONGO_MAX_POOL_SIZE. Size the pool
+with that in mind when running several workers:
+
+    uvicorn server:create_app --factory --workers 4
+
+Set PROMETHEUS_MULTIPROC_DIR as well, or /metrics only reports the worker
+that answers the scrape (see metrics).
+"""
+import os
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+
+def _optional_int(name: str) -> Optional[int]:
+    value = os.environ.get(name)
+    return int(value) if value else None
+
+
+class Settings(BaseModel):
+    mongo_url: str
+    db_name: str
+    # pymongo's defaults: 100 connections, none kept warm, wait forever for a free one
+    mongo_max_pool_size: int = 100
+    mongo_min_pool_size: int = 0
+    mongo_wait_queue_timeout_ms: Optional[int] = None
+    cors_origins: List[str] = ["*"]
+    # Speech-to-text engine, see transcription.TRANSCRIPTION_BACKENDS
+    transcription_backend: str = "assemblyai"
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        return cls(
+            mongo_url=os.environ['MONGO_URL'],
+            db_name=os.environ['DB_NAME'],
+            mongo_max_pool_size=int(os.environ.get('MONGO_MAX_POOL_SIZE', 100)),
+            mongo_min_pool_size=int(os.environ.get('MONGO_MIN_POOL_SIZE', 0)),
+            mongo_wait_queue_timeout_ms=_optional_int('MONGO_WAIT_QUEUE_TIMEOUT_MS'),
+            cors_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
+            transcription_backend=os.environ.get('TRANSCRIPTION_BACKEND', 'assemblyai'),
+        )
+
+    def mongo_client_options(self) -> dict:
+        """Keyword arguments for AsyncIOMotorClient"""
+        options = {"maxPoolSize": self.mongo_max_pool_size, "minPoolSize": self.mongo_min_pool_size}
+        if self.mongo_wait_queue_timeout_ms is not None:
+            options["waitQueueTimeoutMS"] = self.mongo_wait_queue_timeout_ms
+        return options
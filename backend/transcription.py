@@ -0,0 +1,229 @@
+"""Speech-to-text backends for voice notes, chosen with TRANSCRIPTION_BACKEND.
+
+assemblyai  AssemblyAI's hosted API (the default)
+whisper     faster-whisper on the local CPU. Handles Hindi, English and
+            Hinglish, with no network round trip.
+
+A backend's transcribe() takes the audio bytes and returns the text, raising
+on failure. Backends that hold models or workers warm them in start(), which
+runs in the background at startup, and release them in aclose().
+
+Long notes arrive in chunks (see audio_preprocessing). transcribe_in_order()
+transcribes every chunk at once and yields the texts in order, each as soon
+as it and the chunks before it are done. Words a chunk repeats from the
+overlap with the previous chunk are dropped.
+"""
+import asyncio
+import io
+import logging
+import multiprocessing
+import os
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# AssemblyAI API Key for speech-to-text transcription
+ASSEMBLYAI_API_KEY = os.environ.get('ASSEMBLYAI_API_KEY')
+
+# faster-whisper: model name (tiny, base, small, medium, large-v3) or a local CTranslate2 directory
+WHISPER_MODEL = os.environ.get('WHISPER_MODEL', 'small')
+WHISPER_COMPUTE_TYPE = os.environ.get('WHISPER_COMPUTE_TYPE', 'int8')
+# Worker processes, each with its own copy of the model, and CPU threads per worker
+WHISPER_WORKERS = int(os.environ.get('WHISPER_WORKERS', 1))
+WHISPER_CPU_THREADS = int(os.environ.get('WHISPER_CPU_THREADS', max(1, (os.cpu_count() or 1) // WHISPER_WORKERS)))
+# Unset detects the language per note; "hi" or "en" pins it
+WHISPER_LANGUAGE = os.environ.get('WHISPER_LANGUAGE') or None
+WHISPER_BEAM_SIZE = int(os.environ.get('WHISPER_BEAM_SIZE', 5))
+# Primes the decoder with the shape of a sale, in English and Hinglish
+WHISPER_INITIAL_PROMPT = os.environ.get(
+    'WHISPER_INITIAL_PROMPT', "Sold 2 kg rice and 3 sugar to Ramesh. Suresh ko do packet atta becha."
+)
+# Most words looked at when matching a chunk's start against the previous chunk's end
+OVERLAP_MAX_WORDS = int(os.environ.get('TRANSCRIPTION_OVERLAP_MAX_WORDS', 12))
+
+
+class TranscriptionBackend:
+    """Turns voice-note audio into text"""
+
+    name = "base"
+
+    async def start(self):
+        """Load models or start workers ahead of the first voice note"""
+
+    async def transcribe(self, audio: bytes) -> str:
+        raise NotImplementedError
+
+    async def aclose(self):
+        pass
+
+
+class AssemblyAIBackend(TranscriptionBackend):
+    name = "assemblyai"
+
+    def __init__(self, api_key: Optional[str] = ASSEMBLYAI_API_KEY):
+        self.api_key = api_key
+
+    def _transcribe(self, audio: bytes) -> str:
+        import assemblyai as aai
+
+        aai.settings.api_key = self.api_key
+        transcript = aai.Transcriber().transcribe(io.BytesIO(audio))
+        if transcript.status == aai.TranscriptStatus.error:
+            raise RuntimeError(f"AssemblyAI transcription error: {transcript.error}")
+        return transcript.text or ""
+
+    async def transcribe(self, audio: bytes) -> str:
+        # The SDK uploads and then polls until the transcript is ready
+        return await asyncio.to_thread(self._transcribe, audio)
+
+
+# Set in each whisper worker process by its initializer
+_whisper_model = None
+
+
+def _load_whisper_model(model: str, compute_type: str, cpu_threads: int):
+    global _whisper_model
+    from faster_whisper import WhisperModel
+    _whisper_model = WhisperModel(model, device="cpu", compute_type=compute_type, cpu_threads=cpu_threads)
+
+
+def _whisper_ready() -> bool:
+    return _whisper_model is not None
+
+
+def _whisper_transcribe(audio: bytes, language: Optional[str], beam_size: int, initial_prompt: str) -> str:
+    segments, _ = _whisper_model.transcribe(
+        io.BytesIO(audio),
+        language=language,
+        multilingual=language is None,
+        beam_size=beam_size,
+        initial_prompt=initial_prompt or None,
+        condition_on_previous_text=False,
+    )
+    return " ".join(segment.text.strip() for segment in segments).strip()
+
+
+class WhisperBackend(TranscriptionBackend):
+    """faster-whisper in a process pool; every worker loads the model once and keeps it"""
+
+    name = "whisper"
+
+    def __init__(
+        self,
+        model: str = WHISPER_MODEL,
+        workers: int = WHISPER_WORKERS,
+        compute_type: str = WHISPER_COMPUTE_TYPE,
+        cpu_threads: int = WHISPER_CPU_THREADS,
+        language: Optional[str] = WHISPER_LANGUAGE,
+        beam_size: int = WHISPER_BEAM_SIZE,
+        initial_prompt: str = WHISPER_INITIAL_PROMPT,
+    ):
+        self.model = model
+        self.workers = workers
+        self.compute_type = compute_type
+        self.cpu_threads = cpu_threads
+        self.language = language
+        self.beam_size = beam_size
+        self.initial_prompt = initial_prompt
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                self.workers,
+                # spawn, not fork: the server process already runs driver and loop threads
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_load_whisper_model,
+                initargs=(self.model, self.compute_type, self.cpu_threads),
+            )
+        return self._pool
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        try:
+            await asyncio.gather(*(loop.run_in_executor(pool, _whisper_ready) for _ in range(self.workers)))
+        except Exception as e:
+            logger.error(f"Whisper model {self.model} failed to load: {str(e)}")
+            await self.aclose()
+            return
+        logger.info(f"Whisper model {self.model} loaded in {self.workers} worker(s)")
+
+    async def transcribe(self, audio: bytes) -> str:
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._get_pool(), _whisper_transcribe, audio, self.language, self.beam_size, self.initial_prompt
+            )
+        except BrokenProcessPool:
+            # A worker died (or the model failed to load); start fresh on the next note
+            await self.aclose()
+            raise
+
+    async def aclose(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+TRANSCRIPTION_BACKENDS = {backend.name: backend for backend in (AssemblyAIBackend, WhisperBackend)}
+
+
+def create_transcription_backend(name: str) -> TranscriptionBackend:
+    if name not in TRANSCRIPTION_BACKENDS:
+        raise ValueError(f"Unknown transcription backend {name!r}; choose one of {', '.join(TRANSCRIPTION_BACKENDS)}")
+    return TRANSCRIPTION_BACKENDS[name]()
+
+
+def normalize_words(text: str) -> list:
+    """Lower-cased words with punctuation removed; Devanagari marks are kept"""
+    text = "".join(" " if unicodedata.category(ch).startswith("P") else ch for ch in text.lower())
+    return text.split()
+
+
+def drop_overlap(previous: str, current: str, max_words: int = OVERLAP_MAX_WORDS) -> str:
+    """current without its leading words that repeat the end of previous.
+
+    Either chunk may hold a fragment of the word the cut went through: the
+    first word of current is allowed to be a stray fragment, and the last word
+    of previous may be the start of a word that current has whole. Those looser
+    matches need two words to agree, so a lone "2" never swallows a "25".
+    """
+    tail = normalize_words(previous)[-max_words:]
+    words = current.split()
+    head = [" ".join(normalize_words(word)) for word in words[:max_words + 1]]
+    for length in range(min(len(tail), len(head)), 0, -1):
+        for skip in (0, 1):
+            candidate = head[skip:skip + length]
+            if len(candidate) < length or (length < 2 and skip):
+                continue
+            if candidate == tail[-length:] or (
+                length > 1 and candidate[:-1] == tail[-length:-1] and candidate[-1].startswith(tail[-1])
+            ):
+                return " ".join(words[skip + length:])
+    return current
+
+
+async def transcribe_in_order(
+    transcribe: Callable[[bytes], Awaitable[str]], notes: List[List[dict]]
+) -> AsyncIterator[Tuple[int, str]]:
+    """(note index, chunk text) for every chunk of every note, in order.
+
+    All chunks are transcribed concurrently from the start; each is yielded
+    once it and every chunk before it are done, so the caller can work on the
+    first chunks while later ones are still transcribing.
+    """
+    tasks = [[asyncio.ensure_future(transcribe(chunk["audio"])) for chunk in chunks] for chunks in notes]
+    try:
+        for index, (chunks, note_tasks) in enumerate(zip(notes, tasks)):
+            previous = ""
+            for chunk, task in zip(chunks, note_tasks):
+                text = await task
+                yield index, drop_overlap(previous, text) if chunk["overlaps_previous"] else text
+                previous = text
+    finally:
+        for note_tasks in tasks:
+            for task in note_tasks:
+                task.cancel()
@@ -76,11 +76,16 @@ def get_whatsapp_messages(language: str = 'en'):
             'welcome': 'Welcome to VoiceBill! 🎤\n\nSend me a voice message describing your sale:\ne.g., \'Sold 2 bags of rice at 500 rupees each\'\n\nI\'ll automatically generate an invoice for you!',
             'invoice_created': '✅ Invoice created successfully!',
             'error': 'Sorry, I encountered an error. Please try again.',
-            'help': 'Welcome to VoiceBill! 🎤\n\nSend a voice message with your sale details.\n\nCommands:\n• "help" - Show this message\n• "invoice" - View recent invoices\n• "customers" - View customers\n• "language hindi" - Switch to Hindi',
+            'busy': '⏳ We are handling a lot of messages right now. Please send your message again in a few minutes.',
+            'help': 'Welcome to VoiceBill! 🎤\n\nSend a voice message with your sale details.\n\nCommands:\n• "help" - Show this message\n• "invoice" - View recent invoices\n• "customers" - View customers\n• "balance <name>" - Customer balance\n• "language hindi" - Switch to Hindi',
             'recent_invoices': 'Your recent invoices:\n\n',
             'no_invoices': 'No invoices yet. Send a voice message to create one!',
             'language_changed': '✅ Language changed to English',
-            'customer_added': '✅ Customer {name} added to database'
+            'customer_added': '✅ Customer {name} added to database',
+            'balance_header': 'Balance for {name}:\n\n',
+            'balance_total': '\nOutstanding: ₹{balance:.2f}',
+            'balance_usage': 'Send "balance <customer name>" to see what a customer owes.',
+            'customer_not_found': 'No customer found named "{name}".'
         },
         'hi': {
             'processing': '🎤 आपका वॉयस संदेश प्रोसेस हो रहा है...',
@@ -88,11 +93,16 @@ def get_whatsapp_messages(language: str = 'en'):
             'welcome': 'VoiceBill में आपका स्वागत है! 🎤\n\nअपनी बिक्री का विवरण देते हुए वॉयस संदेश भेजें:\nजैसे: \'2 बैग चावल 500 रुपये प्रत्येक में बेचे\'\n\nमैं स्वचालित रूप से चालान बना दूंगा!',
             'invoice_created': '✅ चालान सफलतापूर्वक बनाया गया!',
             'error': 'क्षमा करें, एक त्रुटि हुई। कृपया पुनः प्रयास करें।',
-            'help': 'VoiceBill में आपका स्वागत है! 🎤\n\nअपनी बिक्री विवरण के साथ वॉयस संदेश भेजें।\n\nकमांड:\n• "help" - यह संदेश दिखाएं\n• "invoice" - हाल के चालान देखें\n• "customers" - ग्राहक देखें\n• "language english" - अंग्रेजी में बदलें',
+            'busy': '⏳ अभी बहुत सारे संदेश आ रहे हैं। कृपया कुछ मिनट बाद अपना संदेश फिर से भेजें।',
+            'help': 'VoiceBill में आपका स्वागत है! 🎤\n\nअपनी बिक्री विवरण के साथ वॉयस संदेश भेजें।\n\nकमांड:\n• "help" - यह संदेश दिखाएं\n• "invoice" - हाल के चालान देखें\n• "customers" - ग्राहक देखें\n• "balance <नाम>" - ग्राहक का बकाया\n• "language english" - अंग्रेजी में बदलें',
             'recent_invoices': 'आपके हाल के चालान:\n\n',
             'no_invoices': 'अभी तक कोई चालान नहीं। वॉयस संदेश भेजकर बनाएं!',
             'language_changed': '✅ भाषा हिंदी में बदल गई',
-            'customer_added': '✅ ग्राहक {name} डेटाबेस में जोड़ा गया'
+            'customer_added': '✅ ग्राहक {name} डेटाबेस में जोड़ा गया',
+            'balance_header': '{name} का खाता:\n\n',
+            'balance_total': '\nबकाया राशि: ₹{balance:.2f}',
+            'balance_usage': 'ग्राहक का बकाया देखने के लिए "balance <ग्राहक का नाम>" भेजें।',
+            'customer_not_found': '"{name}" नाम का कोई ग्राहक नहीं मिला।'
         }
     }
     
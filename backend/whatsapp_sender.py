@@ -0,0 +1,147 @@
+"""Async WhatsApp sender backed by a pooled connection to Twilio's REST API"""
+import asyncio
+import logging
+import os
+import random
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+TWILIO_API_BASE_URL = os.environ.get('TWILIO_API_BASE_URL', 'https://api.twilio.com')
+# Pooled connections; keep at or above SCHEDULER_TWILIO_CONCURRENCY, which caps calls in flight
+TWILIO_MAX_CONCURRENCY = int(os.environ.get('TWILIO_MAX_CONCURRENCY', 10))
+TWILIO_MAX_RETRIES = int(os.environ.get('TWILIO_MAX_RETRIES', 3))
+TWILIO_TIMEOUT = float(os.environ.get('TWILIO_TIMEOUT', 10))
+
+# Twilio refused the request without creating a message: 429 when we exceed the
+# account's rate limit, 503 when it sheds load. Other 5xx may come after the
+# message was created, so like a read timeout they are not retried.
+RETRYABLE_STATUS_CODES = {429, 503}
+# Raised before the request reached Twilio. After a read timeout or a dropped
+# connection the message may already be queued, and resending would deliver it twice.
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class WhatsAppSender:
+    """Send WhatsApp messages through Twilio without blocking the event loop.
+
+    A single httpx.AsyncClient keeps connections to Twilio alive between
+    messages. How many sends run at once is up to the caller (the server
+    holds a scheduler "twilio" slot per send); requests beyond
+    max_concurrency wait for a pooled connection.
+    """
+
+    def __init__(
+        self,
+        account_sid: str,
+        auth_token: str,
+        from_number: str,
+        base_url: str = TWILIO_API_BASE_URL,
+        max_concurrency: int = TWILIO_MAX_CONCURRENCY,
+        max_retries: int = TWILIO_MAX_RETRIES,
+        timeout: float = TWILIO_TIMEOUT,
+        backoff_base: float = 0.5,
+        backoff_cap: float = 8.0,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.account_sid = account_sid
+        self.auth_token = auth_token
+        self.from_number = from_number
+        self.base_url = base_url.rstrip('/')
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def messages_path(self) -> str:
+        return f"/2010-04-01/Accounts/{self.account_sid}/Messages.json"
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Create the pooled HTTP client on first use (inside the running loop)"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                auth=(self.account_sid, self.auth_token),
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency,
+                ),
+                transport=self._transport,
+            )
+        return self._client
+
+    def _backoff_delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Full-jitter exponential backoff, never shorter than Twilio's Retry-After"""
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        return delay
+
+    async def send(self, to: str, body: str) -> dict:
+        """Send a message and return a delivery record describing the outcome"""
+        client = self._get_client()
+        result = {
+            "to": to,
+            "from": self.from_number,
+            "delivered": False,
+            "sid": None,
+            "status": None,
+            "http_status": None,
+            "attempts": 0,
+            "error": None,
+            "latency_ms": 0.0,
+            "created_at": datetime.now(timezone.utc),
+        }
+        payload = {"To": to, "From": self.from_number, "Body": body}
+        started = time.perf_counter()
+
+        for attempt in range(self.max_retries + 1):
+            result["attempts"] = attempt + 1
+            retry_after = None
+            try:
+                response = await client.post(self.messages_path, data=payload)
+                result["http_status"] = response.status_code
+                if response.status_code < 400:
+                    data = response.json()
+                    result["delivered"] = True
+                    result["sid"] = data.get("sid")
+                    result["status"] = data.get("status")
+                    result["error"] = None
+                    break
+                result["error"] = response.text[:500]
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    break
+                retry_after = response.headers.get("Retry-After")
+            except httpx.TransportError as e:
+                result["error"] = f"{type(e).__name__}: {str(e)}"
+                if not isinstance(e, RETRYABLE_ERRORS):
+                    break
+
+            if attempt < self.max_retries:
+                delay = self._backoff_delay(attempt, retry_after)
+                logger.warning(f"Twilio send to {to} failed (attempt {attempt + 1}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+        result["latency_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        if result["delivered"]:
+            logger.info(f"Message sent: {result['sid']}")
+        else:
+            logger.error(f"Failed to send message to {to}: {result['error']}")
+        return result
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
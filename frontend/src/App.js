@@ -8,6 +8,27 @@ import Home from "./Home";
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+// List endpoints return one page at a time; X-Next-Cursor fetches the next one
+const fetchPage = async (url, params = {}, cursor = null) => {
+  const response = await axios.get(url, { params: { ...params, ...(cursor && { cursor }) } });
+  return { items: response.data, nextCursor: response.headers["x-next-cursor"] || null };
+};
+
+// Follow X-Next-Cursor until done, for lists that are searched in the browser
+const fetchAllPages = async (url) => {
+  const items = [];
+  let cursor = null;
+  do {
+    const page = await fetchPage(url, { limit: 500 }, cursor);
+    items.push(...page.items);
+    cursor = page.nextCursor;
+  } while (cursor);
+  return items;
+};
+
+const RECENT_INVOICES = 10;
+const DUE_PAGE_SIZE = 50;
+
 const Dashboard = () => {
   const [invoices, setInvoices] = useState([]);
   const [stats, setStats] = useState({ total: 0, thisMonth: 0, revenue: 0 });
@@ -20,19 +41,15 @@ const Dashboard = () => {
 
   const fetchInvoices = async () => {
     try {
-      const response = await axios.get(`${API}/invoices`);
-      const invoiceData = response.data;
-      setInvoices(invoiceData);
-
-      // Calculate stats
-      const total = invoiceData.length;
-      const now = new Date();
-      const thisMonth = invoiceData.filter(
-        (inv) => new Date(inv.date).getMonth() === now.getMonth()
-      ).length;
-      const revenue = invoiceData.reduce((sum, inv) => sum + inv.total, 0);
-
-      setStats({ total, thisMonth, revenue });
+      // Stats are computed by the backend, so only the recent invoices are loaded
+      const [page, statsResponse] = await Promise.all([
+        fetchPage(`${API}/invoices`, { limit: RECENT_INVOICES }),
+        axios.get(`${API}/invoices/stats`),
+      ]);
+      setInvoices(page.items);
+
+      const { total, this_month, revenue } = statsResponse.data;
+      setStats({ total, thisMonth: this_month, revenue });
       setLoading(false);
     } catch (e) {
       console.error("Error fetching invoices:", e);
@@ -141,7 +158,7 @@ const Dashboard = () => {
           </div>
         ) : (
           <div className="invoice-grid">
-            {invoices.slice(0, 10).map((invoice) => (
+            {invoices.slice(0, RECENT_INVOICES).map((invoice) => (
               <div key={invoice.id} className="invoice-card" data-testid={`invoice-card-${invoice.id}`}>
                 <div className="invoice-header">
                   <h3 className="invoice-number" data-testid={`invoice-number-${invoice.id}`}>{invoice.invoice_number}</h3>
@@ -220,6 +237,11 @@ const DueManagement = () => {
   const [dueInvoices, setDueInvoices] = useState([]);
   const [loading, setLoading] = useState(true);
   const [totalDue, setTotalDue] = useState(0);
+  const [dueCount, setDueCount] = useState(0);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+
+  const dueParams = { fields: 'dues', due: true, limit: DUE_PAGE_SIZE };
 
   useEffect(() => {
     fetchDueInvoices();
@@ -227,17 +249,15 @@ const DueManagement = () => {
 
   const fetchDueInvoices = async () => {
     try {
-      const response = await axios.get(`${API}/invoices`);
-      const allInvoices = response.data;
-      
-      // Filter invoices with pending payments
-      const due = allInvoices.filter(inv => 
-        inv.status === 'unpaid' || inv.status === 'partial' || inv.amount_due > 0
-      );
-      
-      setDueInvoices(due);
-      const total = due.reduce((sum, inv) => sum + inv.amount_due, 0);
-      setTotalDue(total);
+      // First page only; later pages load from the "Load more" button
+      const [page, statsResponse] = await Promise.all([
+        fetchPage(`${API}/invoices`, dueParams),
+        axios.get(`${API}/invoices/stats`),
+      ]);
+      setDueInvoices(page.items);
+      setNextCursor(page.nextCursor);
+      setTotalDue(statsResponse.data.total_due);
+      setDueCount(statsResponse.data.due_count);
       setLoading(false);
     } catch (error) {
       console.error('Error fetching due invoices:', error);
@@ -245,6 +265,18 @@ const DueManagement = () => {
     }
   };
 
+  const loadMoreDueInvoices = async () => {
+    setLoadingMore(true);
+    try {
+      const page = await fetchPage(`${API}/invoices`, dueParams, nextCursor);
+      setDueInvoices((loaded) => [...loaded, ...page.items]);
+      setNextCursor(page.nextCursor);
+    } catch (error) {
+      console.error('Error fetching more due invoices:', error);
+    }
+    setLoadingMore(false);
+  };
+
   const markAsPaid = async (invoiceId) => {
     if (window.confirm('Mark this invoice as fully paid?')) {
       try {
@@ -277,7 +309,7 @@ const DueManagement = () => {
           <Receipt size={32} className="due-icon" />
           <div>
             <p className="due-label">Pending Invoices</p>
-            <p className="due-value">{dueInvoices.length}</p>
+            <p className="due-value">{dueCount}</p>
           </div>
         </div>
       </div>
@@ -341,6 +373,13 @@ const DueManagement = () => {
                 ))}
               </tbody>
             </table>
+            {nextCursor && (
+              <div className="load-more">
+                <button className="btn-submit" onClick={loadMoreDueInvoices} disabled={loadingMore}>
+                  {loadingMore ? 'Loading…' : 'Load more'}
+                </button>
+              </div>
+            )}
           </div>
         )}
       </div>
@@ -371,8 +410,7 @@ const CustomerManagement = () => {
 
   const fetchCustomers = async () => {
     try {
-      const response = await axios.get(`${API}/customers`);
-      setCustomers(response.data);
+      setCustomers(await fetchAllPages(`${API}/customers`));
       setLoading(false);
     } catch (error) {
       console.error('Error fetching customers:', error);
@@ -626,8 +664,7 @@ const ProductCatalog = () => {
 
   const fetchProducts = async () => {
     try {
-      const response = await axios.get(`${API}/products`);
-      setProducts(response.data);
+      setProducts(await fetchAllPages(`${API}/products`));
       setLoading(false);
     } catch (error) {
       console.error('Error fetching products:', error);
@@ -0,0 +1,166 @@
+"""Shared fixtures and the baseline regression gate for the benchmark suite.
+
+Behaviour tests get a fresh database from the db fixture: MONGO_TEST_URL if
+set, otherwise a throwaway mongod when one is on PATH, otherwise mongomock.
+Tests that need server-only features (window functions) use server_db, which
+skips under mongomock. racing_db wraps a database so a concurrent write lands
+just before a chosen collection method runs.
+
+Run from the repository root:
+    pytest tests                          # compare against the stored baseline
+    pytest tests --update-baseline        # record this machine's results
+    pytest tests --max-regression 0.1     # fail if >10% slower than baseline
+
+Each benchmark's median is compared with the median stored in
+--baseline-file; benchmarks without a baseline entry only report. Baselines
+are only meaningful on the machine that recorded them.
+"""
+import json
+import os
+import platform
+import shutil
+import sys
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+DEFAULT_BASELINE_FILE = Path(__file__).parent / "benchmark_baseline.json"
+DEFAULT_MAX_REGRESSION = float(os.environ.get("BENCHMARK_MAX_REGRESSION", 0.25))
+MONGO_TEST_URL = os.environ.get("MONGO_TEST_URL")
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("baseline", "benchmark regression gate")
+    group.addoption("--baseline-file", default=str(DEFAULT_BASELINE_FILE),
+                    help="JSON file holding baseline medians")
+    group.addoption("--update-baseline", action="store_true",
+                    help="write this run's medians to the baseline file instead of comparing")
+    group.addoption("--max-regression", type=float, default=DEFAULT_MAX_REGRESSION,
+                    help="allowed slowdown over the baseline median as a fraction (default 0.25)")
+
+
+def pytest_configure(config):
+    path = Path(config.getoption("--baseline-file"))
+    config._benchmark_baseline = json.loads(path.read_text())["benchmarks"] if path.exists() else {}
+    config._benchmark_results = {}
+
+
+def pytest_sessionfinish(session):
+    config = session.config
+    if not config.getoption("--update-baseline") or not config._benchmark_results:
+        return
+    path = Path(config.getoption("--baseline-file"))
+    benchmarks = {**config._benchmark_baseline, **config._benchmark_results}
+    path.write_text(json.dumps({
+        "machine": f"{platform.node()} {platform.machine()} {platform.python_implementation()} {platform.python_version()}",
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+        "benchmarks": dict(sorted(benchmarks.items())),
+    }, indent=2) + "\n")
+
+
+@pytest.fixture
+def gated_benchmark(benchmark, request):
+    """benchmark(func, *args) that fails the test when the median regressed"""
+    config = request.config
+
+    def run(func, *args, **kwargs):
+        result = benchmark(func, *args, **kwargs)
+        if benchmark.disabled or benchmark.stats is None:
+            return result
+        name = request.node.name
+        median = benchmark.stats.stats.median
+        config._benchmark_results[name] = {"median": median, "rounds": benchmark.stats.stats.rounds}
+
+        baseline = config._benchmark_baseline.get(name)
+        if baseline and not config.getoption("--update-baseline"):
+            limit = baseline["median"] * (1 + config.getoption("--max-regression"))
+            benchmark.extra_info["baseline_median"] = baseline["median"]
+            if median > limit:
+                pytest.fail(
+                    f"{name}: median {median * 1e6:.1f}us is {median / baseline['median'] - 1:.0%} slower "
+                    f"than the baseline {baseline['median'] * 1e6:.1f}us "
+                    f"(allowed {config.getoption('--max-regression'):.0%})"
+                )
+        return result
+
+    return run
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+def mongo_url():
+    """URL of a real MongoDB for this session, or None to use mongomock"""
+    if MONGO_TEST_URL:
+        yield MONGO_TEST_URL
+    elif shutil.which("mongod"):
+        from fakes.mongod import local_mongod
+        with local_mongod() as url:
+            yield url
+    else:
+        yield None
+
+
+@pytest.fixture
+async def db(mongo_url):
+    if mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(mongo_url, tz_aware=True, tzinfo=timezone.utc)
+    else:
+        from mongomock_motor import AsyncMongoMockClient
+        client = AsyncMongoMockClient(tz_aware=True)
+    database = client[f"test_{uuid.uuid4().hex[:12]}"]
+    try:
+        yield database
+    finally:
+        await client.drop_database(database.name)
+        client.close()
+
+
+@pytest.fixture
+def server_db(db, mongo_url):
+    if not mongo_url:
+        pytest.skip("needs a MongoDB server (set MONGO_TEST_URL or put mongod on PATH)")
+    return db
+
+
+class RacingDb:
+    """A db where `race(db)` runs just before every call to one of `methods` on `collection`"""
+
+    def __init__(self, db, collection: str, methods, race):
+        self._db = db
+        self._collection = collection
+        self._methods = (methods,) if isinstance(methods, str) else tuple(methods)
+        self._race = race
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def __getitem__(self, name):
+        collection = self._db[name]
+        if name != self._collection:
+            return collection
+        for method in self._methods:
+            setattr(collection, method, self._raced(getattr(collection, method)))
+        return collection
+
+    def _raced(self, method):
+        async def call(*args, **kwargs):
+            await self._race(self._db)
+            return await method(*args, **kwargs)
+        return call
+
+
+@pytest.fixture
+def racing_db(db):
+    """racing_db(collection, methods, race): db with race(db) run before each of those methods"""
+    return lambda collection, methods, race: RacingDb(db, collection, methods, race)
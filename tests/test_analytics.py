@@ -0,0 +1,64 @@
+"""Analytics rollups: a rebuild reproduces the incremental rollups in place"""
+from datetime import datetime, timezone
+
+import pytest
+
+from analytics import METRICS, apply_rollup_change, create_rollup_indexes, rebuild_rollups
+
+pytestmark = pytest.mark.anyio
+
+
+def invoice(invoice_id: str, user_id: str, day: int, total: float) -> dict:
+    return {"id": invoice_id, "user_id": user_id, "date": datetime(2024, 5, day, 6, tzinfo=timezone.utc),
+            "total": total, "tax": 0.0, "amount_paid": 0.0, "amount_due": total,
+            "items": [{"name": "Rice", "quantity": 2, "total": total}]}
+
+
+async def rollups(db, collection: str) -> list:
+    """Rollup documents in key order; incremental updates leave zero metrics out"""
+    docs = await db[collection].find({}, {"_id": 0}).sort([("user_id", 1), ("period", 1)]).to_list(None)
+    return [{**{metric: 0.0 for metric in METRICS}, **doc} for doc in docs]
+
+
+@pytest.fixture
+async def recorded(db):
+    await create_rollup_indexes(db)
+    docs = [invoice("a", "u1", 1, 100.0), invoice("b", "u1", 2, 50.0), invoice("c", "u2", 1, 30.0)]
+    await db.invoices.insert_many([dict(doc) for doc in docs])
+    for doc in docs:
+        await apply_rollup_change(db, None, doc)
+    return db
+
+
+async def test_rebuild_matches_incremental_rollups(recorded):
+    daily, monthly = await rollups(recorded, "analytics_daily"), await rollups(recorded, "analytics_monthly")
+    await rebuild_rollups(recorded)
+    assert await rollups(recorded, "analytics_daily") == daily
+    assert await rollups(recorded, "analytics_monthly") == monthly
+
+
+async def test_rebuild_drops_buckets_without_invoices(recorded):
+    # Invoice b was deleted without its rollup being updated
+    await recorded.invoices.delete_one({"id": "b"})
+    summary = await rebuild_rollups(recorded, "u1")
+    assert summary["daily_periods"] == 1
+    periods = [(doc["user_id"], doc["period"]) for doc in await rollups(recorded, "analytics_daily")]
+    assert periods == [("u1", "2024-05-01"), ("u2", "2024-05-01")]
+    assert (await recorded.analytics_monthly.find_one({"user_id": "u1"}))["revenue"] == 100.0
+
+
+async def test_rollups_keep_updating_after_a_rebuild(recorded):
+    await rebuild_rollups(recorded)
+    await apply_rollup_change(recorded, None, invoice("d", "u1", 1, 20.0))
+    assert (await recorded.analytics_daily.find_one({"user_id": "u1", "period": "2024-05-01"}))["revenue"] == 120.0
+
+
+async def upsert_may_1(db):
+    """An invoice write upserts u1's 1 May rollup just before the rebuild writes it"""
+    await db.analytics_daily.update_one({"user_id": "u1", "period": "2024-05-01"}, {"$inc": {"revenue": 5.0}}, upsert=True)
+
+
+async def test_rebuild_survives_concurrent_upserts(recorded, racing_db):
+    await rebuild_rollups(racing_db("analytics_daily", ("bulk_write", "insert_many"), upsert_may_1))
+    docs = await recorded.analytics_daily.find({"user_id": "u1"}).to_list(None)
+    assert [doc["period"] for doc in docs] == ["2024-05-01", "2024-05-02"]
@@ -0,0 +1,85 @@
+"""Voice note pre-processing: speech detection and chunk boundaries on synthetic audio"""
+import numpy as np
+
+from audio_preprocessing import chunk_bounds, decode_audio, encode_opus, preprocess_audio, speech_segments
+
+RATE = 16000
+FRAME = RATE * 30 // 1000
+PADDING = RATE * 250 // 1000
+
+
+def silence(seconds: float):
+    return np.zeros(int(seconds * RATE), dtype=np.int16)
+
+
+def tone(seconds: float, amplitude: float = 0.3):
+    t = np.arange(int(seconds * RATE)) / RATE
+    return (amplitude * 32767 * np.sin(2 * np.pi * 220 * t)).astype(np.int16)
+
+
+def note(*parts):
+    return np.concatenate(parts)
+
+
+def test_silence_has_no_speech():
+    assert speech_segments(silence(5), RATE) == []
+    assert speech_segments(np.zeros(0, dtype=np.int16), RATE) == []
+
+
+def test_one_long_segment_is_trimmed_and_padded():
+    samples = note(silence(1), tone(10), silence(2))
+    [(start, end)] = speech_segments(samples, RATE)
+    assert RATE - PADDING - FRAME <= start <= RATE - PADDING
+    assert 11 * RATE + PADDING <= end <= 11 * RATE + PADDING + FRAME
+
+
+def test_note_without_silence_is_left_whole():
+    samples = tone(4)
+    assert speech_segments(samples, RATE) == [(0, len(samples))]
+
+
+def test_short_pauses_merge_and_long_ones_split():
+    short = note(silence(1), tone(2), silence(0.5), tone(2), silence(1))
+    assert len(speech_segments(short, RATE)) == 1
+    long = note(silence(1), tone(2), silence(2), tone(2), silence(1))
+    first, second = speech_segments(long, RATE)
+    assert first[1] < 3 * RATE + PADDING + FRAME
+    assert second[0] > 5 * RATE - PADDING - FRAME
+
+
+def test_short_audio_is_one_chunk():
+    assert chunk_bounds(80, [40], 100, 10) == [(0, 80, False)]
+    assert chunk_bounds(500, [], 0, 10) == [(0, 500, False)]
+
+
+def test_cuts_go_at_the_last_pause_that_fits():
+    assert chunk_bounds(250, [30, 60, 90, 170], 100, 10) == [(0, 90, False), (90, 170, False), (170, 250, False)]
+
+
+def test_cuts_without_a_pause_are_hard_and_overlap():
+    bounds = chunk_bounds(250, [], 100, 10)
+    assert bounds == [(0, 100, False), (90, 200, True), (190, 250, True)]
+    # Pauses in the first half of a chunk are too early to cut at
+    assert chunk_bounds(250, [20], 100, 10)[0] == (0, 100, False)
+
+
+def test_every_chunk_stays_within_max_length():
+    rng = np.random.default_rng(7)
+    pauses = sorted(rng.choice(100_000, size=40, replace=False).tolist())
+    bounds = chunk_bounds(100_000, pauses, 9_000, 500)
+    assert bounds[0][0] == 0 and bounds[-1][1] == 100_000
+    for (start, end, overlapped), (_, previous_end, _) in zip(bounds[1:], bounds):
+        assert start == (previous_end - 500 if overlapped else previous_end)
+    assert all(end - start <= 9_000 + 500 for start, end, _ in bounds)
+
+
+def test_long_note_is_split_into_decodable_chunks():
+    samples = note(silence(1), tone(5), silence(1.5), tone(5), silence(1))
+    result = preprocess_audio(encode_opus(samples, RATE), RATE, chunk_seconds=6, overlap_seconds=1)
+    assert result["processed"]
+    assert len(result["chunks"]) == 2
+    assert not any(chunk["overlaps_previous"] for chunk in result["chunks"])
+    for chunk in result["chunks"]:
+        _, seconds = decode_audio(chunk["audio"], RATE)
+        assert 4 < seconds <= 6.1
+    assert result["processed_seconds"] < result["original_seconds"]
@@ -0,0 +1,130 @@
+"""Bulk import: matching by normalized name and phone, per-row errors and unreadable files"""
+import io
+import os
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+os.environ.setdefault("MONGO_URL", "mongodb://127.0.0.1:27017")
+os.environ.setdefault("DB_NAME", "voicebill_test")
+
+from bulk_import import import_records  # noqa: E402
+from search import create_search_indexes, search_fields  # noqa: E402
+from server import Customer, CustomerCreate, Product, ProductCreate  # noqa: E402
+
+pytestmark = pytest.mark.anyio
+
+
+def upload(content: bytes, filename: str = "products.csv") -> UploadFile:
+    return UploadFile(io.BytesIO(content), filename=filename)
+
+
+async def run_import(db, content: bytes, batch_size: int = 500) -> dict:
+    return await import_records(db.products, ProductCreate, Product, "u1", upload(content), batch_size)
+
+
+async def import_customers(db, content: bytes) -> dict:
+    return await import_records(db.customers, CustomerCreate, Customer, "u1", upload(content, "customers.csv"))
+
+
+@pytest.fixture
+async def indexed(db):
+    await create_search_indexes(db)
+    return db
+
+
+async def test_rows_update_by_normalized_name(indexed):
+    first = await run_import(indexed, b"Name,Price\nBasmati Rice,90\nSugar,45\n")
+    assert (first["inserted"], first["updated"], first["failed"]) == (2, 0, 0)
+    rice = await indexed.products.find_one({"name_key": "basmati rice"})
+
+    second = await run_import(indexed, b"name,price,description\n  basmati   RICE ,95,1kg\n")
+    assert (second["inserted"], second["updated"]) == (0, 1)
+    updated = await indexed.products.find_one({"name_key": "basmati rice"})
+    assert updated["id"] == rice["id"]
+    assert (updated["price"], updated["description"]) == (95.0, "1kg")
+    assert await indexed.products.count_documents({}) == 2
+
+
+async def test_invalid_rows_are_reported_without_stopping_the_import(indexed):
+    summary = await run_import(indexed, b"name,price\nRice,abc\n,10\nDal,120\n\nDal,125\n", batch_size=2)
+    assert summary["rows"] == 4
+    assert summary["failed"] == 2
+    assert [error["row"] for error in summary["errors"]] == [2, 3]
+    assert (await indexed.products.find_one({"name_key": "dal"}))["price"] == 125.0
+
+
+async def test_file_that_is_not_utf8_is_a_400_with_the_report(indexed):
+    # Decoding runs a few KB ahead of the rows, so the bad bytes come after several batches
+    rows = "".join(f"Item {i},{i},{'x' * 100}\n" for i in range(200)).encode()
+    content = b"name,price,description\n" + rows + "Gud,60,\n".encode("utf-16")
+    with pytest.raises(HTTPException) as error:
+        await run_import(indexed, content, batch_size=20)
+    assert error.value.status_code == 400
+    report = error.value.detail
+    assert report["failed"] == 1
+    assert report["inserted"] > 0
+    # Every row before the reported one was saved
+    assert report["errors"][0]["row"] == report["inserted"] + 2
+    assert await indexed.products.count_documents({}) == report["inserted"]
+
+
+async def test_same_name_different_phone_is_another_customer(indexed):
+    first = await import_customers(indexed, b"name,phone\nRamesh,9800000001\nRamesh,9800000002\n")
+    assert (first["inserted"], first["failed"]) == (2, 0)
+
+    second = await import_customers(indexed, b"name,phone,address\nramesh,+91 98000 00002,Market Road\n")
+    assert (second["inserted"], second["updated"]) == (0, 1)
+    updated = await indexed.customers.find_one({"phone": "+91 98000 00002"})
+    assert updated["address"] == "Market Road"
+    assert await indexed.customers.count_documents({}) == 2
+
+
+async def test_ambiguous_rows_are_reported(indexed):
+    await indexed.customers.insert_many([
+        {"id": f"c{i}", "user_id": "u1", "name": "Ramesh", "phone": "", **search_fields("Ramesh")} for i in range(2)
+    ])
+    summary = await import_customers(indexed, b"name,address\nRamesh,Market Road\nSuresh,Station Road\n")
+    assert (summary["inserted"], summary["updated"], summary["failed"]) == (1, 0, 1)
+    assert summary["errors"][0]["row"] == 2
+    assert await indexed.customers.count_documents({"address": "Market Road"}) == 0
+
+    # Neither has a number on file, so a phone on the row cannot pick one either
+    phoned = await import_customers(indexed, b"name,phone\nRamesh,9800000001\n")
+    assert phoned["failed"] == 1
+
+
+async def test_names_are_not_unique(indexed):
+    await indexed.products.insert_many([
+        {"id": f"p{i}", "user_id": "u1", "name": "Rice", **search_fields("Rice")} for i in range(2)
+    ])
+    assert await indexed.products.count_documents({"name_key": "rice"}) == 2
+
+
+async def test_unique_name_index_is_replaced_by_a_plain_one(db):
+    await db.products.create_index([("user_id", 1), ("name_key", 1)], unique=True)
+    await create_search_indexes(db)
+    indexes = await db.products.index_information()
+    name_index = next(info for info in indexes.values() if info["key"] == [("user_id", 1), ("name_key", 1)])
+    assert not name_index.get("unique")
+
+
+async def test_reimport_without_optional_columns_keeps_them(indexed):
+    await import_customers(indexed, b"name,phone,email,address,language,notes\n"
+                                    b"Ramesh,9800000001,r@example.com,Market Road,hi,pays monthly\n")
+    await run_import(indexed, b"name,price,description\nRice,90,1kg bag\n")
+
+    customers = await import_customers(indexed, b"name\nRamesh\nSuresh\n")
+    products = await run_import(indexed, b"name,price\nRice,95\n")
+
+    assert (customers["inserted"], customers["updated"], products["updated"]) == (1, 1, 1)
+    ramesh = await indexed.customers.find_one({"name": "Ramesh"})
+    assert (ramesh["phone"], ramesh["email"], ramesh["address"], ramesh["language"], ramesh["notes"]) == (
+        "9800000001", "r@example.com", "Market Road", "hi", "pays monthly"
+    )
+    assert "980000" in ramesh["search_tokens"]
+    rice = await indexed.products.find_one({"name": "Rice"})
+    assert (rice["price"], rice["description"]) == (95.0, "1kg bag")
+    # New records still get every default
+    suresh = await indexed.customers.find_one({"name": "Suresh"}, {"_id": 0})
+    assert (suresh["phone"], suresh["language"], suresh["total_due"]) == ("", "en", 0.0)
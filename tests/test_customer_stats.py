@@ -0,0 +1,114 @@
+"""Customer aggregates: every invoice change applied as a delta, drift repaired"""
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from customer_stats import (
+    RECONCILE_JOB_ID,
+    apply_invoice_change,
+    claim_reconcile_run,
+    merged_delta_operations,
+    reconcile_customer_stats,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+def invoice(invoice_id: str, customer_id: str, total: float, amount_paid: float = 0.0, day: int = 1) -> dict:
+    return {"id": invoice_id, "user_id": "u1", "customer_id": customer_id, "total": total,
+            "amount_paid": amount_paid, "amount_due": round(total - amount_paid, 2),
+            "date": datetime(2024, 5, day, tzinfo=timezone.utc)}
+
+
+@pytest.fixture
+async def customers(db):
+    await db.customers.insert_many([
+        {"id": c, "user_id": "u1", "name": c, "total_purchases": 0.0, "total_due": 0.0} for c in ("c1", "c2")
+    ])
+    return db
+
+
+async def stats(db, customer_id: str) -> tuple:
+    doc = await db.customers.find_one({"id": customer_id})
+    return round(doc["total_purchases"], 2), round(doc["total_due"], 2)
+
+
+async def test_create_pay_move_and_delete(customers):
+    db = customers
+    created = invoice("i1", "c1", 100.0)
+    await apply_invoice_change(db, None, created)
+    assert await stats(db, "c1") == (100.0, 100.0)
+    assert (await db.customers.find_one({"id": "c1"}))["last_purchase"] == created["date"]
+
+    paid = {**created, "amount_paid": 60.0, "amount_due": 40.0}
+    await apply_invoice_change(db, created, paid)
+    assert await stats(db, "c1") == (100.0, 40.0)
+
+    # Reassigned to another customer: removed from c1, added to c2
+    moved = {**paid, "customer_id": "c2"}
+    await apply_invoice_change(db, paid, moved)
+    assert await stats(db, "c1") == (0.0, 0.0)
+    assert await stats(db, "c2") == (100.0, 40.0)
+
+    await apply_invoice_change(db, moved, None)
+    assert await stats(db, "c2") == (0.0, 0.0)
+
+
+async def test_merged_deltas_write_once_per_customer(customers):
+    db = customers
+    changes = [(None, invoice(f"i{n}", "c1" if n % 2 else "c2", 10.0 * n, day=n)) for n in range(1, 6)]
+    operations = merged_delta_operations(changes)
+    assert len(operations) == 2
+    await db.customers.bulk_write(operations)
+    assert await stats(db, "c1") == (90.0, 90.0)
+    assert await stats(db, "c2") == (60.0, 60.0)
+    assert (await db.customers.find_one({"id": "c1"}))["last_purchase"] == datetime(2024, 5, 5, tzinfo=timezone.utc)
+
+
+async def test_reconcile_repairs_drift_only(customers):
+    db = customers
+    docs = [invoice("i1", "c1", 100.0, amount_paid=30.0), invoice("i2", "c2", 50.0)]
+    await db.invoices.insert_many([dict(doc) for doc in docs])
+    for doc in docs:
+        await apply_invoice_change(db, None, doc)
+    await db.customers.update_one({"id": "c2"}, {"$set": {"total_due": 999.0}})
+
+    summary = await reconcile_customer_stats(db, repair=False)
+    assert summary["customers_drifted"] == 1
+    assert await stats(db, "c2") == (50.0, 999.0)
+
+    await reconcile_customer_stats(db)
+    assert await stats(db, "c1") == (100.0, 70.0)
+    assert await stats(db, "c2") == (50.0, 50.0)
+
+
+async def test_repair_skips_customers_written_after_the_check(customers, racing_db):
+    db = customers
+    doc = invoice("i1", "c1", 100.0)
+    await db.invoices.insert_one(dict(doc))
+    await apply_invoice_change(db, None, doc)
+    await db.customers.update_one({"id": "c1"}, {"$set": {"total_due": 999.0}})
+
+    async def invoice_written(db):
+        # A new invoice lands after the customer was checked
+        new = invoice("i2", "c1", 50.0)
+        await db.invoices.insert_one(dict(new))
+        await apply_invoice_change(db, None, new)
+
+    summary = await reconcile_customer_stats(racing_db("customers", "bulk_write", invoice_written))
+    assert (summary["customers_drifted"], summary["customers_repaired"]) == (1, 0)
+    # The concurrent $inc is kept; the next run repairs the old drift
+    assert await stats(db, "c1") == (150.0, 1049.0)
+    await reconcile_customer_stats(db)
+    assert await stats(db, "c1") == (150.0, 150.0)
+
+
+async def test_one_process_claims_each_periodic_run(db):
+    claims = await asyncio.gather(*(claim_reconcile_run(db, 3600) for _ in range(4)))
+    assert sorted(claims) == [False, False, False, True]
+    assert not await claim_reconcile_run(db, 3600)
+
+    # Once the run is due again it can be claimed again
+    await db.job_runs.update_one({"_id": RECONCILE_JOB_ID}, {"$set": {"next_run": datetime(2000, 1, 1, tzinfo=timezone.utc)}})
+    assert await claim_reconcile_run(db, 3600)
@@ -0,0 +1,88 @@
+"""Invoice export route: CSV and NDJSON streams, filters and empty results"""
+import csv
+import io
+import json
+import os
+from datetime import datetime, timezone
+
+import pytest
+
+os.environ.setdefault("MONGO_URL", "mongodb://127.0.0.1:27017")
+os.environ.setdefault("DB_NAME", "voicebill_test")
+
+import export  # noqa: E402
+import server  # noqa: E402
+
+pytestmark = pytest.mark.anyio
+
+
+def invoice(id: str, user_id: str, day: int, *items) -> dict:
+    return {
+        "id": id, "invoice_number": f"INV-{id}", "user_id": user_id, "customer_name": "Ramesh",
+        "date": datetime(2024, 3, day, 10, tzinfo=timezone.utc), "subtotal": 100.0, "tax": 0.0, "total": 100.0,
+        "status": "unpaid", "transcription": "not exported",
+        "items": [{"name": name, "quantity": 1.0, "price": price, "total": price} for name, price in items],
+    }
+
+
+@pytest.fixture
+async def invoices(db):
+    await db.invoices.insert_many([
+        invoice("a", "u1", 1, ("Sugar", 44.0), ("Salt", 22.0)),
+        invoice("b", "u1", 15),
+        invoice("c", "u1", 28, ("Ghee", 620.0)),
+        invoice("d", "u2", 15, ("Tea", 280.0)),
+    ])
+
+
+async def download(db, format: str, user_id=None, start=None, end=None):
+    response = await server.export_invoices(format=format, user_id=user_id, start=start, end=end, db=db)
+    body = b"".join([chunk async for chunk in response.body_iterator]).decode()
+    return response, body
+
+
+async def test_csv_has_one_row_per_line_item_newest_first(db, invoices):
+    response, body = await download(db, "csv", user_id="u1")
+    assert response.media_type == "text/csv"
+    assert response.headers["content-disposition"].endswith(".csv")
+
+    rows = list(csv.DictReader(io.StringIO(body)))
+    assert [(row["id"], row["item_name"]) for row in rows] == [("c", "Ghee"), ("b", ""), ("a", "Sugar"), ("a", "Salt")]
+    assert rows[0]["date"] == "2024-03-28T10:00:00+00:00"
+    assert list(rows[0]) == export.CSV_COLUMNS
+
+
+async def test_ndjson_has_one_projected_invoice_per_line(db, invoices):
+    response, body = await download(db, "ndjson")
+    assert response.media_type == "application/x-ndjson"
+
+    lines = [json.loads(line) for line in body.splitlines()]
+    assert [line["id"] for line in lines] == ["c", "d", "b", "a"]
+    assert all("transcription" not in line for line in lines)
+    assert lines[0]["items"] == [{"name": "Ghee", "quantity": 1.0, "price": 620.0, "total": 620.0}]
+
+
+async def test_date_range_is_inclusive_and_naive_bounds_are_utc(db, invoices):
+    _, body = await download(db, "ndjson", user_id="u1", start=datetime(2024, 3, 1, 10), end=datetime(2024, 3, 15, 10))
+    assert [json.loads(line)["id"] for line in body.splitlines()] == ["b", "a"]
+
+    _, body = await download(db, "ndjson", start=datetime(2024, 3, 15, tzinfo=timezone.utc))
+    assert [json.loads(line)["id"] for line in body.splitlines()] == ["c", "d", "b"]
+
+
+async def test_empty_result_is_a_header_or_nothing(db, invoices):
+    _, body = await download(db, "csv", user_id="nobody")
+    assert body.splitlines() == [",".join(export.CSV_COLUMNS)]
+
+    _, body = await download(db, "ndjson", end=datetime(2024, 2, 1, tzinfo=timezone.utc))
+    assert body == ""
+
+
+async def test_rows_are_flushed_in_batches_without_loss(db, monkeypatch):
+    monkeypatch.setattr(export, "FLUSH_EVERY", 3)
+    await db.invoices.insert_many([invoice(f"{i:02d}", "u1", 1 + i, ("Sugar", 44.0)) for i in range(10)])
+
+    _, body = await download(db, "csv")
+    assert [row["id"] for row in csv.DictReader(io.StringIO(body))] == [f"{i:02d}" for i in reversed(range(10))]
+    _, body = await download(db, "ndjson")
+    assert len(body.splitlines()) == 10
@@ -0,0 +1,45 @@
+"""Fast list path: rows match what the models would return, defaults included"""
+import json
+import os
+from datetime import datetime, timezone
+
+import pytest
+
+os.environ.setdefault("MONGO_URL", "mongodb://127.0.0.1:27017")
+os.environ.setdefault("DB_NAME", "voicebill_test")
+
+from fast_responses import fast_list_response, model_defaults  # noqa: E402
+from server import Customer, Invoice  # noqa: E402
+
+CREATED = datetime(2024, 3, 1, 8, 30, tzinfo=timezone.utc)
+
+
+def fast_rows(model, documents: list) -> list:
+    return json.loads(fast_list_response([dict(doc) for doc in documents], model_defaults(model)).body)
+
+
+@pytest.mark.parametrize("doc", [
+    # A legacy invoice from before payments, links and languages existed
+    {"id": "inv-1", "user_id": "u1", "invoice_number": "INV-0001", "date": datetime(2024, 3, 10, tzinfo=timezone.utc),
+     "items": [{"name": "Sugar", "quantity": 2.0, "price": 44.0, "total": 88.0}],
+     "subtotal": 88.0, "tax": 0.0, "total": 88.0, "created_at": CREATED},
+    # A current one with every field stored
+    Invoice(id="inv-2", user_id="u1", invoice_number="INV-0002", customer_name="Ramesh",
+            items=[{"name": "Toor dal", "quantity": 1.0, "price": 140.0, "total": 140.0}],
+            subtotal=140.0, tax_rate=0.05, tax=7.0, total=147.0, amount_due=147.0,
+            payment_link="https://rzp.io/i/abc", created_at=CREATED).model_dump(),
+])
+def test_fast_rows_equal_the_model_dump(doc):
+    assert fast_rows(Invoice, [doc]) == [Invoice(**doc).model_dump(mode="json")]
+
+
+def test_missing_factory_fields_are_filled_per_document():
+    docs = [{"user_id": "u1", "name": "Ramesh"}, {"user_id": "u1", "name": "Suresh"}]
+    before = datetime.now(timezone.utc)
+    rows = fast_rows(Customer, docs)
+
+    assert rows[0]["id"] != rows[1]["id"]
+    for row, doc in zip(rows, docs):
+        expected = Customer(**doc, id=row["id"]).model_dump(mode="json")
+        assert {**row, "created_at": None} == {**expected, "created_at": None}
+        assert datetime.fromisoformat(row["created_at"].replace("Z", "+00:00")) >= before
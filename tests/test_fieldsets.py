@@ -0,0 +1,59 @@
+"""Sparse fieldsets: views, explicit field lists, rejected names and the documented list schema"""
+import json
+import os
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+
+os.environ.setdefault("MONGO_URL", "mongodb://127.0.0.1:27017")
+os.environ.setdefault("DB_NAME", "voicebill_test")
+
+from fieldsets import resolve_fields, sparse_adapter, sparse_projection  # noqa: E402
+from server import LIST_VIEWS, Invoice, app  # noqa: E402
+
+VIEWS = LIST_VIEWS["invoices"]
+SORT = [("date", -1), ("id", -1)]
+
+
+def test_no_fields_and_the_full_view_return_the_whole_document():
+    assert resolve_fields(Invoice, None, VIEWS) is None
+    assert resolve_fields(Invoice, "", VIEWS) is None
+    assert resolve_fields(Invoice, "full", VIEWS) is None
+
+
+def test_a_view_expands_to_its_fields_with_the_id_first():
+    assert resolve_fields(Invoice, "summary", VIEWS) == ("id", *VIEWS["summary"])
+
+
+def test_an_explicit_list_is_trimmed_and_deduplicated():
+    assert resolve_fields(Invoice, " total, id,total ,,status", VIEWS) == ("id", "total", "status")
+
+
+@pytest.mark.parametrize("fields", ["total,colour", "items.name", "customer.phone"])
+def test_unknown_and_nested_fields_are_rejected(fields):
+    with pytest.raises(HTTPException) as error:
+        resolve_fields(Invoice, fields, VIEWS)
+    assert error.value.status_code == 400
+    assert fields.split(",")[-1] in error.value.detail
+
+
+def test_projection_keeps_the_sort_keys_for_the_cursor():
+    assert sparse_projection(("id", "total"), SORT) == {"_id": 0, "id": 1, "total": 1, "date": 1}
+
+
+def test_slim_rows_carry_only_the_selected_fields():
+    doc = {"id": "inv-1", "total": 118.0, "date": datetime(2024, 3, 10, tzinfo=timezone.utc),
+           "items": [{"name": "Sugar", "quantity": 2, "price": 59.0, "total": 118.0}]}
+    adapter = sparse_adapter(Invoice, ("id", "total", "items"))
+    rows = json.loads(adapter.dump_json(adapter.validate_python([doc])))
+    assert rows == [{"id": "inv-1", "total": 118.0, "items": doc["items"]}]
+    assert sparse_adapter(Invoice, ("id", "total", "items")) is adapter
+
+
+@pytest.mark.parametrize("path, model", [("/api/invoices", "Invoice"), ("/api/customers", "Customer"),
+                                         ("/api/products", "Product")])
+def test_list_routes_document_the_full_model(path, model):
+    ok = app.openapi()["paths"][path]["get"]["responses"]["200"]
+    assert ok["content"]["application/json"]["schema"]["items"] == {"$ref": f"#/components/schemas/{model}"}
+    assert "?fields=" in ok["description"]
@@ -0,0 +1,71 @@
+"""GST reports: live reports for open periods, snapshots of closed ones after the date migration"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from gst_reports import close_period, create_gst_report_indexes, get_gst_report, previous_period
+from migrate_dates import ensure_dates_migrated
+
+pytestmark = pytest.mark.anyio
+
+PERIOD = "2024-03"
+
+
+@pytest.fixture
+async def invoices(db):
+    await create_gst_report_indexes(db)
+    await db.invoices.insert_many([
+        {"id": "a", "user_id": "u1", "customer_id": "c1", "customer_name": "Ramesh", "tax_rate": 0.18,
+         "subtotal": 100.0, "tax": 18.0, "total": 118.0, "date": datetime(2024, 3, 10, tzinfo=timezone.utc)},
+        {"id": "b", "user_id": "u1", "customer_id": "c2", "customer_name": "Suresh", "tax_rate": 0.05,
+         "subtotal": 200.0, "tax": 10.0, "total": 210.0, "date": "2024-03-20T09:00:00+00:00"},
+        {"id": "c", "user_id": "u1", "customer_id": "c1", "customer_name": "Ramesh", "tax_rate": 0.18,
+         "subtotal": 50.0, "tax": 9.0, "total": 59.0, "date": datetime(2024, 4, 2, tzinfo=timezone.utc)},
+    ])
+
+
+async def test_reading_a_past_period_before_the_migration_does_not_store_a_snapshot(db, invoices):
+    report = await get_gst_report(db, "u1", PERIOD)
+    assert report["final"] is False
+    assert await db.gst_reports.count_documents({}) == 0
+
+
+async def test_first_read_of_a_closed_period_stores_its_snapshot(db, invoices):
+    await ensure_dates_migrated(db)
+    first = await get_gst_report(db, "u1", PERIOD)
+    assert first["final"] is True
+    assert first["totals"]["invoice_count"] == 2
+
+    # Later invoices dated into the closed month do not change the snapshot
+    await db.invoices.insert_one({"id": "d", "user_id": "u1", "subtotal": 10.0, "tax": 0.0, "total": 10.0,
+                                  "date": datetime(2024, 3, 30, tzinfo=timezone.utc)})
+    again = await get_gst_report(db, "u1", PERIOD)
+    assert (again["id"], again["totals"]) == (first["id"], first["totals"])
+    assert await db.gst_reports.count_documents({}) == 1
+
+
+async def test_open_period_is_never_stored(db, invoices):
+    await ensure_dates_migrated(db)
+    current = previous_period(datetime.now(timezone.utc) + timedelta(days=32))
+    assert (await get_gst_report(db, "u1", current))["final"] is False
+    assert await db.gst_reports.count_documents({}) == 0
+
+
+async def test_period_close_waits_for_the_date_migration(db, invoices):
+    with pytest.raises(RuntimeError):
+        await close_period(db, PERIOD)
+    assert await db.gst_reports.count_documents({}) == 0
+
+
+async def test_period_close_snapshots_every_migrated_invoice(db, invoices):
+    await ensure_dates_migrated(db)
+    summary = await close_period(db, PERIOD)
+    assert summary["snapshots_created"] == 1
+
+    report = await get_gst_report(db, "u1", PERIOD)
+    assert report["final"] is True
+    assert report["totals"] == {"invoice_count": 2, "taxable_value": 300.0, "tax": 28.0, "total": 328.0}
+    assert [rate["tax_rate"] for rate in report["by_rate"]] == [5.0, 18.0]
+
+    # A second close leaves the snapshot alone
+    assert (await close_period(db, PERIOD))["snapshots_created"] == 0
@@ -0,0 +1,136 @@
+"""Microbenchmarks for the pure hot paths of invoice creation"""
+import random
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from billing import (
+    best_customer_match, build_product_catalog, find_catalog_price, format_invoice_text, invoice_totals, line_total,
+)
+from pdf_generator import generate_invoice_pdf
+from translations import INVOICE_TRANSLATIONS, get_whatsapp_messages, translate
+
+# A kirana store catalog: staples in several pack sizes, as shopkeepers enter them
+STAPLES = {
+    "basmati rice": 95, "sona masoori rice": 58, "toor dal": 140, "moong dal": 120, "chana dal": 90,
+    "masoor dal": 105, "urad dal": 130, "wheat atta": 42, "maida": 38, "besan": 85, "sooji": 45,
+    "sugar": 44, "jaggery": 60, "salt": 22, "sunflower oil": 165, "mustard oil": 180, "groundnut oil": 210,
+    "ghee": 620, "tea powder": 280, "coffee powder": 450, "turmeric powder": 240, "chilli powder": 260,
+    "coriander powder": 180, "garam masala": 520, "cumin seeds": 380, "mustard seeds": 120, "poha": 55,
+    "vermicelli": 40, "biscuits": 30, "bread": 45, "milk": 28, "curd": 35, "paneer": 90, "eggs": 7,
+    "onion": 35, "potato": 30, "tomato": 40, "soap": 38, "detergent": 120, "toothpaste": 95, "shampoo": 4,
+}
+PACK_SIZES = ["", " 500g", " 1kg", " 5kg"]
+
+CUSTOMER_NAMES = [
+    "Ramesh Kumar", "Suresh Patel", "Priya Sharma", "Anita Desai", "Mohammed Irfan", "Lakshmi Iyer",
+    "Rajesh Gupta", "Sunita Verma", "Vikram Singh", "Deepa Nair", "Arjun Reddy", "Kavita Joshi",
+    "Sanjay Mehta", "Pooja Agarwal", "Imran Khan", "Meena Pillai", "Amit Chauhan", "Neha Kapoor",
+    "Ravi Shankar", "Geeta Rao", "Farhan Sheikh", "Divya Menon", "Harish Yadav", "Shalini Bose",
+    "Manoj Tiwari", "Rekha Saxena", "Prakash Jain", "Asha Kulkarni", "Naveen Choudhary", "Swati Mishra",
+]
+
+# What the LLM hands back for a noisy transcription: plurals, pack sizes, partial names
+SPOKEN_ITEMS = ["basmati rice", "toor dals", "atta", "sugar 1kg", "mustard oils", "tea", "eggs", "saffron"]
+
+
+@pytest.fixture(scope="module")
+def product_catalog():
+    products = [
+        {"name": f"{name}{size}", "price": price * (1 + i)}
+        for name, price in STAPLES.items()
+        for i, size in enumerate(PACK_SIZES)
+    ]
+    return build_product_catalog(products)
+
+
+@pytest.fixture(scope="module")
+def customers():
+    return [
+        {"id": str(uuid.uuid4()), "name": f"{name} {suffix}".strip()}
+        for suffix in ("", "Jr", "Traders", "Stores")
+        for name in CUSTOMER_NAMES
+    ][:100]
+
+
+def make_invoice(item_count: int, payment_link: str = "https://rzp.io/i/bench") -> dict:
+    rng = random.Random(item_count)
+    names = sorted(STAPLES)
+    items = []
+    for i in range(item_count):
+        name = names[i % len(names)]
+        quantity = rng.randint(1, 12)
+        items.append({"name": name, "quantity": quantity, "price": STAPLES[name],
+                      "total": line_total(quantity, STAPLES[name])})
+    subtotal, tax, total = invoice_totals([item["total"] for item in items], 0.18)
+    return {
+        "id": str(uuid.uuid4()), "user_id": "bench-user", "invoice_number": "INV-20240531-0042",
+        "date": datetime(2024, 5, 31, 18, 30, tzinfo=timezone.utc), "customer_name": "Ramesh Kumar",
+        "customer_phone": "+919876543210", "customer_email": "ramesh@example.com",
+        "customer_address": "12 MG Road, Bengaluru", "items": items, "subtotal": subtotal, "tax_rate": 0.18,
+        "tax": tax, "total": total, "amount_paid": 100.0, "amount_due": total - 100.0, "status": "partial",
+        "payment_link": payment_link, "language": "en",
+    }
+
+
+def as_model(invoice: dict) -> SimpleNamespace:
+    """Attribute access like the Invoice model in server.py"""
+    return SimpleNamespace(**{**invoice, "items": [SimpleNamespace(**item) for item in invoice["items"]]})
+
+
+@pytest.mark.parametrize("item_count", [1, 10, 50])
+def test_generate_invoice_pdf(gated_benchmark, item_count):
+    invoice = make_invoice(item_count)
+    pdf = gated_benchmark(lambda: generate_invoice_pdf(invoice).getvalue())
+    assert pdf.startswith(b"%PDF")
+
+
+@pytest.mark.parametrize("language", ["en", "hi"])
+def test_generate_invoice_text(gated_benchmark, language):
+    invoice = as_model(make_invoice(10))
+    text = gated_benchmark(format_invoice_text, invoice, language, "https://voicebill.example")
+    assert invoice.invoice_number in text
+
+
+def test_catalog_price_matching(gated_benchmark, product_catalog):
+    prices = gated_benchmark(lambda: [find_catalog_price(item, product_catalog) for item in SPOKEN_ITEMS])
+    assert prices[0] == STAPLES["basmati rice"]
+    assert prices[-1] is None
+
+
+def test_build_product_catalog(gated_benchmark, product_catalog):
+    products = [{"name": name, "price": price} for name, price in product_catalog.items()]
+    assert gated_benchmark(build_product_catalog, products) == product_catalog
+
+
+@pytest.mark.parametrize("spoken_name", ["Ramesh Kumar", "ramesh kumr", "Unknown Person"])
+def test_customer_similarity(gated_benchmark, customers, spoken_name):
+    match, ratio = gated_benchmark(best_customer_match, spoken_name, customers)
+    if spoken_name == "Unknown Person":
+        assert match is None
+    else:
+        assert match["name"] == "Ramesh Kumar" and ratio >= 0.7
+
+
+def test_translate(gated_benchmark):
+    keys = list(INVOICE_TRANSLATIONS["en"])
+    translated = gated_benchmark(lambda: [translate(key, language) for language in ("en", "hi", "xx") for key in keys])
+    assert len(translated) == 3 * len(keys)
+
+
+@pytest.mark.parametrize("language", ["en", "hi"])
+def test_get_whatsapp_messages(gated_benchmark, language):
+    assert "error" in gated_benchmark(get_whatsapp_messages, language)
+
+
+@pytest.mark.parametrize("item_count", [10, 1000])
+def test_invoice_totals(gated_benchmark, item_count):
+    items = make_invoice(item_count)["items"]
+
+    def totals():
+        return invoice_totals([line_total(item["quantity"], item["price"]) for item in items], 0.18)
+
+    subtotal, tax, total = gated_benchmark(totals)
+    assert total == pytest.approx(subtotal * 1.18)
@@ -0,0 +1,109 @@
+"""Batch invoice creation: one number block per shopkeeper, totals and customer matching"""
+import os
+
+import pytest
+from fastapi import HTTPException
+
+os.environ.setdefault("MONGO_URL", "mongodb://127.0.0.1:27017")
+os.environ.setdefault("DB_NAME", "voicebill_test")
+
+import server  # noqa: E402
+from invoice_numbers import format_invoice_number  # noqa: E402
+from search import search_fields  # noqa: E402
+
+pytestmark = pytest.mark.anyio
+
+
+class BatchResources:
+    def __init__(self, db):
+        self.db = db
+
+
+@pytest.fixture
+def followups(monkeypatch):
+    spawned = []
+
+    def spawn(coroutine):
+        spawned.append(coroutine)
+        coroutine.close()
+
+    monkeypatch.setattr(server, "spawn_background", spawn)
+    return spawned
+
+
+def invoice_input(user_id: str, customer_name: str, *items, tax_rate: float = 0.0) -> server.InvoiceCreate:
+    return server.InvoiceCreate(
+        user_id=user_id,
+        customer_name=customer_name,
+        items=[server.InvoiceItem(name=name, quantity=quantity, price=price, total=0) for name, quantity, price in items],
+        tax_rate=tax_rate,
+    )
+
+
+async def test_batch_numbers_totals_and_customers(db, followups):
+    await db.customers.insert_one({
+        "id": "c1", "user_id": "u1", "name": "Ramesh Kumar", "phone": "+919800000000", "email": "r@example.com",
+        "total_purchases": 0.0, "total_due": 0.0, **search_fields("Ramesh Kumar"),
+    })
+    batch = [
+        invoice_input("u1", "ramesh  kumar", ("rice", 2, 50.0), ("dal", 1, 120.0), tax_rate=0.05),
+        invoice_input("u2", "Suresh", ("sugar", 3, 40.0)),
+        invoice_input("u1", "Walk-in Customer", ("tea", 1, 10.0)),
+    ]
+
+    result = await server.create_invoices_batch(batch, notify=True, resources=BatchResources(db))
+
+    assert result["created"] == 3
+    assert [invoice["invoice_number"] for invoice in result["invoices"]] == [
+        format_invoice_number("u1", 1), format_invoice_number("u2", 1), format_invoice_number("u1", 2),
+    ]
+    assert [invoice["total"] for invoice in result["invoices"]] == [231.0, 120.0, 10.0]
+
+    first = await db.invoices.find_one({"id": result["invoices"][0]["id"]})
+    assert (first["subtotal"], first["tax"], first["amount_due"]) == (220.0, 11.0, 231.0)
+    assert [item["total"] for item in first["items"]] == [100.0, 120.0]
+    assert (first["customer_id"], first["customer_phone"], first["customer_email"]) == ("c1", "+919800000000", "r@example.com")
+
+    customer = await db.customers.find_one({"id": "c1"})
+    assert (customer["total_purchases"], customer["total_due"]) == (231.0, 231.0)
+
+    markers = await db.invoice_followups.find({}, {"_id": 0, "invoice_id": 1, "notify": 1}).to_list(None)
+    assert sorted(m["invoice_id"] for m in markers) == sorted(invoice["id"] for invoice in result["invoices"])
+    assert all(m["notify"] for m in markers)
+    assert len(followups) == 1
+
+    # The next batch continues each shopkeeper's block
+    again = await server.create_invoices_batch([invoice_input("u1", "Mahesh", ("salt", 1, 20.0))], resources=BatchResources(db))
+    assert again["invoices"][0]["invoice_number"] == format_invoice_number("u1", 3)
+
+
+async def test_empty_and_oversized_batches_are_rejected(db, followups, monkeypatch):
+    with pytest.raises(HTTPException) as empty:
+        await server.create_invoices_batch([], resources=BatchResources(db))
+    assert empty.value.status_code == 400
+
+    monkeypatch.setattr(server, "MAX_INVOICE_BATCH_SIZE", 1)
+    batch = [invoice_input("u1", "Ramesh", ("rice", 1, 50.0))] * 2
+    with pytest.raises(HTTPException) as oversized:
+        await server.create_invoices_batch(batch, resources=BatchResources(db))
+    assert oversized.value.status_code == 400
+    assert await db.invoices.count_documents({}) == 0
+    assert followups == []
+
+
+async def test_customers_sharing_a_name_are_told_apart_by_phone(db, followups):
+    await db.customers.insert_many([
+        {"id": f"c{n}", "user_id": "u1", "name": "Ramesh", "phone": f"980000000{n}",
+         "total_purchases": 0.0, "total_due": 0.0, **search_fields("Ramesh", f"980000000{n}")}
+        for n in (1, 2)
+    ])
+    by_phone = invoice_input("u1", "Ramesh", ("rice", 1, 50.0))
+    by_phone.customer_phone = "+91 98000 00002"
+    batch = [by_phone, invoice_input("u1", "Ramesh", ("dal", 1, 120.0))]
+
+    result = await server.create_invoices_batch(batch, resources=BatchResources(db))
+
+    docs = [await db.invoices.find_one({"id": invoice["id"]}) for invoice in result["invoices"]]
+    assert docs[0]["customer_id"] == "c2"
+    # Without a phone either Ramesh could be meant, so the invoice is not linked
+    assert docs[1]["customer_id"] is None
@@ -0,0 +1,42 @@
+"""Invoice numbers: seeding past existing numbers, uniqueness and block reservation"""
+import asyncio
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+from invoice_numbers import create_invoice_counter_indexes, format_invoice_number, reserve_invoice_numbers
+
+pytestmark = pytest.mark.anyio
+
+USER = "user-1234567890"
+
+
+@pytest.fixture
+async def indexed(db):
+    await create_invoice_counter_indexes(db)
+    return db
+
+
+async def test_counter_starts_after_the_highest_existing_number(indexed):
+    # Two invoices left after deletions, the newest numbered past 9999
+    await indexed.invoices.insert_many([
+        {"id": "a", "user_id": USER, "invoice_number": format_invoice_number(USER, 3)},
+        {"id": "b", "user_id": USER, "invoice_number": format_invoice_number(USER, 10002)},
+    ])
+    assert await reserve_invoice_numbers(indexed, USER) == [format_invoice_number(USER, 10003)]
+
+
+async def test_blocks_are_consecutive_and_never_overlap(indexed):
+    blocks = await asyncio.gather(*(reserve_invoice_numbers(indexed, USER, 5) for _ in range(4)))
+    numbers = [number for block in blocks for number in block]
+    assert len(set(numbers)) == 20
+    assert sorted(numbers) == [format_invoice_number(USER, n) for n in range(1, 21)]
+
+
+async def test_duplicate_invoice_numbers_are_rejected(indexed):
+    number = format_invoice_number(USER, 1)
+    await indexed.invoices.insert_one({"id": "a", "user_id": USER, "invoice_number": number})
+    with pytest.raises(DuplicateKeyError):
+        await indexed.invoices.insert_one({"id": "b", "user_id": USER, "invoice_number": number})
+    # Another shopkeeper's sequence is separate
+    await indexed.invoices.insert_one({"id": "c", "user_id": "other", "invoice_number": number})
@@ -0,0 +1,81 @@
+"""Customer ledger: running balance across pages, date windows and the latest page"""
+from datetime import datetime, timezone
+
+import pytest
+
+from ledger import get_customer_ledger
+
+pytestmark = pytest.mark.anyio
+
+
+def day(n: int) -> datetime:
+    return datetime(2024, 5, n, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+async def ledger_db(server_db):
+    # Invoice n owes 90 * n: total 100 * n, paid 10 * n
+    await server_db.invoices.insert_many([
+        {"id": f"i{n}", "user_id": "u1", "customer_id": "c1", "invoice_number": f"INV-{n:04d}",
+         "date": day(n), "status": "partial", "total": 100.0 * n, "amount_paid": 10.0 * n}
+        for n in range(1, 6)
+    ] + [{"id": "other", "user_id": "u1", "customer_id": "c2", "date": day(3), "total": 500.0, "amount_paid": 0.0}])
+    return server_db
+
+
+def balances(page: dict) -> list:
+    return [entry["balance"] for entry in page["entries"]]
+
+
+async def test_full_ledger_runs_from_zero(ledger_db):
+    page = await get_customer_ledger(ledger_db, "c1")
+    assert [entry["invoice_id"] for entry in page["entries"]] == ["i1", "i2", "i3", "i4", "i5"]
+    assert balances(page) == [90.0, 270.0, 540.0, 900.0, 1350.0]
+    assert page["opening_balance"] == 0.0
+    assert page["closing_balance"] == 1350.0
+    assert page["next_cursor"] is None
+
+
+async def test_cursor_carries_the_balance_into_the_next_page(ledger_db):
+    first = await get_customer_ledger(ledger_db, "c1", limit=2)
+    assert balances(first) == [90.0, 270.0]
+    second = await get_customer_ledger(ledger_db, "c1", cursor=first["next_cursor"], limit=2)
+    assert second["opening_balance"] == 270.0
+    assert balances(second) == [540.0, 900.0]
+    third = await get_customer_ledger(ledger_db, "c1", cursor=second["next_cursor"], limit=2)
+    assert balances(third) == [1350.0]
+    assert third["next_cursor"] is None
+
+
+async def test_start_window_opens_with_the_earlier_balance(ledger_db):
+    page = await get_customer_ledger(ledger_db, "c1", start=day(3), end=day(4))
+    assert page["opening_balance"] == 270.0
+    assert balances(page) == [540.0, 900.0]
+    assert page["closing_balance"] == 900.0
+
+
+async def test_latest_page_ends_at_the_closing_balance(ledger_db):
+    page = await get_customer_ledger(ledger_db, "c1", limit=2, latest=True)
+    assert [entry["invoice_id"] for entry in page["entries"]] == ["i4", "i5"]
+    assert balances(page) == [900.0, 1350.0]
+    assert page["opening_balance"] == 540.0
+
+    bounded = await get_customer_ledger(ledger_db, "c1", end=day(3), limit=2, latest=True)
+    assert balances(bounded) == [270.0, 540.0]
+    assert bounded["closing_balance"] == 540.0
+
+
+async def test_user_id_keeps_other_shops_out(ledger_db):
+    # A shared customer with an invoice from another shop
+    await ledger_db.invoices.insert_one(
+        {"id": "i0", "user_id": "u2", "customer_id": "c1", "date": day(2), "total": 1000.0, "amount_paid": 0.0}
+    )
+    everyone = await get_customer_ledger(ledger_db, "c1")
+    assert everyone["closing_balance"] == 2350.0
+
+    page = await get_customer_ledger(ledger_db, "c1", user_id="u1", start=day(3))
+    assert page["opening_balance"] == 270.0
+    assert balances(page) == [540.0, 900.0, 1350.0]
+    latest = await get_customer_ledger(ledger_db, "c1", user_id="u1", limit=2, latest=True)
+    assert balances(latest) == [900.0, 1350.0]
+    assert "i0" not in [entry["invoice_id"] for entry in latest["entries"]]
@@ -0,0 +1,37 @@
+"""Multiprocess metrics: /metrics sums every worker when PROMETHEUS_MULTIPROC_DIR is set"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent.parent / "backend"
+
+WORKER = """
+import sys
+from metrics import mark_worker_stopped, record_fallback, record_scheduler_state
+record_fallback("transcription")
+record_scheduler_state("llm", 3, 1, 1)
+if sys.argv[1] == "stopped":
+    mark_worker_stopped()
+"""
+
+SCRAPE = """
+from metrics import render_metrics
+print(render_metrics()[0].decode())
+"""
+
+
+def run(code: str, multiproc_dir: Path, *args: str) -> str:
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(multiproc_dir), "PYTHONPATH": str(BACKEND)}
+    return subprocess.run(
+        [sys.executable, "-c", code, *args], env=env, check=True, capture_output=True, text=True
+    ).stdout
+
+
+def test_scrape_sums_every_worker(tmp_path):
+    run(WORKER, tmp_path, "stopped")
+    run(WORKER, tmp_path, "running")
+    output = run(SCRAPE, tmp_path)
+    # Counters keep a stopped worker's counts; gauges only add up running workers
+    assert 'voicebill_fallbacks_total{stage="transcription"} 2.0' in output
+    assert 'voicebill_scheduler_queue_depth{provider="llm"} 3.0' in output
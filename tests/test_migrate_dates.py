@@ -0,0 +1,38 @@
+"""Legacy ISO-string dates: the one-time migration and tolerant reads"""
+from datetime import datetime, timezone
+
+import pytest
+
+from migrate_dates import as_datetime, dates_migrated, ensure_dates_migrated
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_migration_converts_strings_and_records_completion(db):
+    await db.invoices.insert_many([
+        {"id": "a", "date": "2024-03-05T10:30:00+00:00", "created_at": "2024-03-05T10:30:00"},
+        {"id": "b", "date": datetime(2024, 4, 1, tzinfo=timezone.utc), "created_at": "not a date"},
+    ])
+    assert not await dates_migrated(db)
+
+    await ensure_dates_migrated(db)
+
+    a = await db.invoices.find_one({"id": "a"})
+    assert a["date"] == datetime(2024, 3, 5, 10, 30, tzinfo=timezone.utc)
+    assert a["created_at"] == datetime(2024, 3, 5, 10, 30, tzinfo=timezone.utc)
+    b = await db.invoices.find_one({"id": "b"})
+    assert b["created_at"] == "not a date"
+    assert await dates_migrated(db)
+
+
+async def test_recorded_migration_is_not_run_again(db):
+    await ensure_dates_migrated(db)
+    await db.invoices.insert_one({"id": "late", "date": "2024-05-01T00:00:00+00:00"})
+    await ensure_dates_migrated(db)
+    assert (await db.invoices.find_one({"id": "late"}))["date"] == "2024-05-01T00:00:00+00:00"
+
+
+def test_as_datetime_reads_strings_and_datetimes():
+    expected = datetime(2024, 3, 5, 10, 30, tzinfo=timezone.utc)
+    assert as_datetime("2024-03-05T10:30:00Z") == expected
+    assert as_datetime(expected) is expected
@@ -0,0 +1,67 @@
+"""Keyset pagination: complete walks, totals in the cursor and malformed cursors"""
+import base64
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from pagination import encode_cursor, paginate
+
+pytestmark = pytest.mark.anyio
+
+SORT = [("date", -1), ("id", -1)]
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+async def invoices(db):
+    # Pairs of invoices share a date, so the id breaks ties
+    await db.invoices.insert_many([
+        {"id": f"inv-{i:02d}", "user_id": "u1", "date": START + timedelta(days=i // 2)} for i in range(25)
+    ])
+    return db.invoices
+
+
+def raw_cursor(values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+async def test_pages_cover_every_document_once_in_order(invoices):
+    seen, cursor, totals = [], None, set()
+    while True:
+        page, cursor, total = await paginate(invoices, {"user_id": "u1"}, SORT, cursor, limit=7, include_total=True)
+        seen += [doc["id"] for doc in page]
+        totals.add(total)
+        if not cursor:
+            break
+    assert seen == [f"inv-{i:02d}" for i in reversed(range(25))]
+    assert totals == {25}
+
+
+async def test_total_travels_in_the_cursor(invoices):
+    _, cursor, _ = await paginate(invoices, {}, SORT, limit=10, include_total=True)
+    await invoices.insert_one({"id": "inv-99", "user_id": "u1", "date": START})
+    _, _, total = await paginate(invoices, {}, SORT, cursor, limit=10, include_total=True)
+    assert total == 25
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    raw_cursor([1, 2]),
+    raw_cursor({"date": {"$dt": "yesterday"}, "id": "inv-01"}),
+    raw_cursor({"id": "inv-01"}),
+    raw_cursor({"date": {"$dt": START.isoformat()}, "id": "inv-01", "extra": 1}),
+    raw_cursor({"date": {"$ne": None}, "id": "inv-01"}),
+    raw_cursor({"date": {"$dt": START.isoformat()}, "id": "inv-01", "total": "many"}),
+])
+async def test_malformed_cursors_are_rejected(invoices, cursor):
+    with pytest.raises(HTTPException) as error:
+        await paginate(invoices, {}, SORT, cursor)
+    assert error.value.status_code == 400
+
+
+async def test_cursor_from_another_sort_is_rejected(invoices):
+    cursor = encode_cursor({"name": "Ramesh", "id": "c1"})
+    with pytest.raises(HTTPException):
+        await paginate(invoices, {}, SORT, cursor)
@@ -0,0 +1,99 @@
+"""PaymentLinkService against the fake Razorpay: reuse, amount changes and expiry"""
+import time
+
+import pytest
+
+from fakes import serve_in_thread
+from fakes.razorpay_server import create_fake_razorpay_app
+from payment_links import PaymentLinkService
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def razorpay_fake():
+    import razorpay
+
+    app = create_fake_razorpay_app()
+    with serve_in_thread(app) as url:
+        yield app, razorpay.Client(auth=("rzp_test_key", "secret"), base_url=url)
+
+
+@pytest.fixture
+async def invoice(db):
+    doc = {"id": "inv-1", "user_id": "user-1", "invoice_number": "INV-0001", "total": 100.0,
+           "customer_name": "Ramesh", "customer_phone": "+919800000000"}
+    await db.invoices.insert_one(dict(doc))
+    return doc
+
+
+def make_service(db, client) -> PaymentLinkService:
+    return PaymentLinkService(db, lambda: client, "http://backend", test_mode=False)
+
+
+async def stored(db) -> dict:
+    return await db.invoices.find_one({"id": "inv-1"}, {"_id": 0})
+
+
+async def test_unchanged_amount_reuses_the_stored_link(db, razorpay_fake, invoice):
+    app, client = razorpay_fake
+    service = make_service(db, client)
+    first = await service.get_or_create(invoice)
+    second = await service.get_or_create(await stored(db))
+    assert first == second
+    assert app.state.create_calls == 1
+
+
+async def test_amount_change_cancels_the_old_link_and_creates_a_new_one(db, razorpay_fake, invoice):
+    app, client = razorpay_fake
+    service = make_service(db, client)
+    first = await service.get_or_create(invoice)
+    old_link_id = (await stored(db))["payment_link_id"]
+
+    await db.invoices.update_one({"id": "inv-1"}, {"$set": {"total": 150.0}})
+    second = await service.get_or_create(await stored(db))
+
+    assert second != first
+    doc = await stored(db)
+    assert doc["payment_link"] == second
+    assert doc["payment_link_key"] == "inv-1:15000"
+    assert app.state.payment_links[old_link_id]["status"] == "cancelled"
+    assert app.state.payment_links[doc["payment_link_id"]]["amount"] == 15000
+
+
+async def test_expired_link_is_replaced(db, razorpay_fake, invoice):
+    app, client = razorpay_fake
+    service = make_service(db, client)
+    first = await service.get_or_create(invoice)
+    await db.invoices.update_one({"id": "inv-1"}, {"$set": {"payment_link_expires_at": int(time.time()) - 60}})
+
+    second = await service.get_or_create(await stored(db))
+
+    assert second != first
+    assert app.state.create_calls == 2
+
+
+async def test_paid_invoice_gets_no_new_link(db, razorpay_fake, invoice):
+    app, client = razorpay_fake
+    await db.invoices.update_one({"id": "inv-1"}, {"$set": {"status": "paid", "payment_status": "completed"}})
+
+    assert await make_service(db, client).get_or_create(await stored(db)) is None
+    # A stale unpaid copy of the invoice is checked against the stored one
+    assert await make_service(db, client).get_or_create(invoice) is None
+
+    assert app.state.create_calls == 0
+    assert (await stored(db))["payment_status"] == "completed"
+
+
+async def test_link_stored_without_a_key_is_reused(db, razorpay_fake, invoice):
+    app, client = razorpay_fake
+    await db.invoices.update_one({"id": "inv-1"}, {"$set": {"payment_link": "https://rzp.io/i/legacy"}})
+
+    assert await make_service(db, client).get_or_create(await stored(db)) == "https://rzp.io/i/legacy"
+    assert app.state.create_calls == 0
+
+
+async def test_creating_a_link_leaves_payment_status_alone(db, razorpay_fake, invoice):
+    _, client = razorpay_fake
+    await make_service(db, client).get_or_create(invoice)
+    assert "payment_status" not in await stored(db)
@@ -0,0 +1,64 @@
+"""Payment reconciliation against the fake Razorpay: dues settle exactly once"""
+import asyncio
+
+import pytest
+
+from fakes import serve_in_thread
+from fakes.razorpay_server import create_fake_razorpay_app, seed_paid_invoices
+from reconciliation import reconcile_payments
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def razorpay_client():
+    import razorpay
+
+    app = create_fake_razorpay_app()
+    invoices = [{"id": f"inv-{i}", "total": 100.0} for i in range(3)]
+    seed_paid_invoices(app, invoices)
+    with serve_in_thread(app) as url:
+        yield razorpay.Client(auth=("rzp_test_key", "secret"), base_url=url)
+
+
+@pytest.fixture
+async def unpaid(db):
+    await db.customers.insert_one({"id": "cust-1", "user_id": "u1", "name": "Ramesh", "total_due": 300.0})
+    await db.invoices.insert_many([
+        {"id": f"inv-{i}", "user_id": "u1", "customer_id": "cust-1", "total": 100.0,
+         "amount_paid": 0.0, "amount_due": 100.0, "status": "unpaid"}
+        for i in range(3)
+    ])
+
+
+async def customer_due(db) -> float:
+    return (await db.customers.find_one({"id": "cust-1"}))["total_due"]
+
+
+async def test_reconciliation_settles_dues(db, razorpay_client, unpaid):
+    summary = await reconcile_payments(db, razorpay_client, since=0)
+    assert summary["invoices_updated"] == 3
+    assert await customer_due(db) == 0
+    assert await db.invoices.count_documents({"status": "paid"}) == 3
+
+
+async def test_concurrent_runs_apply_each_payment_once(db, razorpay_client, unpaid):
+    first, second = await asyncio.gather(
+        reconcile_payments(db, razorpay_client, since=0),
+        reconcile_payments(db, razorpay_client, since=0),
+    )
+    assert first["invoices_updated"] + second["invoices_updated"] == 3
+    assert await customer_due(db) == 0
+
+
+async def pay_inv_0(db):
+    """The webhook marks inv-0 paid between the reconciliation's read and its write"""
+    await db.invoices.update_one({"id": "inv-0"}, {"$set": {"status": "paid", "amount_paid": 100.0, "amount_due": 0}})
+    await db.customers.update_one({"id": "cust-1"}, {"$inc": {"total_due": -100.0}})
+
+
+async def test_invoice_paid_elsewhere_is_left_alone(db, racing_db, razorpay_client, unpaid):
+    summary = await reconcile_payments(racing_db("invoices", "bulk_write", pay_inv_0), razorpay_client, since=0)
+    assert summary["invoices_updated"] == 2
+    assert summary["invoices_skipped"] == 1
+    assert await customer_due(db) == 0
@@ -0,0 +1,113 @@
+"""ProviderScheduler: fair queuing, per-tenant caps, overload and cleanup"""
+import asyncio
+
+import pytest
+
+import scheduler
+from scheduler import ProviderOverloaded, ProviderScheduler
+
+pytestmark = pytest.mark.anyio
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def make(concurrency=1, tenant_concurrency=1, **kwargs) -> ProviderScheduler:
+    return ProviderScheduler("test", concurrency, tenant_concurrency, weights={}, **kwargs)
+
+
+async def test_a_busy_tenant_takes_turns_with_a_newcomer():
+    sched = make()
+    granted = []
+
+    async def call(tenant: str):
+        await sched.acquire(tenant)
+        granted.append(tenant)
+        await asyncio.sleep(0)
+        sched.release(tenant)
+
+    await sched.acquire("wholesaler")
+    tasks = [asyncio.create_task(call("wholesaler")) for _ in range(4)]
+    await settle()
+    tasks.append(asyncio.create_task(call("shop")))
+    await settle()
+    sched.release("wholesaler")
+    await asyncio.gather(*tasks)
+    assert granted == ["shop", "wholesaler", "wholesaler", "wholesaler", "wholesaler"]
+
+
+async def test_tenant_cap_leaves_slots_for_others():
+    sched = make(concurrency=4, tenant_concurrency=2)
+    tasks = [asyncio.create_task(sched.acquire("wholesaler")) for _ in range(4)]
+    await settle()
+    assert (sched.in_flight, sched.waiting) == (2, 2)
+
+    await asyncio.wait_for(sched.acquire("shop"), 1)
+    assert sched.in_flight == 3
+
+    sched.release("wholesaler")
+    await settle()
+    assert (sched.in_flight, sched.waiting) == (3, 1)
+    for task in tasks:
+        task.cancel()
+
+
+async def test_queue_timeout_sheds_and_cleans_up():
+    sched = make(queue_timeout=0.05)
+    await sched.acquire("a")
+    with pytest.raises(ProviderOverloaded) as error:
+        await sched.acquire("b")
+    assert error.value.reason == "timeout"
+    assert sched.waiting == 0 and not sched._queues
+
+    sched.release("a")
+    assert sched.in_flight == 0
+
+
+async def test_shed_policy_rejects_when_the_queue_is_full():
+    sched = make(overload="shed", max_queue=1)
+    await sched.acquire("a")
+    waiter = asyncio.create_task(sched.acquire("b"))
+    await settle()
+    with pytest.raises(ProviderOverloaded) as error:
+        await sched.acquire("c")
+    assert error.value.reason == "queue_full"
+
+    sched.release("a")
+    await asyncio.wait_for(waiter, 1)
+    assert sched.in_flight == 1
+
+
+async def test_cancelled_waiters_leave_no_trace():
+    sched = make()
+    await sched.acquire("a")
+    cancelled = asyncio.create_task(sched.acquire("b"))
+    kept = asyncio.create_task(sched.acquire("c"))
+    await settle()
+    cancelled.cancel()
+    await settle()
+    assert sched.waiting == 1 and "b" not in sched._queues
+
+    sched.release("a")
+    await asyncio.wait_for(kept, 1)
+    assert sched.in_flight == 1 and sched._tenant_in_flight == {"c": 1}
+    sched.release("c")
+    assert sched.in_flight == 0 and not sched._tenant_in_flight and not sched._tags
+
+
+async def test_limit_releases_the_slot_when_the_block_raises(monkeypatch):
+    monkeypatch.setattr(scheduler, "_schedulers", {"test": make()})
+    with pytest.raises(RuntimeError):
+        async with scheduler.limit("test", "a"):
+            raise RuntimeError("provider failed")
+    assert scheduler.get_scheduler("test").in_flight == 0
+
+
+def test_queue_timeout_defaults_follow_the_overload_policy(monkeypatch):
+    monkeypatch.setattr(scheduler, "SCHEDULER_QUEUE_TIMEOUT", None)
+    assert make().queue_timeout == 0
+    assert make(overload="shed").queue_timeout == 30
+    monkeypatch.setenv("SCHEDULER_TWILIO_QUEUE_TIMEOUT", "5")
+    assert ProviderScheduler.from_env("twilio").queue_timeout == 5
@@ -0,0 +1,97 @@
+"""Typeahead search: ranking, shopkeeper scoping and the backfill"""
+import pytest
+
+from search import backfill_search_fields, create_search_indexes, search_fields, typeahead
+
+pytestmark = pytest.mark.anyio
+
+NAMES = ["Ramesh", "Ramesh Kumar", "Kumar Ramesh Traders", "Suresh Ramesh", "Paramesh", "Mahesh"]
+
+
+def customer(n: int, name: str, user_id: str = "u1", phone: str = None) -> dict:
+    return {"id": f"{user_id}-c{n}", "user_id": user_id, "name": name, "phone": phone, **search_fields(name, phone)}
+
+
+@pytest.fixture
+async def customers(db):
+    await create_search_indexes(db)
+    await db.customers.insert_many([customer(n, name) for n, name in enumerate(NAMES)])
+    await db.customers.insert_one(customer(0, "Ramesh", user_id="u2"))
+    return db.customers
+
+
+def names(docs: list) -> list:
+    return [doc["name"] for doc in docs]
+
+
+def test_search_fields():
+    fields = search_fields("Ramesh  Kumar!", phone="+91 98000-12345")
+    assert fields["name_key"] == "ramesh kumar"
+    tokens = set(fields["search_tokens"])
+    assert {"r", "ram", "ramesh", "k", "kumar", "~ame", "~uma"} <= tokens
+    assert {"980", "9800012345"} <= tokens
+    assert "91" not in tokens and "+91" not in tokens
+
+
+async def test_exact_then_prefix_then_word_prefix_then_infix(customers):
+    found = await typeahead(customers, "u1", "ramesh")
+    assert names(found) == ["Ramesh", "Ramesh Kumar", "Suresh Ramesh", "Kumar Ramesh Traders", "Paramesh"]
+    assert all("search_tokens" not in doc and "name_key" not in doc for doc in found)
+
+
+async def test_every_query_word_must_match(customers):
+    assert names(await typeahead(customers, "u1", "kum ram")) == ["Ramesh Kumar", "Kumar Ramesh Traders"]
+    assert await typeahead(customers, "u1", "kumar zz") == []
+
+
+async def test_results_are_scoped_to_the_shopkeeper(customers):
+    found = await typeahead(customers, "u2", "ram")
+    assert [doc["id"] for doc in found] == ["u2-c0"]
+    assert await typeahead(customers, "u3", "ram") == []
+
+
+async def test_limit_and_empty_query(customers):
+    assert names(await typeahead(customers, "u1", "ram", limit=2)) == ["Ramesh", "Ramesh Kumar"]
+    assert await typeahead(customers, "u1", "  !! ") == []
+
+
+async def test_phone_prefix(db):
+    await db.customers.insert_one(customer(1, "Ramesh", phone="+91 98000 12345"))
+    assert names(await typeahead(db.customers, "u1", "98000")) == ["Ramesh"]
+
+
+async def test_backfill_fills_missing_fields_once(db):
+    await db.customers.insert_many([
+        {"id": "c1", "user_id": "u1", "name": "Ramesh Kumar", "phone": "9800012345"},
+        {"id": "c2", "user_id": "u1", "name": "Mahesh", **search_fields("Mahesh")},
+    ])
+    await db.products.insert_one({"id": "p1", "user_id": "u1", "name": "Basmati Rice"})
+
+    assert await backfill_search_fields(db, batch_size=1) == {"customers": 1, "products": 1}
+    assert (await db.customers.find_one({"id": "c1"}))["name_key"] == "ramesh kumar"
+    assert names(await typeahead(db.products, "u1", "rice")) == ["Basmati Rice"]
+    assert await backfill_search_fields(db) == {"customers": 0, "products": 0}
+
+
+def test_devanagari_words_keep_their_vowel_signs():
+    assert search_fields("रमेश कुमार")["name_key"] == "रमेश कुमार"
+    keys = {search_fields(name)["name_key"] for name in ("रमेश", "रमाश", "रमीश")}
+    assert len(keys) == 3
+    assert {"र", "रमे", "रमेश", "~मेश"} <= set(search_fields("रमेश")["search_tokens"])
+
+
+async def test_devanagari_prefix_and_ranking(db):
+    await db.customers.insert_many([
+        customer(n, name) for n, name in enumerate(["रमेश कुमार", "रमेश", "सुरेश रमेश", "रमाकांत"])
+    ])
+    assert names(await typeahead(db.customers, "u1", "रमेश")) == ["रमेश", "रमेश कुमार", "सुरेश रमेश"]
+    assert names(await typeahead(db.customers, "u1", "रमा")) == ["रमाकांत"]
+    assert names(await typeahead(db.customers, "u1", "कुमार")) == ["रमेश कुमार"]
+
+
+async def test_rebuild_derives_fields_again(db):
+    # Keys written by an older normalize that split words at vowel signs
+    await db.customers.insert_one({"id": "c1", "user_id": "u1", "name": "रमेश", "name_key": "रम श", "search_tokens": ["र"]})
+    assert await backfill_search_fields(db) == {"customers": 0, "products": 0}
+    assert await backfill_search_fields(db, rebuild=True) == {"customers": 1, "products": 0}
+    assert (await db.customers.find_one({"id": "c1"}))["name_key"] == "रमेश"
@@ -0,0 +1,18 @@
+"""Cold-start guard: `import server` stays within budget and loads no heavy SDK"""
+import statistics
+
+from benchmarks.bench_startup import IMPORT_BUDGET_MS, measure_import
+
+RUNS = 3
+
+
+def test_import_server_within_budget():
+    runs = [measure_import() for _ in range(RUNS)]
+    median = statistics.median(run["ms"] for run in runs)
+    assert median <= IMPORT_BUDGET_MS, (
+        f"import server took {median:.0f}ms (budget {IMPORT_BUDGET_MS:.0f}ms, set STARTUP_IMPORT_BUDGET_MS)"
+    )
+
+
+def test_import_server_defers_heavy_sdks():
+    assert measure_import()["heavy"] == []
@@ -0,0 +1,115 @@
+"""Chunked voice notes: overlap removal, in-order reassembly and merging per-chunk extractions"""
+import asyncio
+
+import pytest
+
+from billing import WALK_IN_CUSTOMER, merge_invoice_data
+from transcription import drop_overlap, transcribe_in_order
+
+pytestmark = pytest.mark.anyio
+
+
+def test_chunks_without_overlap_are_kept_whole():
+    assert drop_overlap("sold two kg rice", "and three sugar") == "and three sugar"
+    assert drop_overlap("", "and three sugar") == "and three sugar"
+
+
+def test_repeated_words_are_dropped():
+    assert drop_overlap("sold 2 kg rice to", "rice to Ramesh and") == "Ramesh and"
+    # Case and punctuation do not matter
+    assert drop_overlap("2 kg Rice, to Ramesh.", "ramesh and dal") == "and dal"
+
+
+def test_full_overlap_leaves_nothing():
+    assert drop_overlap("2 kg rice to Ramesh", "rice to Ramesh") == ""
+
+
+def test_words_cut_in_half():
+    # The chunk starts with the tail of a cut word
+    assert drop_overlap("sold 2 kg rice", "ce 2 kg rice and sugar") == "and sugar"
+    # The previous chunk ends with the start of a word this one has whole
+    assert drop_overlap("sold 2 kg ri", "2 kg rice and sugar") == "and sugar"
+    # A single word is not enough to call it a fragment
+    assert drop_overlap("the price is 2", "25 rupees") == "25 rupees"
+
+
+def test_devanagari_overlap():
+    assert drop_overlap("रमेश को दो किलो चावल", "किलो चावल और चीनी") == "और चीनी"
+
+
+def chunk(audio: bytes, overlaps_previous: bool = False) -> dict:
+    return {"audio": audio, "overlaps_previous": overlaps_previous}
+
+
+async def test_chunks_are_yielded_in_order_whatever_finishes_first():
+    finished = []
+    delays = {b"a": 0.03, b"b": 0.0, b"c": 0.01, b"d": 0.0}
+    texts = {b"a": "sold 2 kg rice to", b"b": "rice to Ramesh", b"c": "and 1 dal", b"d": "3 sugar"}
+
+    async def transcribe(audio: bytes) -> str:
+        await asyncio.sleep(delays[audio])
+        finished.append(audio)
+        return texts[audio]
+
+    notes = [[chunk(b"a"), chunk(b"b", overlaps_previous=True), chunk(b"c")], [chunk(b"d")]]
+    results = [item async for item in transcribe_in_order(transcribe, notes)]
+
+    assert finished[0] != b"a"
+    assert results == [(0, "sold 2 kg rice to"), (0, "Ramesh"), (0, "and 1 dal"), (1, "3 sugar")]
+
+
+async def test_overlap_is_only_dropped_within_a_note():
+    async def transcribe(audio: bytes) -> str:
+        return audio.decode()
+
+    notes = [[chunk(b"2 kg rice")], [chunk(b"2 kg rice", overlaps_previous=True)]]
+    assert [text async for _, text in transcribe_in_order(transcribe, notes)] == ["2 kg rice", "2 kg rice"]
+
+
+async def test_a_failed_chunk_cancels_the_rest():
+    started = []
+
+    async def transcribe(audio: bytes) -> str:
+        started.append(audio)
+        if audio == b"bad":
+            raise RuntimeError("provider down")
+        await asyncio.sleep(10)
+        return "never"
+
+    notes = [[chunk(b"bad"), chunk(b"slow")]]
+    with pytest.raises(RuntimeError):
+        async for _ in transcribe_in_order(transcribe, notes):
+            pass
+    await asyncio.sleep(0)
+    assert started == [b"bad", b"slow"]
+
+
+def test_merge_concatenates_items_in_chunk_order():
+    merged = merge_invoice_data([
+        {"customer_name": WALK_IN_CUSTOMER, "items": [{"name": "rice", "quantity": 2, "price": 50}], "missing_prices": []},
+        {"customer_name": "Ramesh", "customer_id": "c1", "customer_phone": "98000",
+         "items": [{"name": "dal", "quantity": 1, "price": None}], "missing_prices": ["dal"]},
+        {"customer_name": "Suresh", "customer_id": "c2", "items": [], "missing_prices": []},
+    ])
+    assert [item["name"] for item in merged["items"]] == ["rice", "dal"]
+    assert merged["missing_prices"] == ["dal"]
+    # The first named customer wins
+    assert (merged["customer_name"], merged["customer_id"], merged["customer_phone"]) == ("Ramesh", "c1", "98000")
+
+
+def test_merge_keeps_items_repeated_across_chunks():
+    merged = merge_invoice_data([
+        {"items": [{"name": "rice", "quantity": 2, "price": 50}, {"name": "gud", "quantity": 1, "price": None}],
+         "missing_prices": ["gud"]},
+        {"items": [{"name": "rice", "quantity": 1, "price": 50}, {"name": "gud", "quantity": 2, "price": None}],
+         "missing_prices": ["gud"]},
+    ])
+    # Two mentions of rice in different chunks are two sales lines; overlap is removed from the text before
+    assert [(item["name"], item["quantity"]) for item in merged["items"]] == [("rice", 2), ("gud", 1), ("rice", 1), ("gud", 2)]
+    # One entry per item without a price: the shopkeeper's reply fills them in order
+    assert merged["missing_prices"] == ["gud", "gud"]
+    assert merged["customer_name"] == WALK_IN_CUSTOMER
+
+
+def test_merge_of_nothing_is_a_walk_in_sale():
+    assert merge_invoice_data([]) == {"customer_name": WALK_IN_CUSTOMER, "items": [], "missing_prices": []}
@@ -0,0 +1,55 @@
+"""WhatsAppSender retries: only failures that cannot have delivered the message"""
+import httpx
+import pytest
+
+from whatsapp_sender import WhatsAppSender
+
+pytestmark = pytest.mark.anyio
+
+
+def sender_with(responses: list) -> tuple:
+    """A sender whose requests get responses[i] (a status code or an exception to raise)"""
+    requests = []
+
+    def handle(request):
+        outcome = responses[min(len(requests), len(responses) - 1)]
+        requests.append(request)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return httpx.Response(outcome, json={"sid": "SM1", "status": "queued"})
+
+    sender = WhatsAppSender("AC1", "token", "whatsapp:+14155238886", backoff_base=0, backoff_cap=0,
+                            transport=httpx.MockTransport(handle))
+    return sender, requests
+
+
+async def test_connect_errors_are_retried():
+    sender, requests = sender_with([httpx.ConnectError("refused"), httpx.ConnectTimeout("slow"), 201])
+    result = await sender.send("whatsapp:+919800000000", "hi")
+    assert result["delivered"] and result["attempts"] == 3
+    await sender.aclose()
+
+
+@pytest.mark.parametrize("error", [httpx.ReadTimeout("no reply"), httpx.RemoteProtocolError("dropped")])
+async def test_errors_after_sending_are_not_retried(error):
+    sender, requests = sender_with([error, 201])
+    result = await sender.send("whatsapp:+919800000000", "hi")
+    assert not result["delivered"]
+    assert len(requests) == 1
+    await sender.aclose()
+
+
+async def test_rate_limits_and_unavailable_are_retried():
+    sender, requests = sender_with([429, 503, 201])
+    result = await sender.send("whatsapp:+919800000000", "hi")
+    assert result["delivered"] and len(requests) == 3
+    await sender.aclose()
+
+
+@pytest.mark.parametrize("status", [400, 500, 502, 504])
+async def test_client_and_other_server_errors_are_not_retried(status):
+    sender, requests = sender_with([status, 201])
+    result = await sender.send("whatsapp:+919800000000", "hi")
+    assert not result["delivered"]
+    assert result["http_status"] == status and len(requests) == 1
+    await sender.aclose()